@@ -32,6 +32,10 @@ def create_app(config_class=Config):
     from app.routes import main_bp
     app.register_blueprint(main_bp)
     
+    # Pre-calentamiento diario de cachés (solo si PREWARM_ENABLED)
+    from app.services.prewarm import start_scheduler
+    start_scheduler()
+    
     # Log de rutas (solo en debug)
     if os.environ.get('FLASK_ENV') != 'production':
         print("\n=== RUTAS REGISTRADAS ===")
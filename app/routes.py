@@ -1,7 +1,18 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context
 from app.services.scraper import ProductScraper
 from app.services.gemini_analyzer import GeminiAnalyzer
+from app.services.http_session import get_pool_stats
+from app.services.cache import get_search_cache, get_analysis_cache
+from app.services.jobs import get_job_manager
+from app.services.singleflight import get_flight
+from app.services.price_history import get_price_history
+from app.services.prewarm import record_query
+from app.services.render_strategy import get_selector
+from app.services.circuit_breaker import get_breaker
+from app.services.products import to_dicts
 from config import Config
+import json
+import time
 import traceback
 
 main_bp = Blueprint('main', __name__)
@@ -42,6 +53,8 @@ def search_products():
                 'error': 'Todos los campos son requeridos: Gemini API Key, Scraper API Key y Nombre del Producto'
             }), 400
         
+        record_query(product_name)
+        
         # Inicializar servicios con mejor manejo de errores
         print("\n📡 Inicializando servicios...")
         
@@ -92,7 +105,7 @@ def search_products():
             
             # DEBUG: Ver distribución por tienda
             from collections import Counter
-            tiendas_count = Counter(p['tienda'] for p in raw_products)
+            tiendas_count = Counter(p.tienda for p in raw_products)
             print(f"   Distribución por tienda:")
             for tienda, count in tiendas_count.items():
                 print(f"     - {tienda}: {count} productos")
@@ -145,6 +158,12 @@ def search_products():
             'products': analysis_result.get('products', []),
             'statistics': analysis_result.get('statistics', {})
         }
+        if scraper.stale:
+            # Tiendas servidas desde caché vencida (refrescándose): {tienda: edad en segundos}
+            response_data['stale'] = scraper.stale
+        if scraper.skipped:
+            # Tiendas omitidas por circuito abierto (caídas o bloqueando)
+            response_data['omitidas'] = sorted(scraper.skipped)
         
         print(f"\n📤 Enviando respuesta al frontend:")
         print(f"   - Summary: {len(response_data['summary'])} chars")
@@ -166,6 +185,188 @@ def search_products():
             'error': f'Error interno del servidor: {str(e)}'
         }), 500
 
+def _sse(event, data):
+    """Formatea un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@main_bp.route('/api/search/stream', methods=['POST'])
+def search_products_stream():
+    """
+    Búsqueda con resultados progresivos (Server-Sent Events)
+    
+    Eventos emitidos en orden:
+      - store: productos de cada tienda en cuanto termina
+      - statistics: estadísticas básicas de todos los productos
+      - ai_summary: resumen/insights de Gemini en cuanto se decodifican
+      - ai_product: cada producto analizado por Gemini a medida que llega
+      - analysis: análisis completo (mismo formato que /api/search)
+      - error: si algo falla (cierra el stream)
+      - done: fin del stream
+    """
+    data = request.get_json(silent=True) or {}
+    gemini_key = data.get('gemini_api_key', '').strip()
+    scraper_key = data.get('scraper_api_key', '').strip()
+    product_name = data.get('product_name', '').strip()
+    
+    if not all([gemini_key, scraper_key, product_name]):
+        return jsonify({
+            'success': False,
+            'error': 'Todos los campos son requeridos: Gemini API Key, Scraper API Key y Nombre del Producto'
+        }), 400
+    
+    record_query(product_name)
+    
+    def generate():
+        print(f"\n🚀 Búsqueda en streaming: {product_name}")
+        try:
+            scraper = ProductScraper(scraper_key)
+        except Exception as e:
+            yield _sse('error', {'error': f'Error al inicializar el servicio de scraping: {str(e)}'})
+            return
+        
+        # Paso 1: Cada tienda se envía en cuanto responde
+        raw_products = []
+        total = len(Config.TARGET_SITES)
+        completed = 0
+        for site, products in scraper.iter_site_results(product_name):
+            completed += 1
+            raw_products.extend(products)
+            yield _sse('store', {
+                'tienda': site,
+                'products': to_dicts(products),
+                'completadas': completed,
+                'total': total,
+                'stale': site in scraper.stale,
+                'edad': scraper.stale.get(site),
+                'omitida': site in scraper.skipped
+            })
+        
+        if not raw_products:
+            yield _sse('error', {
+                'error': 'No se encontraron productos. Posibles causas: API key de ScraperAPI incorrecta, límite de requests alcanzado, o el producto no existe en las tiendas.'
+            })
+            return
+        
+        # Paso 2: Estadísticas básicas (locales, instantáneas)
+        analyzer = GeminiAnalyzer(gemini_key)
+        yield _sse('statistics', analyzer._calculate_statistics(raw_products))
+        
+        # Paso 3: Análisis con IA, reenviando cada recomendación en cuanto se decodifica
+        analysis_result = None
+        try:
+            for event, payload in analyzer.stream_analysis(raw_products, product_name):
+                if event == 'analysis':
+                    analysis_result = payload
+                elif event == 'summary':
+                    yield _sse('ai_summary', payload)
+                elif event == 'product':
+                    yield _sse('ai_product', payload)
+        except Exception as gemini_error:
+            print(f"✗ Error en Gemini: {str(gemini_error)}")
+            yield _sse('error', {
+                'error': f'Error al analizar con Gemini: {str(gemini_error)}. Verifica tu Gemini API key en https://aistudio.google.com/'
+            })
+            return
+        
+        if not analysis_result:
+            yield _sse('error', {'error': 'Gemini no pudo analizar los productos. Intenta nuevamente.'})
+            return
+        
+        yield _sse('analysis', {
+            'summary': analysis_result.get('summary', ''),
+            'insights': analysis_result.get('insights', []),
+            'products': analysis_result.get('products', []),
+            'statistics': analysis_result.get('statistics', {})
+        })
+        yield _sse('done', {'success': True})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Desactivar buffering en proxies (nginx)
+        }
+    )
+
+@main_bp.route('/api/search/jobs', methods=['POST'])
+def create_search_job():
+    """
+    Encola una búsqueda en segundo plano y devuelve el job id al instante.
+    Consultar el progreso con GET /api/search/<job_id>.
+    """
+    data = request.get_json(silent=True) or {}
+    gemini_key = data.get('gemini_api_key', '').strip()
+    scraper_key = data.get('scraper_api_key', '').strip()
+    product_name = data.get('product_name', '').strip()
+    
+    if not all([gemini_key, scraper_key, product_name]):
+        return jsonify({
+            'success': False,
+            'error': 'Todos los campos son requeridos: Gemini API Key, Scraper API Key y Nombre del Producto'
+        }), 400
+    
+    record_query(product_name)
+    job, created = get_job_manager().submit(gemini_key, scraper_key, product_name)
+    print(f"🧵 Job {'creado' if created else 'reutilizado'}: {job.id[:8]} ({product_name})")
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'deduplicated': not created,
+        'poll_url': f'/api/search/{job.id}'
+    }), 202
+
+@main_bp.route('/api/search/<job_id>', methods=['GET'])
+def get_search_job(job_id):
+    """Estado de un job: resultados parciales mientras corre, finales al terminar"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Búsqueda no encontrada o expirada'
+        }), 404
+    
+    return jsonify({
+        'success': job['status'] != 'error',
+        'job': job
+    })
+
+@main_bp.route('/api/history', methods=['GET'])
+def price_history():
+    """
+    Historial de precios sin volver a scrapear
+    
+    ?q=<búsqueda> → mín/promedio/máx de la búsqueda en la ventana
+    ?product=<título> → además los puntos (ts, tienda, precio) de ese producto
+    ?days=<n> → ventana (por defecto Config.PRICE_HISTORY_WINDOW_DAYS)
+    """
+    history = get_price_history()
+    if history is None:
+        return jsonify({
+            'success': False,
+            'error': 'Historial de precios desactivado'
+        }), 503
+    
+    query = request.args.get('q', '').strip()
+    product = request.args.get('product', '').strip()
+    days = request.args.get('days', Config.PRICE_HISTORY_WINDOW_DAYS, type=int)
+    if not query and not product:
+        return jsonify({
+            'success': False,
+            'error': 'Se requiere q (búsqueda) o product (título)'
+        }), 400
+    
+    result = {'success': True, 'dias': days}
+    if query:
+        result['busqueda'] = history.query_stats(query, days=days)
+    if product:
+        since = time.time() - days * 86400
+        result['producto'] = history.window_stats(product, days=days)
+        result['puntos'] = history.history(product, since=since)
+    return jsonify(result)
+
 @main_bp.route('/api/health', methods=['GET'])
 def health_check():
     """Endpoint para verificar el estado del servidor"""
@@ -198,11 +399,11 @@ def test_apis():
         for site in ['amazon.com', 'ebay.com', 'walmart.com', 'bestbuy.com']:
             print(f"\n🧪 TESTING {site}...")
             try:
-                products = scraper._search_site(site, product_name)
+                products = scraper._search_site(site, product_name, use_cache=False)
                 results[site] = {
                     'status': 'success',
                     'products_found': len(products),
-                    'products': products[:2] if products else []  # Solo primeros 2 para preview
+                    'products': to_dicts(products[:2])  # Solo primeros 2 para preview
                 }
                 print(f"✓ {site}: {len(products)} productos")
             except Exception as e:
@@ -330,5 +531,14 @@ def debug_info():
             'max_results': Config.MAX_RESULTS_PER_SITE,
             'timeout': Config.REQUEST_TIMEOUT
         },
+        'http_pool': get_pool_stats(),
+        'search_cache': get_search_cache().stats(),
+        'analysis_cache': get_analysis_cache().stats(),
+        'singleflight': {
+            'search': get_flight('search').stats(),
+            'analysis': get_flight('analysis').stats(),
+        },
+        'render_strategies': get_selector().stats(),
+        'circuit_breakers': get_breaker().stats() if get_breaker() else None,
         'routes': [str(rule) for rule in current_app.url_map.iter_rules()]
     })
\ No newline at end of file
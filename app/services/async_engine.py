@@ -0,0 +1,175 @@
+"""
+Motor asyncio para scraping
+Un event loop en segundo plano por proceso multiplexa todas las tiendas de
+todas las búsquedas en curso. Un token bucket compartido mantiene el
+tráfico dentro del límite de concurrencia/velocidad del plan de ScraperAPI.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from config import Config
+from app.services.http_session import get_session
+
+# Importar aiohttp de forma opcional (sin él se usa el pool de requests en threads)
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket + límite de requests simultáneos
+
+    Args:
+        rate (float): Tokens por segundo (requests iniciados por segundo)
+        capacity (int): Ráfaga máxima
+        concurrency (int): Requests en vuelo a la vez (límite del plan)
+    """
+
+    def __init__(self, rate, capacity, concurrency):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self):
+        self._slots.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+# Limitador por event loop (las primitivas asyncio pertenecen a un loop)
+_limiters = weakref.WeakKeyDictionary()
+
+
+def get_limiter():
+    """Limitador compartido por todas las búsquedas del loop actual"""
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get(loop)
+    if limiter is None:
+        limiter = AsyncTokenBucket(
+            rate=Config.SCRAPER_API_RATE,
+            capacity=Config.SCRAPER_API_CONCURRENCY,
+            concurrency=Config.SCRAPER_API_CONCURRENCY,
+        )
+        _limiters[loop] = limiter
+    return limiter
+
+
+class _BackgroundLoop:
+    """Event loop en un thread daemon, compartido por el proceso"""
+
+    def __init__(self):
+        self.loop = None
+        self.http = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.loop is None:
+                ready = threading.Event()
+                thread = threading.Thread(target=self._run, args=(ready,), daemon=True,
+                                          name='scraper-event-loop')
+                thread.start()
+                ready.wait()
+        return self.loop
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        ready.set()
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Programa la corrutina en el loop de fondo (devuelve concurrent.futures.Future)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+
+_background = _BackgroundLoop()
+
+
+def run_in_background(coro, timeout=None):
+    """Ejecuta la corrutina en el loop compartido y espera el resultado (desde código sync)"""
+    return _background.submit(coro).result(timeout)
+
+
+@asynccontextmanager
+async def http_session_scope():
+    """
+    Sesión aiohttp: persistente en el loop de fondo (keep-alive entre búsquedas),
+    temporal en cualquier otro loop (p. ej. asyncio.run en scripts o tests).
+    """
+    if not AIOHTTP_AVAILABLE:
+        yield None
+        return
+
+    loop = asyncio.get_running_loop()
+    if loop is _background.loop:
+        if _background.http is None or _background.http.closed:
+            _background.http = _new_http_session()
+        yield _background.http
+        return
+
+    session = _new_http_session()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+def _new_http_session():
+    connector = aiohttp.TCPConnector(
+        limit=Config.HTTP_POOL_MAXSIZE * Config.HTTP_POOL_CONNECTIONS,
+        limit_per_host=Config.HTTP_POOL_MAXSIZE,
+        keepalive_timeout=30,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def fetch(http, url, params, timeout):
+    """
+    GET asíncrono con el limitador compartido
+
+    Returns:
+        tuple: (status_code, content_bytes)
+    """
+    async with get_limiter():
+        if http is not None:
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+            async with http.get(url, params=params, timeout=client_timeout) as response:
+                return response.status, await response.read()
+
+        # Sin aiohttp: el pool de requests en un thread del executor
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            None, lambda: get_session().get(url, params=params, timeout=timeout)
+        )
+        return response.status_code, response.content
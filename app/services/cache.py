@@ -0,0 +1,398 @@
+"""
+Caché de resultados de búsqueda
+Evita repetir requests a ScraperAPI (créditos + 5-25s de latencia) para
+consultas populares. Backends intercambiables:
+  - memory: en el proceso (Vercel)
+  - sqlite: archivo local compartido entre workers (Docker/gunicorn)
+  - redis: servidor Redis compatible (opcional)
+"""
+
+import copy
+import json
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import Config
+from app.services.products import as_product
+from app.services.render_strategy import site_credits
+
+# Importar Redis de forma opcional
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+def normalize_query(product_name):
+    """Normaliza la búsqueda: 'iPhone  15 ' y 'iphone 15' comparten entrada"""
+    text = unicodedata.normalize('NFKC', product_name or '').lower()
+    text = re.sub(r'[^\w\s.+-]', ' ', text)
+    return ' '.join(text.split())
+
+
+def key_id(api_key):
+    """Huella corta de una API key: separa usuarios sin guardar la key en claro"""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:12]
+
+
+def make_key(namespace, *parts):
+    """Clave estable y corta a partir de partes arbitrarias"""
+    digest = hashlib.sha1('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class MemoryCacheBackend:
+    """LRU en memoria con expiración por entrada"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """Caché en archivo SQLite, compartida entre workers del mismo host"""
+
+    def __init__(self, path, max_entries, table='cache'):
+        if not table.isidentifier():
+            raise ValueError(f"Nombre de tabla inválido: {table}")
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                ' key TEXT PRIMARY KEY,'
+                ' value TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL)'
+            )
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)'
+            )
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación: seguro entre threads y procesos
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                return None
+            conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+            return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+            )
+            # Desalojar expirados y, si sobra, los menos usados
+            conn.execute(f'DELETE FROM {self.table} WHERE expires_at <= ?', (now,))
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f' SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute(f'DELETE FROM {self.table}')
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+
+class RedisCacheBackend:
+    """Caché en Redis (el desalojo LRU lo hace Redis con maxmemory-policy)"""
+
+    def __init__(self, url, prefix='pricefinder:'):
+        if not REDIS_AVAILABLE:
+            raise ImportError("El paquete 'redis' no está instalado")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, max(1, int(ttl)), json.dumps(value, ensure_ascii=False))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+def create_backend(name=None, max_entries=None, table='cache'):
+    """Crea el backend configurado; si falla, cae a memoria"""
+    name = (name or Config.CACHE_BACKEND).lower()
+    max_entries = max_entries or Config.CACHE_MAX_ENTRIES
+    try:
+        if name == 'sqlite':
+            return SQLiteCacheBackend(Config.CACHE_SQLITE_PATH, max_entries, table=table)
+        if name == 'redis':
+            return RedisCacheBackend(Config.REDIS_URL, prefix=f'pricefinder:{table}:')
+    except Exception as e:
+        print(f"⚠ Caché '{name}' no disponible ({str(e)[:100]}), usando memoria")
+    return MemoryCacheBackend(max_entries)
+
+
+class SearchCache:
+    """
+    Caché de productos por (tienda, búsqueda normalizada) con TTL por tienda
+
+    Stale-while-revalidate: el TTL de la tienda es el TTL "blando"; durante
+    max_stale segundos más la entrada sigue disponible como vencida (lookup)
+    mientras se refresca en segundo plano. Pasado el TTL duro (blando +
+    max_stale) el backend la descarta.
+    """
+
+    def __init__(self, backend, ttl_by_site=None, default_ttl=None, max_stale=None):
+        self.backend = backend
+        self.ttl_by_site = ttl_by_site if ttl_by_site is not None else Config.CACHE_TTL_BY_SITE
+        self.default_ttl = default_ttl if default_ttl is not None else Config.CACHE_DEFAULT_TTL
+        self.max_stale = max_stale if max_stale is not None else Config.CACHE_MAX_STALE
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def key(self, site, product_name):
+        return make_key('search', site, normalize_query(product_name))
+
+    def ttl_for(self, site):
+        return self.ttl_by_site.get(site, self.default_ttl)
+
+    def _read(self, site, product_name):
+        """(productos, edad en segundos) o None"""
+        try:
+            entry = self.backend.get(self.key(site, product_name))
+        except Exception as e:
+            print(f"    ⚠ Error leyendo caché: {str(e)[:100]}")
+            entry = None
+        if entry is None:
+            return None
+        age = max(0.0, time.time() - entry.get('stored_at', 0))
+        return [as_product(row) for row in entry['products']], age
+
+    def age(self, site, product_name):
+        """Edad en segundos de la entrada (vigente o vencida), None si no hay; no cuenta en stats"""
+        entry = self._read(site, product_name)
+        return entry[1] if entry is not None else None
+
+    def peek(self, site, product_name):
+        """Productos vigentes o None; no cuenta en stats (lecturas internas, p. ej. pre-calentamiento)"""
+        entry = self._read(site, product_name)
+        if entry is None or entry[1] > self.ttl_for(site):
+            return None
+        return entry[0]
+
+    def get(self, site, product_name):
+        """Devuelve los productos cacheados vigentes (dentro del TTL blando) o None"""
+        entry = self._read(site, product_name)
+        if entry is not None and entry[1] > self.ttl_for(site):
+            entry = None
+        self._record(site, 'hits' if entry is not None else 'misses')
+        return entry[0] if entry is not None else None
+
+    def lookup(self, site, product_name):
+        """
+        Lectura con stale-while-revalidate
+
+        Returns:
+            tuple: (productos, edad_segundos, vencida) o None si no hay entrada
+                o ya pasó el TTL duro
+        """
+        entry = self._read(site, product_name)
+        if entry is None:
+            self._record(site, 'misses')
+            return None
+        products, age = entry
+        stale = age > self.ttl_for(site)
+        if stale and age > self.ttl_for(site) + self.max_stale:
+            self._record(site, 'misses')
+            return None
+        self._record(site, 'stale' if stale else 'hits')
+        return products, age, stale
+
+    def set(self, site, product_name, products):
+        """Guarda productos; las respuestas vacías no se cachean (suelen ser bloqueos)"""
+        if not products:
+            return
+        # Filas compactas: menos memoria que dicts y serializables a JSON
+        entry = {'products': [as_product(p).to_row() for p in products], 'stored_at': time.time()}
+        try:
+            # El backend conserva la entrada hasta el TTL duro (vencida pero servible)
+            self.backend.set(self.key(site, product_name), entry, self.ttl_for(site) + self.max_stale)
+        except Exception as e:
+            print(f"    ⚠ Error escribiendo caché: {str(e)[:100]}")
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._stats.clear()
+
+    def _record(self, site, field):
+        with self._lock:
+            site_stats = self._stats.setdefault(site, {'hits': 0, 'stale': 0, 'misses': 0})
+            site_stats[field] += 1
+
+    def stats(self):
+        """Hits/misses por tienda y créditos de ScraperAPI ahorrados"""
+        with self._lock:
+            por_tienda = {site: dict(s) for site, s in self._stats.items()}
+        hits = sum(s['hits'] for s in por_tienda.values())
+        stale = sum(s['stale'] for s in por_tienda.values())
+        misses = sum(s['misses'] for s in por_tienda.values())
+        # Las respuestas vencidas se refrescan en segundo plano: no ahorran créditos
+        credits = sum(
+            s['hits'] * site_credits(site)
+            for site, s in por_tienda.items()
+        )
+        total = hits + stale + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'stale': stale,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'served_from_cache_rate': round((hits + stale) / total, 3) if total else 0.0,
+            'creditos_ahorrados': credits,
+            'por_tienda': por_tienda,
+        }
+
+
+class AnalysisCache:
+    """Caché de análisis de Gemini por hash del contenido (búsqueda, modelo, productos, config)"""
+
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl if ttl is not None else Config.ANALYSIS_CACHE_TTL
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def key(self, product_name, model_name, products, generation_config):
+        return make_key(
+            'analysis',
+            normalize_query(product_name),
+            model_name,
+            json.dumps(products, sort_keys=True, ensure_ascii=False),
+            json.dumps(generation_config, sort_keys=True),
+        )
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"⚠ Error leyendo caché de análisis: {str(e)[:100]}")
+            value = None
+        with self._lock:
+            self._stats['hits' if value is not None else 'misses'] += 1
+        # Copia: el caller puede modificar el análisis sin tocar la caché en memoria
+        return copy.deepcopy(value)
+
+    def set(self, key, analysis):
+        try:
+            self.backend.set(key, analysis, self.ttl)
+        except Exception as e:
+            print(f"⚠ Error escribiendo caché de análisis: {str(e)[:100]}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / total, 3) if total else 0.0
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+_search_cache = None
+_analysis_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache():
+    """Caché de búsquedas compartida por el proceso"""
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache(create_backend())
+    return _search_cache
+
+
+def get_analysis_cache():
+    """Caché de análisis de Gemini compartida por el proceso"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _search_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisCache(
+                    create_backend(max_entries=Config.ANALYSIS_CACHE_MAX_ENTRIES, table='analysis')
+                )
+    return _analysis_cache
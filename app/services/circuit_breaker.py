@@ -0,0 +1,229 @@
+"""
+Circuit breaker por tienda
+Cuando una tienda bloquea a ScraperAPI (Walmart/BestBuy, ver
+SCRAPERAPI_OPTIMIZATION.md) cada búsqueda pagaba hasta dos timeouts de 25s
+antes de rendirse. El breaker:
+
+  - closed:    se scrapea normal; cuenta fallos consecutivos
+  - open:      tras BREAKER_FAILURE_THRESHOLD fallos seguidos (o una
+               respuesta bloqueada, < BLOCKED_RESPONSE_BYTES, en todos los
+               intentos) la tienda se omite durante el enfriamiento
+  - half_open: pasado el enfriamiento, UN request (con lease) prueba la
+               tienda; éxito → closed, fallo → open con enfriamiento doble
+
+El estado vive en un archivo SQLite compartido por threads y workers del
+host (lectura-modificación-escritura en una transacción IMMEDIATE). Si el
+archivo no se puede abrir, el estado queda en memoria del proceso.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_COLUMNS = ('state', 'failures', 'trips', 'open_until', 'probe_until', 'last_error')
+
+
+def _new_row():
+    return {'state': CLOSED, 'failures': 0, 'trips': 0, 'open_until': 0.0, 'probe_until': 0.0, 'last_error': None}
+
+
+class CircuitBreaker:
+    """
+    Breakers de todas las tiendas
+
+    Args:
+        path (str): Archivo SQLite compartido; None = solo en memoria del proceso
+        failure_threshold (int): Fallos consecutivos que abren el circuito
+        cooldown (float): Segundos abierto tras el primer disparo (se duplica en cada disparo seguido)
+        max_cooldown (float): Tope del enfriamiento
+        probe_lease (float): Segundos que un request tiene reservada la prueba half-open
+    """
+
+    def __init__(self, path=None, failure_threshold=None, cooldown=None, max_cooldown=None, probe_lease=None):
+        self.path = path
+        self.failure_threshold = failure_threshold or Config.BREAKER_FAILURE_THRESHOLD
+        self.cooldown = cooldown if cooldown is not None else Config.BREAKER_COOLDOWN
+        self.max_cooldown = max_cooldown if max_cooldown is not None else Config.BREAKER_MAX_COOLDOWN
+        self.probe_lease = probe_lease if probe_lease is not None else Config.BREAKER_PROBE_LEASE
+        self._memory = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, timeout=5)
+            try:
+                with conn:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS breakers ('
+                        ' site TEXT PRIMARY KEY,'
+                        ' state TEXT NOT NULL,'
+                        ' failures INTEGER NOT NULL,'
+                        ' trips INTEGER NOT NULL,'
+                        ' open_until REAL NOT NULL,'
+                        ' probe_until REAL NOT NULL,'
+                        ' last_error TEXT)'
+                    )
+            finally:
+                conn.close()
+
+    @contextmanager
+    def _row(self, site):
+        """Estado de una tienda para leer y modificar atómicamente"""
+        if self.path is None:
+            with self._lock:
+                yield self._memory.setdefault(site, _new_row())
+            return
+
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            # IMMEDIATE: un solo escritor a la vez entre workers
+            conn.execute('BEGIN IMMEDIATE')
+            found = conn.execute(
+                f'SELECT {", ".join(_COLUMNS)} FROM breakers WHERE site = ?', (site,)
+            ).fetchone()
+            row = dict(zip(_COLUMNS, found)) if found else _new_row()
+            before = dict(row)
+            try:
+                yield row
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if row != before:
+                conn.execute(
+                    f'INSERT OR REPLACE INTO breakers (site, {", ".join(_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (site, *(row[column] for column in _COLUMNS))
+                )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def allow(self, site):
+        """
+        ¿Se puede scrapear la tienda ahora?
+
+        Returns:
+            tuple: (permitido, es_prueba) - es_prueba=True para el único request
+                que prueba una tienda half-open
+        """
+        now = time.time()
+        with self._row(site) as row:
+            if row['state'] == CLOSED:
+                return True, False
+            if row['state'] == OPEN and now < row['open_until']:
+                return False, False
+            if row['state'] == HALF_OPEN and now < row['probe_until']:
+                return False, False  # Otro request está probando
+            # Enfriamiento cumplido (o la prueba anterior nunca reportó): tomar el lease
+            row['state'] = HALF_OPEN
+            row['probe_until'] = now + self.probe_lease
+            return True, True
+
+    def record_success(self, site):
+        with self._row(site) as row:
+            if row['state'] != CLOSED:
+                print(f"🔌 {site}: circuito cerrado, la tienda responde de nuevo")
+            row.update(_new_row())
+
+    def record_failure(self, site, reason, blocked=False):
+        """
+        Registra un scrape fallido
+
+        Args:
+            reason (str): Descripción corta (timeout, bloqueado, sin resultados...)
+            blocked (bool): Todos los intentos devolvieron una página bloqueada (abre de inmediato)
+        """
+        now = time.time()
+        with self._row(site) as row:
+            row['failures'] += 1
+            row['last_error'] = reason
+            if row['state'] == OPEN:
+                return  # Un request que empezó antes del disparo
+            if row['state'] == HALF_OPEN or blocked or row['failures'] >= self.failure_threshold:
+                row['trips'] += 1
+                cooldown = min(self.cooldown * 2 ** (row['trips'] - 1), self.max_cooldown)
+                row['state'] = OPEN
+                row['open_until'] = now + cooldown
+                row['probe_until'] = 0.0
+                print(f"🔌 {site}: circuito abierto ({reason}), se omite por {cooldown:.0f}s")
+
+    def release(self, site):
+        """Libera el lease de una prueba half-open que no pudo decidir nada"""
+        with self._row(site) as row:
+            if row['state'] == HALF_OPEN:
+                row['probe_until'] = 0.0
+
+    def state(self, site):
+        with self._row(site) as row:
+            return row['state']
+
+    def stats(self):
+        """Estado de cada tienda con historial"""
+        now = time.time()
+        if self.path is None:
+            with self._lock:
+                rows = {site: dict(row) for site, row in self._memory.items()}
+        else:
+            conn = sqlite3.connect(self.path, timeout=5)
+            try:
+                rows = {
+                    site: dict(zip(_COLUMNS, values))
+                    for site, *values in conn.execute(f'SELECT site, {", ".join(_COLUMNS)} FROM breakers')
+                }
+            finally:
+                conn.close()
+        return {
+            site: {
+                'estado': row['state'],
+                'fallos_consecutivos': row['failures'],
+                'disparos': row['trips'],
+                'reabre_en': round(max(0.0, row['open_until'] - now), 1) if row['state'] == OPEN else 0.0,
+                'ultimo_error': row['last_error'],
+            }
+            for site, row in rows.items()
+        }
+
+    def reset(self):
+        if self.path is None:
+            with self._lock:
+                self._memory.clear()
+            return
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                conn.execute('DELETE FROM breakers')
+        finally:
+            conn.close()
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_breaker():
+    """Breaker compartido; None si está desactivado"""
+    global _breaker
+    if not Config.BREAKER_ENABLED:
+        return None
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                try:
+                    _breaker = CircuitBreaker(Config.BREAKER_STATE_PATH)
+                except Exception as e:
+                    print(f"⚠ Estado compartido del circuit breaker no disponible ({str(e)[:100]}), usando memoria")
+                    _breaker = CircuitBreaker(None)
+    return _breaker
+
+
+def reset_breaker():
+    """Descarta el breaker compartido; el próximo get_breaker() lo crea con la configuración actual"""
+    global _breaker
+    with _breaker_lock:
+        _breaker = None
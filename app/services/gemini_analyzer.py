@@ -1,5 +1,18 @@
-import json
-import re
+import queue
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from config import Config
+from app.services.cache import get_analysis_cache, key_id
+from app.services.singleflight import get_flight
+from app.services.json_stream import IncrementalJSONParser
+from app.services.products import ProductBatch
+from app.services.price_stats import PriceTable, Recommendation, classify_price
+from app.services.matching import cluster_products
+from app.services.price_history import get_price_history
+from app.services.prompt_encoding import encode_products, estimate_tokens, fit_to_budget, split_batches
 
 # Importar Gemini de forma opcional
 try:
@@ -9,13 +22,218 @@ except ImportError:
     GEMINI_AVAILABLE = False
     print("⚠ google-generativeai no disponible")
 
+# Modelos en orden de preferencia
+MODELS_TO_TRY = [
+    'gemini-1.5-flash-latest',
+    'gemini-1.5-flash',
+    'gemini-1.0-pro',
+    'gemini-pro'
+]
+
+# Respuesta "delta": Gemini devuelve solo el id del producto y los campos que
+# deriva la IA, con claves y valores abreviados; el resto se une localmente.
+DELTA_KEYS = {
+    'n': 'nombre_normalizado',
+    'cat': 'categoria',
+    'cond': 'condicion',
+    'sp': 'especificaciones_detectadas',
+    'rec': 'recomendacion',
+    'why': 'razon',
+    'v': 'valor_score',
+}
+
+RECOMMENDATION_CODES = {
+    'B': Recommendation.BEST.label,
+    'A': Recommendation.GOOD.label,
+    'C': Recommendation.CONSIDER.label,
+    'X': Recommendation.NOT_RECOMMENDED.label,
+}
+
+CATEGORY_CODES = {'I': 'Idéntico', 'S': 'Similar', 'D': 'Diferente'}
+
+CONDITION_CODES = {'N': 'Nuevo', 'R': 'Reacondicionado', 'U': 'Usado', '?': 'Desconocido'}
+
+DELTA_CODES_HELP = """CÓDIGOS:
+- cat: I=Idéntico, S=Similar, D=Diferente
+- cond: N=Nuevo, R=Reacondicionado, U=Usado, ?=Desconocido
+- rec: B=Mejor Opción (precio más bajo), A=Buena Alternativa (precio razonable), C=Considerar (precio alto), X=No Recomendado (precio excesivo)
+- v: puntaje de valor 0-100"""
+
+# Salida estructurada (response_schema): JSON garantizado por el modelo
+DELTA_PRODUCT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'id': {'type': 'INTEGER'},
+        'n': {'type': 'STRING'},
+        'cat': {'type': 'STRING'},
+        'cond': {'type': 'STRING'},
+        'sp': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'rec': {'type': 'STRING'},
+        'why': {'type': 'STRING'},
+        'v': {'type': 'INTEGER'},
+    },
+    'required': ['id', 'rec'],
+}
+
+SUMMARY_PROPERTIES = {
+    'summary': {'type': 'STRING'},
+    'insights': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+}
+
+# Orden de propiedades: resumen primero, productos al final (se recuperan uno a uno)
+ANALYSIS_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': dict(SUMMARY_PROPERTIES, products={'type': 'ARRAY', 'items': DELTA_PRODUCT_SCHEMA}),
+    'required': ['summary', 'insights', 'products'],
+}
+
+BATCH_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {'products': {'type': 'ARRAY', 'items': DELTA_PRODUCT_SCHEMA}},
+    'required': ['products'],
+}
+
+SUMMARY_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': SUMMARY_PROPERTIES,
+    'required': ['summary', 'insights'],
+}
+
+# Valores por defecto si el modelo omite un campo
+DELTA_DEFAULTS = {
+    'categoria': 'Similar',
+    'condicion': 'Desconocido',
+    'especificaciones_detectadas': [],
+    'razon': '',
+}
+
+# Campos que un producto hereda del representante de su grupo de equivalentes
+MATCHED_FIELDS = ('nombre_normalizado', 'categoria', 'condicion', 'especificaciones_detectadas')
+
+# Límite de Gemini compartido por el proceso: llamadas simultáneas + intervalo
+# mínimo entre inicios (mismo esquema de turnos que la cortesía por tienda)
+_gemini_semaphore = threading.BoundedSemaphore(Config.GEMINI_MAX_CONCURRENCY)
+_gemini_next_slot = 0.0
+_gemini_slot_lock = threading.Lock()
+
+
+@contextmanager
+def _gemini_slot():
+    """Espera turno para llamar a Gemini (GEMINI_MAX_CONCURRENCY / GEMINI_MIN_INTERVAL)"""
+    global _gemini_next_slot
+    with _gemini_semaphore:
+        with _gemini_slot_lock:
+            now = time.monotonic()
+            slot = max(now, _gemini_next_slot)
+            _gemini_next_slot = slot + Config.GEMINI_MIN_INTERVAL
+        if slot > now:
+            time.sleep(slot - now)
+        yield
+
+
+# Modelos que rechazaron response_mime_type/response_schema (modelos 1.0)
+_json_mode_unsupported = set()
+
+# Caché de resolución de modelo por API key: {hash_key: (modelo, candidatos, resuelto_en)}
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+
+
+def _key_id(api_key):
+    # No guardar la API key en claro en memoria compartida
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+def _list_candidate_models():
+    """
+    Candidatos disponibles según list_models (una sola llamada, sin generar contenido).
+    Si list_models no está disponible se prueban todos en orden de forma perezosa.
+    """
+    try:
+        available = {
+            m.name.split('/')[-1]
+            for m in genai.list_models()
+            if 'generateContent' in getattr(m, 'supported_generation_methods', [])
+        }
+    except Exception as e:
+        if _is_auth_error(e):
+            raise
+        print(f"⚠ list_models no disponible ({str(e)[:50]}), resolviendo al usar")
+        return list(MODELS_TO_TRY)
+    return [name for name in MODELS_TO_TRY if name in available]
+
+
+def _resolve_model_name(api_key):
+    """Modelo a usar para esta API key (cacheado con TTL; None = sin modelos, TTL corto)"""
+    key_id = _key_id(api_key)
+    now = time.time()
+    with _model_cache_lock:
+        entry = _model_cache.get(key_id)
+        if entry:
+            ttl = Config.GEMINI_MODEL_CACHE_TTL if entry[0] else Config.GEMINI_MODEL_NEGATIVE_TTL
+            if now - entry[2] < ttl:
+                return entry[0]
+    
+    candidates = _list_candidate_models()
+    if not candidates:
+        # Cachear también el "sin modelos": evita un list_models por request
+        with _model_cache_lock:
+            _model_cache[key_id] = (None, [], now)
+        return None
+    with _model_cache_lock:
+        _model_cache[key_id] = (candidates[0], candidates, now)
+    print(f"🔎 Modelo de Gemini resuelto: {candidates[0]}")
+    return candidates[0]
+
+
+def _invalidate_model(api_key, model_name):
+    """Descarta un modelo que ya no existe; devuelve el siguiente candidato o None"""
+    key_id = _key_id(api_key)
+    with _model_cache_lock:
+        entry = _model_cache.get(key_id)
+        candidates = list(entry[1]) if entry else list(MODELS_TO_TRY)
+        if model_name in candidates:
+            candidates = candidates[candidates.index(model_name) + 1:]
+        if not candidates:
+            _model_cache.pop(key_id, None)
+            return None
+        _model_cache[key_id] = (candidates[0], candidates, time.time())
+        return candidates[0]
+
+
+def _is_model_not_found(error):
+    text = str(error).lower()
+    return type(error).__name__ == 'NotFound' or '404' in text or 'not found' in text
+
+
+def _is_json_mode_unsupported(error):
+    text = str(error).lower()
+    return 'response_mime_type' in text or 'response_schema' in text or 'json mode' in text
+
+
+def _is_auth_error(error):
+    text = str(error).lower()
+    return (type(error).__name__ in ('PermissionDenied', 'Unauthenticated')
+            or 'api key not valid' in text or 'api_key_invalid' in text)
+
+
 class GeminiAnalyzer:
     """Servicio para analizar productos - con fallback si Gemini falla"""
     
+    # Configuración de generación (forma parte de la clave de caché)
+    GENERATION_CONFIG = {
+        'temperature': 0.7,
+        'top_p': 0.8,
+        'top_k': 40,
+        'max_output_tokens': 2048,
+    }
+    
     def __init__(self, api_key):
         self.api_key = api_key
         self.model = None
+        self.model_name = None
         self.use_fallback = False
+        self.cache = get_analysis_cache()
         
         if not GEMINI_AVAILABLE:
             print("⚠ Usando análisis básico (Gemini no disponible)")
@@ -25,41 +243,50 @@ class GeminiAnalyzer:
         try:
             genai.configure(api_key=api_key)
             
-            # Probar modelos en orden - el que funcione primero
-            models_to_try = [
-                'gemini-1.5-flash-latest',
-                'gemini-1.5-flash', 
-                'gemini-1.0-pro',
-                'gemini-pro'
-            ]
-            
-            for model_name in models_to_try:
-                try:
-                    self.model = genai.GenerativeModel(model_name)
-                    # Probar que realmente funciona
-                    test_response = self.model.generate_content("test")
-                    print(f"✓ Gemini configurado: {model_name}")
-                    self.use_fallback = False
-                    return
-                except Exception as e:
-                    print(f"⚠ {model_name} no funciona: {str(e)[:50]}")
-                    continue
+            # Modelo resuelto una vez por API key (sin llamadas de prueba por request)
+            model_name = _resolve_model_name(api_key)
+            if not model_name:
+                print("⚠ Ningún modelo de Gemini disponible, usando análisis básico")
+                self.use_fallback = True
+                return
             
-            # Si ningún modelo funcionó, usar fallback
-            print("⚠ Ningún modelo de Gemini funcionó, usando análisis básico")
-            self.use_fallback = True
+            self._use_model(model_name)
                     
         except Exception as e:
             print(f"✗ Error configurando Gemini: {str(e)}")
             print("⚠ Usando análisis básico en su lugar")
             self.use_fallback = True
     
+    def _use_model(self, model_name):
+        """Instancia el modelo (no hace llamadas de red)"""
+        self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        self.use_fallback = False
+        print(f"✓ Gemini configurado: {model_name}")
+    
+    def _generate(self, prompt, **kwargs):
+        """
+        generate_content con recuperación si el modelo cacheado dejó de existir:
+        invalida la caché de modelos y reintenta con el siguiente candidato.
+        """
+        while True:
+            try:
+                return self.model.generate_content(prompt, **kwargs)
+            except Exception as e:
+                if not _is_model_not_found(e):
+                    raise
+                print(f"⚠ Modelo {self.model_name} no encontrado, buscando otro...")
+                next_model = _invalidate_model(self.api_key, self.model_name)
+                if not next_model:
+                    raise
+                self._use_model(next_model)
+    
     def analyze_products(self, raw_products, product_name):
         """
         Analiza productos - con IA si está disponible, o análisis básico
         
         Args:
-            raw_products (list): Lista de productos sin procesar
+            raw_products (list|ProductBatch): Productos scrapeados (Product o dicts)
             product_name (str): Nombre del producto buscado
             
         Returns:
@@ -67,59 +294,131 @@ class GeminiAnalyzer:
         """
         if not raw_products:
             return None
+        raw_products = ProductBatch.from_products(raw_products)
         
         # Si Gemini no está disponible o falló, usar análisis básico
         if self.use_fallback:
             print("⚠ Usando análisis básico (sin IA)")
             return self._basic_analysis(raw_products, product_name)
         
-        # Construir el prompt para Gemini
-        prompt = self._build_analysis_prompt(raw_products, product_name)
+        # Mismo producto + mismos resultados = mismo análisis: evitar la llamada a Gemini
+        generation_config, cache_key = self._cache_key(raw_products, product_name)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            print(f"💾 Análisis desde caché ({len(cached.get('products', []))} productos)")
+            return cached
         
-        try:
-            # Llamar a Gemini
-            print("🤖 Enviando prompt a Gemini...")
-            print(f"   Productos a analizar: {len(raw_products)}")
-            
-            # Configuración para mejor compatibilidad
-            generation_config = {
-                'temperature': 0.7,
-                'top_p': 0.8,
-                'top_k': 40,
-                'max_output_tokens': 2048,
-            }
-            
-            print("   Generando contenido...")
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-            
-            print(f"✓ Respuesta recibida de Gemini")
-            
-            # Verificar si hay respuesta
-            if not response or not hasattr(response, 'text'):
-                print("✗ Gemini no devolvió respuesta válida")
-                raise Exception("Gemini no devolvió respuesta válida. Verifica tu API key.")
-            
-            # Extraer el JSON de la respuesta
-            print("   Parseando respuesta JSON...")
-            analysis = self._parse_gemini_response(response.text)
+        # Análisis idénticos en curso (misma API key) comparten una sola llamada a Gemini
+        analysis, shared = get_flight('analysis').do(
+            (cache_key, key_id(self.api_key)),
+            lambda: self._analyze_with_gemini(raw_products, product_name, generation_config, cache_key)
+        )
+        if shared:
+            print("🔗 Análisis compartido con una búsqueda idéntica en curso")
+        return analysis
+    
+    def stream_analysis(self, raw_products, product_name):
+        """
+        Análisis en streaming para la capa de rutas
+        
+        Generador de (evento, datos) a medida que se decodifica la respuesta de Gemini:
+            ('summary', {'summary', 'insights'})  → resumen/insights en cuanto llegan
+            ('product', producto)                  → cada producto ya unido a sus datos
+            ('analysis', análisis)                 → resultado final (igual que analyze_products)
+        Desde caché o sin IA solo se emite 'analysis'. Los errores se relanzan.
+        """
+        if not raw_products:
+            return
+        raw_products = ProductBatch.from_products(raw_products)
+        
+        if self.use_fallback:
+            print("⚠ Usando análisis básico (sin IA)")
+            yield 'analysis', self._basic_analysis(raw_products, product_name)
+            return
+        
+        generation_config, cache_key = self._cache_key(raw_products, product_name)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            print(f"💾 Análisis desde caché ({len(cached.get('products', []))} productos)")
+            yield 'analysis', cached
+            return
+        
+        # Gemini corre en un thread; sus eventos llegan por la cola
+        events = queue.Queue()
+        
+        def run():
+            try:
+                analysis, _ = get_flight('analysis').do(
+                    (cache_key, key_id(self.api_key)),
+                    lambda: self._analyze_with_gemini(
+                        raw_products, product_name, generation_config, cache_key, on_event=events.put
+                    )
+                )
+                events.put(('done', analysis))
+            except Exception as e:
+                events.put(('error', e))
+        
+        threading.Thread(target=run, daemon=True, name='gemini-stream').start()
+        
+        context = self._price_context(raw_products)
+        summary = {}
+        sent = set()
+        while True:
+            event = events.get()
+            kind = event[0]
+            if kind == 'done':
+                yield 'analysis', event[1]
+                return
+            if kind == 'error':
+                raise event[1]
             
-            if not analysis:
-                print("✗ No se pudo parsear la respuesta de Gemini")
-                raise Exception("No se pudo parsear la respuesta de Gemini")
+            _, key, value = event
+            if kind == 'field' and key in ('summary', 'insights'):
+                summary[key] = value
+                yield 'summary', dict(summary)
+            elif kind == 'item' and key == 'products':
+                joined = self._join_delta(value, raw_products, context['promedio'])
+                if joined is not None and joined[0] not in sent:
+                    sent.add(joined[0])
+                    yield 'product', joined[1]
+    
+    def _cache_key(self, raw_products, product_name):
+        generation_config = dict(self.GENERATION_CONFIG)
+        # Filas ordenadas: las tiendas llegan en cualquier orden y el resultado es el mismo
+        rows = sorted(raw_products.rows())
+        return generation_config, self.cache.key(product_name, self.model_name, rows, generation_config)
+    
+    def _analyze_with_gemini(self, raw_products, product_name, generation_config, cache_key, on_event=None):
+        """
+        Llamada(s) a Gemini + unión local + estadísticas (guarda el resultado en caché)
+        
+        on_event recibe los eventos del parser incremental (campos y productos
+        decodificados) mientras la respuesta llega en streaming.
+        """
+        try:
+            representatives = self._group_equivalents(raw_products)
+            indices = sorted(set(representatives.values())) if representatives else None
+            batches = split_batches(raw_products, indices=indices)
+            if len(batches) > 1:
+                analysis, included = self._analyze_in_batches(raw_products, product_name, batches, generation_config, on_event)
+            else:
+                analysis, included = self._analyze_single(raw_products, product_name, generation_config, on_event, indices)
             
             if not analysis.get('products'):
                 print("✗ La respuesta de Gemini no contiene productos")
                 raise Exception("La respuesta de Gemini no contiene productos")
             
+            # Recuperar datos originales por id (URL, precio...) y completar los recortados
+            analysis['products'] = self._merge_source_fields(analysis['products'], raw_products, included, representatives)
+            self._attach_history(analysis['products'])
+            
             # Calcular estadísticas
             print("   Calculando estadísticas...")
             statistics = self._calculate_statistics(analysis.get('products', []))
             analysis['statistics'] = statistics
             
             print(f"✓ Análisis completado: {len(analysis.get('products', []))} productos procesados")
+            self.cache.set(cache_key, analysis)
             return analysis
             
         except Exception as e:
@@ -128,102 +427,361 @@ class GeminiAnalyzer:
             print(traceback.format_exc())
             raise  # Re-raise para que el caller maneje el error
     
-    def _build_analysis_prompt(self, products, product_name):
-        """Construye un prompt SIMPLE y EFECTIVO para Gemini"""
+    def _group_equivalents(self, raw_products):
+        """
+        Agrupa publicaciones equivalentes entre tiendas (matching local)
         
-        # Prompt más corto y directo para mejor rendimiento
-        prompt = f"""Analiza estos productos y devuelve SOLO JSON válido (sin texto extra):
+        Returns:
+            dict: id → id del representante, o None si no hay nada que agrupar
+        """
+        if not Config.MATCHING_ENABLED or len(raw_products) < 2:
+            return None
+        representatives = cluster_products(raw_products)
+        groups = len(set(representatives.values()))
+        if groups == len(raw_products):
+            return None
+        print(f"🔗 Emparejamiento: {len(raw_products)} productos → {groups} grupos equivalentes")
+        return representatives
+    
+    def _analyze_single(self, raw_products, product_name, generation_config, on_event=None, indices=None):
+        """Un solo prompt con todos los productos (resumen + deltas)"""
+        prompt, included = self._build_analysis_prompt(raw_products, product_name, indices)
+        print("🤖 Enviando prompt a Gemini...")
+        print(f"   Productos a analizar: {len(included)}/{len(raw_products)}")
+        analysis = self._call_gemini(prompt, generation_config, schema=ANALYSIS_SCHEMA, on_event=on_event)
+        return analysis, included
+    
+    def _analyze_in_batches(self, raw_products, product_name, batches, generation_config, on_event=None):
+        """
+        Map-reduce: cada lote de productos se analiza en paralelo (dentro del
+        límite de Gemini) y, a la vez, un prompt corto con las estadísticas
+        locales genera el resumen y los insights. La latencia es la del lote
+        más lento, no la suma.
+        """
+        included = [index for batch in batches for index, _ in batch]
+        print(f"🤖 Análisis en {len(batches)} lotes ({len(included)}/{len(raw_products)} productos)")
+        context = self._price_context(raw_products)
+        context['historial'] = self._history_line(product_name)
+        
+        deltas = []
+        summary = None
+        workers = min(Config.GEMINI_MAX_CONCURRENCY, len(batches) + 1)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gemini-batch') as executor:
+            summary_future = executor.submit(
+                self._call_gemini, self._build_summary_prompt(raw_products, product_name, context),
+                generation_config, 'resumen', SUMMARY_SCHEMA, on_event
+            )
+            batch_futures = {
+                executor.submit(
+                    self._call_gemini, self._build_batch_prompt(batch, product_name, context),
+                    generation_config, f'lote {number}/{len(batches)}', BATCH_SCHEMA, on_event
+                ): number
+                for number, batch in enumerate(batches, 1)
+            }
+            
+            for future in as_completed(batch_futures):
+                try:
+                    deltas.extend(future.result().get('products', []))
+                except Exception as e:
+                    # Los productos del lote se completan con el análisis básico
+                    print(f"⚠ Lote {batch_futures[future]} falló: {str(e)[:150]}")
+            
+            try:
+                summary = summary_future.result()
+            except Exception as e:
+                print(f"⚠ Resumen de Gemini falló, usando resumen local: {str(e)[:150]}")
+        
+        if not summary or not summary.get('summary'):
+            local_rows = [
+                self._basic_product(p, context['promedio'], context['minimo']) for p in raw_products
+            ]
+            summary_text, insights = self._basic_summary(local_rows, product_name)
+            summary = {'summary': summary_text, 'insights': insights}
+        
+        return {
+            'summary': summary.get('summary', ''),
+            'insights': summary.get('insights', []),
+            'products': deltas,
+        }, included
+    
+    def _call_gemini(self, prompt, generation_config, label=None, schema=None, on_event=None):
+        """
+        Una llamada a Gemini (respetando el límite del proceso) → JSON parseado
+        
+        Pide JSON con esquema si el modelo lo soporta y lee la respuesta en
+        streaming con el parser incremental: si se corta, se conservan los
+        productos que llegaron completos.
+        """
+        prompt_tokens = estimate_tokens(prompt)
+        prefix = f"[{label}] " if label else ""
+        print(f"   {prefix}📏 Prompt: ~{prompt_tokens} tokens estimados ({len(prompt)} chars)")
+        
+        with _gemini_slot():
+            print(f"   {prefix}Generando contenido...")
+            response, parser = self._generate_json(prompt, generation_config, schema, on_event)
+        
+        print(f"✓ {prefix}Respuesta recibida de Gemini")
+        self._log_token_usage(response, prompt_tokens)
+        
+        # Verificar si hay respuesta
+        if response is None or not parser.started:
+            print("✗ Gemini no devolvió respuesta válida")
+            raise Exception("Gemini no devolvió respuesta válida. Verifica tu API key.")
+        
+        analysis = parser.result()
+        if not parser.done:
+            recovered = len(analysis.get('products', []))
+            print(f"⚠ {prefix}Respuesta truncada: recuperados {recovered} productos completos")
+        
+        if not analysis:
+            print("✗ No se pudo parsear la respuesta de Gemini")
+            raise Exception("No se pudo parsear la respuesta de Gemini")
+        return analysis
+    
+    def _generate_json(self, prompt, generation_config, schema=None, on_event=None):
+        """generate_content en streaming alimentando el parser incremental"""
+        config = dict(generation_config)
+        structured = (Config.GEMINI_STRUCTURED_OUTPUT and schema is not None
+                      and self.model_name not in _json_mode_unsupported)
+        if structured:
+            config['response_mime_type'] = 'application/json'
+            config['response_schema'] = schema
+        
+        try:
+            response = self._generate(prompt, generation_config=config, stream=True)
+            return response, self._read_stream(response, on_event)
+        except Exception as e:
+            if not structured or not _is_json_mode_unsupported(e):
+                raise
+            print(f"⚠ {self.model_name} no soporta salida JSON estructurada, usando prompt libre")
+            _json_mode_unsupported.add(self.model_name)
+            response = self._generate(prompt, generation_config=dict(generation_config), stream=True)
+            return response, self._read_stream(response, on_event)
+    
+    def _read_stream(self, response, on_event=None):
+        parser = IncrementalJSONParser()
+        if response is None:
+            return parser
+        # Respuestas sin streaming (o clientes de prueba) se leen como un solo fragmento
+        chunks = response if hasattr(response, '__iter__') else [response]
+        for chunk in chunks:
+            try:
+                text = chunk.text
+            except (ValueError, AttributeError):
+                continue  # Fragmento sin texto (p. ej. solo metadatos de seguridad)
+            for event in parser.feed(text):
+                if on_event:
+                    on_event(event)
+        return parser
+    
+    def _price_context(self, raw_products):
+        """Referencias globales de precio para que cada lote juzgue contra el total"""
+        prices = raw_products.precios
+        return {
+            'total': len(prices),
+            'minimo': min(prices),
+            'promedio': sum(prices) / len(prices),
+            'maximo': max(prices),
+        }
+    
+    def _build_batch_prompt(self, batch, product_name, context):
+        """Prompt de un lote: solo deltas de productos (el resumen va aparte)"""
+        table = encode_products(batch, Config.PROMPT_MAX_NAME_CHARS)
+        return f"""Analiza estos productos y devuelve SOLO JSON válido (sin texto extra):
 
 PRODUCTO BUSCADO: {product_name}
 
-PRODUCTOS:
-{json.dumps(products, indent=2, ensure_ascii=False)}
+CONTEXTO (todas las tiendas, {context['total']} productos): precio mínimo ${context['minimo']:.2f}, promedio ${context['promedio']:.2f}, máximo ${context['maximo']:.2f}
+Juzga cada producto contra este contexto global, no solo contra este lote.
+{context.get('historial', '')}
+PRODUCTOS (una fila por producto, columnas separadas por |):
+{table}
 
-DEVUELVE JSON con esta estructura exacta:
+DEVUELVE JSON: un objeto por fila con SOLO su id y los campos analizados:
+{{"products": [{{"id": 0, "n": "Nombre normalizado", "cat": "I", "cond": "N", "sp": ["spec1"], "rec": "B", "why": "Razón breve", "v": 85}}]}}
+
+{DELTA_CODES_HELP}"""
+    
+    def _build_summary_prompt(self, raw_products, product_name, context):
+        """Prompt de resumen: estadísticas locales + los más baratos de cada tienda"""
+        cheapest = {}
+        for index, product in enumerate(raw_products):
+            best = cheapest.get(product.tienda)
+            if best is None or product.precio < best[1].precio:
+                cheapest[product.tienda] = (index, product)
+        table = encode_products(sorted(cheapest.values()), Config.PROMPT_MAX_NAME_CHARS)
+        
+        return f"""Resume esta comparación de precios y devuelve SOLO JSON válido (sin texto extra):
+
+PRODUCTO BUSCADO: {product_name}
+
+ESTADÍSTICAS: {context['total']} productos, precio mínimo ${context['minimo']:.2f}, promedio ${context['promedio']:.2f}, máximo ${context['maximo']:.2f}
+{context.get('historial', '')}
+MÁS BARATO POR TIENDA (columnas separadas por |):
+{table}
+
+DEVUELVE JSON:
+{{"summary": "Resumen con recomendación principal y % de ahorro", "insights": ["Observación sobre precios", "Observación sobre valor", "Recomendación"]}}"""
+    
+    def _build_analysis_prompt(self, products, product_name, indices=None):
+        """
+        Construye un prompt COMPACTO para Gemini: tabla con ids en vez de JSON
+        indentado, recortada al presupuesto de tokens
+        
+        Args:
+            indices (list): Ids a incluir (representantes de grupos). Por defecto todos
+        
+        Returns:
+            tuple: (prompt, ids_incluidos)
+        """
+        table, included, table_tokens = fit_to_budget(products, indices=indices)
+        candidates = len(indices) if indices is not None else len(products)
+        if len(included) < candidates:
+            print(f"   ✂️ Presupuesto de tokens: {len(included)}/{candidates} productos en el prompt (~{table_tokens} tokens)")
+        
+        prompt = f"""Analiza estos productos y devuelve SOLO JSON válido (sin texto extra):
+
+PRODUCTO BUSCADO: {product_name}
+{self._history_line(product_name)}
+PRODUCTOS (una fila por producto, columnas separadas por |):
+{table}
+
+DEVUELVE JSON con esta estructura exacta. En "products" un objeto por fila
+con SOLO su id y los campos analizados (no repitas tienda, precio ni nombre original):
 {{
   "summary": "Resumen con recomendación principal y % de ahorro",
-  "insights": [
-    "Observación 1 sobre precios",
-    "Observación 2 sobre valor",
-    "Observación 3 sobre recomendación"
-  ],
+  "insights": ["Observación sobre precios", "Observación sobre valor", "Recomendación"],
   "products": [
-    {{
-      "tienda": "tienda_original",
-      "nombre_normalizado": "Nombre normalizado",
-      "nombre_crudo": "nombre_original",
-      "precio": precio_numero,
-      "url": "url_original",
-      "reviews": reviews_numero,
-      "categoria": "Idéntico",
-      "condicion": "Nuevo",
-      "especificaciones_detectadas": ["spec1"],
-      "recomendacion": "🏆 Mejor Opción",
-      "razon": "Razón breve",
-      "valor_score": 85,
-      "precio_vs_promedio": "-15%"
-    }}
+    {{"id": 0, "n": "Nombre normalizado", "cat": "I", "cond": "N", "sp": ["spec1"], "rec": "B", "why": "Razón breve", "v": 85}}
   ]
 }}
 
-REGLAS:
-- "🏆 Mejor Opción" = precio más bajo
-- "✅ Buena Alternativa" = precio razonable  
-- "⚠️ Considerar" = precio alto
-- "❌ No Recomendado" = precio excesivo
-- Calcula precio_vs_promedio para cada producto
+{DELTA_CODES_HELP}
 - Genera 3 insights útiles"""
         
-        return prompt
+        return prompt, included
     
-    def _parse_gemini_response(self, response_text):
-        """Extrae y parsea el JSON de la respuesta de Gemini"""
+    def _history_line(self, product_name):
+        """Línea de contexto histórico para los prompts ('' si no hay historial)"""
+        history = get_price_history()
+        if history is None:
+            return ''
         try:
-            print(f"📄 Respuesta de Gemini (primeros 200 chars): {response_text[:200]}")
-            
-            # Limpiar la respuesta
-            cleaned_text = response_text.strip()
-            
-            # Remover markdown code blocks si existen
-            if cleaned_text.startswith('```'):
-                # Extraer contenido entre ```json y ```
-                lines = cleaned_text.split('\n')
-                cleaned_text = '\n'.join(lines[1:-1]) if len(lines) > 2 else cleaned_text
-                cleaned_text = cleaned_text.replace('```json', '').replace('```', '').strip()
-            
-            # Intentar encontrar el JSON en la respuesta
-            # Buscar contenido entre llaves
-            start_idx = cleaned_text.find('{')
-            end_idx = cleaned_text.rfind('}')
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = cleaned_text[start_idx:end_idx+1]
-                analysis = json.loads(json_str)
-                print(f"✓ JSON parseado exitosamente")
-                return analysis
-            else:
-                # Si no se encuentra JSON, intentar parsear directamente
-                print("⚠ Intentando parsear respuesta completa como JSON...")
-                return json.loads(cleaned_text)
-                
-        except json.JSONDecodeError as e:
-            print(f"✗ Error al parsear JSON de Gemini: {str(e)}")
-            print(f"📄 Respuesta completa recibida:")
-            print(response_text)
-            print("-" * 50)
-            
-            # Fallback: devolver estructura básica con los productos originales
-            print("⚠ Usando fallback: estructura básica")
-            return {
-                'summary': 'No se pudo generar un resumen automático. Revisa los resultados manualmente.',
-                'products': []
-            }
+            stats = history.query_stats(product_name, until=time.time() - Config.PRICE_HISTORY_MIN_AGE)
         except Exception as e:
-            print(f"✗ Error inesperado al parsear respuesta: {str(e)}")
-            return {
-                'summary': 'Error al procesar la respuesta de Gemini.',
-                'products': []
-            }
+            print(f"⚠ Error leyendo historial de precios: {str(e)[:100]}")
+            return ''
+        if stats is None:
+            return ''
+        return (f"HISTORIAL ({Config.PRICE_HISTORY_WINDOW_DAYS} días, {stats['muestras']} precios): "
+                f"mínimo ${stats['minimo']:.2f}, promedio ${stats['promedio']:.2f}, máximo ${stats['maximo']:.2f}\n"
+                "Indica en el resumen si los precios actuales son buenos comparados con el historial.\n")
+    
+    def _attach_history(self, products):
+        """Agrega 'historial' (mín/promedio de la ventana, ¿bajó?) a los productos con datos previos"""
+        history = get_price_history()
+        if history is None or not products:
+            return
+        try:
+            stats = history.stats_for(
+                {p['nombre_crudo'] for p in products if p.get('nombre_crudo')},
+                until=time.time() - Config.PRICE_HISTORY_MIN_AGE
+            )
+        except Exception as e:
+            print(f"⚠ Error leyendo historial de precios: {str(e)[:100]}")
+            return
+        for product in products:
+            entry = stats.get(product.get('nombre_crudo'))
+            if entry is None or not product.get('precio'):
+                continue
+            product['historial'] = dict(
+                entry,
+                bajo_precio=product['precio'] <= entry['promedio'] * (1 - Config.PRICE_DROP_THRESHOLD),
+                minimo_historico=product['precio'] <= entry['minimo'],
+            )
+    
+    def _log_token_usage(self, response, estimated):
+        """Tokens reales del prompt/respuesta si la API los reporta"""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is None:
+            return
+        prompt_count = getattr(usage, 'prompt_token_count', None)
+        output_count = getattr(usage, 'candidates_token_count', None)
+        print(f"   📏 Tokens: prompt={prompt_count} (estimado {estimated}), respuesta={output_count}")
+    
+    def _expand_delta(self, delta):
+        """Claves/códigos abreviados de la respuesta → campos completos del producto"""
+        product = {}
+        for key, value in delta.items():
+            product[DELTA_KEYS.get(key, key)] = value
+        
+        product['recomendacion'] = RECOMMENDATION_CODES.get(product.get('recomendacion'), product.get('recomendacion'))
+        product['categoria'] = CATEGORY_CODES.get(product.get('categoria'), product.get('categoria'))
+        product['condicion'] = CONDITION_CODES.get(product.get('condicion'), product.get('condicion'))
+        for field, default in DELTA_DEFAULTS.items():
+            if product.get(field) is None:
+                product[field] = list(default) if isinstance(default, list) else default
+        return product
+    
+    def _join_delta(self, delta, raw_products, avg_price):
+        """
+        Un delta de Gemini + los datos scrapeados de su id
+        
+        Returns:
+            tuple: (id, producto) - id None si la respuesta no usa ids; None si no se puede unir
+        """
+        product = self._expand_delta(delta)
+        index = product.pop('id', None)
+        if isinstance(index, int) and 0 <= index < len(raw_products):
+            product.update(raw_products[index].to_dict())
+        elif 'precio' not in product:
+            return None  # Sin id válido ni datos propios: no se puede unir
+        else:
+            index = None
+        product.setdefault('nombre_normalizado', product.get('nombre_crudo', ''))
+        product['precio_vs_promedio'] = f"{((product['precio'] - avg_price) / avg_price) * 100:+.1f}%"
+        return index, product
+    
+    def _merge_source_fields(self, analyzed, raw_products, included, representatives=None):
+        """
+        Une los deltas de Gemini con los datos scrapeados de su id (URL, tienda,
+        precio...). Los productos equivalentes a un representante analizado
+        heredan sus campos descriptivos; los que el modelo omitió o que
+        quedaron fuera del prompt por presupuesto se completan con el análisis
+        básico.
+        """
+        prices = raw_products.precios
+        avg_price = sum(prices) / len(prices)
+        min_price = min(prices)
+        
+        merged = []
+        seen = {}
+        for delta in analyzed:
+            joined = self._join_delta(delta, raw_products, avg_price)
+            if joined is None:
+                continue
+            index, product = joined
+            if index is not None:
+                if index in seen:
+                    continue
+                seen[index] = product
+            merged.append(product)
+        
+        # Solo si la respuesta usa ids (si no, no se sabe qué productos cubrió)
+        if seen:
+            omitted = [i for i in included if i not in seen]
+            if omitted:
+                print(f"   ⚠ Gemini omitió {len(omitted)} productos, completados localmente")
+            for i in range(len(raw_products)):
+                if i in seen:
+                    continue
+                row = self._basic_product(raw_products[i], avg_price, min_price)
+                source = seen.get(representatives[i]) if representatives else None
+                if source is not None:
+                    # Mismo producto en otra tienda: la recomendación sigue siendo por su precio
+                    row.update({field: source[field] for field in MATCHED_FIELDS if field in source})
+                merged.append(row)
+        return merged
     
     def _basic_analysis(self, raw_products, product_name):
         """Análisis básico SIN IA - para cuando Gemini no está disponible"""
@@ -231,65 +789,22 @@ REGLAS:
         
         # DEBUG: Ver qué productos llegaron
         from collections import Counter
-        tiendas_raw = Counter(p['tienda'] for p in raw_products)
+        tiendas_raw = Counter(raw_products.tiendas)
         print(f"   Productos por tienda recibidos:")
         for tienda, count in tiendas_raw.items():
             print(f"     - {tienda}: {count} productos")
         
-        # Calcular estadísticas
-        prices = [p['precio'] for p in raw_products]
-        avg_price = sum(prices) / len(prices)
-        min_price = min(prices)
-        max_price = max(prices)
+        # Recomendación, % vs promedio y puntaje de todos los productos a la vez
+        recommendations, diffs, scores = PriceTable(raw_products).score()
+        processed_products = [
+            self._basic_row(product, recommendation, diff, score)
+            for product, recommendation, diff, score in zip(raw_products, recommendations, diffs, scores)
+        ]
         
-        # Procesar productos
-        processed_products = []
-        for product in raw_products:
-            precio = product['precio']
-            diff_pct = ((precio - avg_price) / avg_price) * 100
-            
-            # Determinar recomendación basada en precio
-            if precio == min_price:
-                recomendacion = "🏆 Mejor Opción"
-                razon = f"Precio más bajo encontrado (${precio:.2f})"
-            elif precio <= avg_price:
-                recomendacion = "✅ Buena Alternativa"
-                razon = f"Precio por debajo del promedio ({diff_pct:+.1f}%)"
-            elif precio <= avg_price * 1.15:
-                recomendacion = "⚠️ Considerar"
-                razon = f"Precio ligeramente elevado ({diff_pct:+.1f}%)"
-            else:
-                recomendacion = "❌ No Recomendado"
-                razon = f"Precio muy alto ({diff_pct:+.1f}%)"
-            
-            processed_products.append({
-                'tienda': product['tienda'],
-                'nombre_normalizado': product['nombre_crudo'],
-                'nombre_crudo': product['nombre_crudo'],
-                'precio': precio,
-                'url': product['url'],
-                'reviews': product.get('reviews', 4.0),
-                'categoria': 'Similar',
-                'condicion': 'Nuevo',
-                'especificaciones_detectadas': [],
-                'recomendacion': recomendacion,
-                'razon': razon,
-                'valor_score': 100 - int(abs(diff_pct)),
-                'precio_vs_promedio': f"{diff_pct:+.1f}%"
-            })
+        self._attach_history(processed_products)
         
         # Generar resumen e insights
-        best_product = min(processed_products, key=lambda x: x['precio'])
-        savings = max_price - min_price
-        savings_pct = (savings / max_price) * 100 if max_price > 0 else 0
-        
-        summary = f"Análisis de precios para {product_name}: Encontrados {len(processed_products)} productos. El mejor precio es ${min_price:.2f} en {best_product['tienda']}, ahorrando ${savings:.2f} ({savings_pct:.1f}%) vs el más caro."
-        
-        insights = [
-            f"💰 El precio más bajo ({best_product['tienda']}: ${min_price:.2f}) ahorra ${savings:.2f} vs el más alto",
-            f"📊 Precio promedio del mercado: ${avg_price:.2f}",
-            f"✅ {sum(1 for p in processed_products if '✅' in p['recomendacion'] or '🏆' in p['recomendacion'])} opciones recomendadas encontradas"
-        ]
+        summary, insights = self._basic_summary(processed_products, product_name)
         
         statistics = self._calculate_statistics(processed_products)
         
@@ -308,33 +823,66 @@ REGLAS:
             'statistics': statistics
         }
     
-    def _calculate_statistics(self, products):
-        """Calcula estadísticas sobre los productos analizados"""
-        if not products:
-            return {}
-        
-        prices = [p['precio'] for p in products if p.get('precio')]
-        
-        if not prices:
-            return {}
-        
+    def _basic_summary(self, processed_products, product_name):
+        """Resumen e insights calculados localmente (sin IA)"""
+        prices = [p['precio'] for p in processed_products]
         avg_price = sum(prices) / len(prices)
         min_price = min(prices)
         max_price = max(prices)
         
-        # Contar recomendaciones
-        best_price_count = sum(1 for p in products if '🏆' in p.get('recomendacion', ''))
-        alternative_count = sum(1 for p in products if '✅' in p.get('recomendacion', ''))
-        consider_count = sum(1 for p in products if '⚠️' in p.get('recomendacion', ''))
-        not_recommended_count = sum(1 for p in products if '❌' in p.get('recomendacion', ''))
+        best_product = min(processed_products, key=lambda x: x['precio'])
+        savings = max_price - min_price
+        savings_pct = (savings / max_price) * 100 if max_price > 0 else 0
+        
+        summary = f"Análisis de precios para {product_name}: Encontrados {len(processed_products)} productos. El mejor precio es ${min_price:.2f} en {best_product['tienda']}, ahorrando ${savings:.2f} ({savings_pct:.1f}%) vs el más caro."
+        
+        insights = [
+            f"💰 El precio más bajo ({best_product['tienda']}: ${min_price:.2f}) ahorra ${savings:.2f} vs el más alto",
+            f"📊 Precio promedio del mercado: ${avg_price:.2f}",
+            f"✅ {sum(1 for p in processed_products if Recommendation.from_label(p['recomendacion']) <= Recommendation.GOOD)} opciones recomendadas encontradas"
+        ]
+        return summary, insights
+    
+    def _basic_product(self, product, avg_price, min_price):
+        """Fila de análisis básico (solo precio) para un producto"""
+        precio = product.precio
+        diff_pct = ((precio - avg_price) / avg_price) * 100
+        recommendation = classify_price(precio, avg_price, min_price)
+        return self._basic_row(product, recommendation, diff_pct, 100 - int(abs(diff_pct)))
+    
+    def _basic_row(self, product, recommendation, diff_pct, valor_score):
+        """Product → fila de la respuesta (única copia, en el borde)"""
+        precio = product.precio
+        
+        # Razón según la recomendación
+        if recommendation == Recommendation.BEST:
+            razon = f"Precio más bajo encontrado (${precio:.2f})"
+        elif recommendation == Recommendation.GOOD:
+            razon = f"Precio por debajo del promedio ({diff_pct:+.1f}%)"
+        elif recommendation == Recommendation.CONSIDER:
+            razon = f"Precio ligeramente elevado ({diff_pct:+.1f}%)"
+        else:
+            razon = f"Precio muy alto ({diff_pct:+.1f}%)"
         
         return {
-            'precio_promedio': round(avg_price, 2),
-            'precio_minimo': round(min_price, 2),
-            'precio_maximo': round(max_price, 2),
-            'rango_precio': round(max_price - min_price, 2),
-            'total_productos': len(products),
-            'mejores_precios': best_price_count,
-            'alternativas': alternative_count,
-            'no_recomendados': not_recommended_count
-        }
\ No newline at end of file
+            'tienda': product.tienda,
+            'nombre_normalizado': product.nombre_crudo,
+            'nombre_crudo': product.nombre_crudo,
+            'precio': precio,
+            'url': product.url,
+            'reviews': product.reviews,
+            'categoria': 'Similar',
+            'condicion': 'Nuevo',
+            'especificaciones_detectadas': [],
+            'recomendacion': recommendation.label,
+            'razon': razon,
+            'valor_score': valor_score,
+            'precio_vs_promedio': f"{diff_pct:+.1f}%"
+        }
+    
+    def _calculate_statistics(self, products):
+        """Calcula estadísticas sobre los productos analizados (motor columnar)"""
+        priced = [p for p in products if p.get('precio')]
+        if not priced:
+            return {}
+        return PriceTable(priced).summary()
\ No newline at end of file
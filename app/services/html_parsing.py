@@ -0,0 +1,59 @@
+"""
+Construcción del árbol HTML para los parsers de tiendas
+Backends intercambiables (lxml rápido en C, html5lib puro Python como
+referencia) y extracción dirigida: solo se construyen los contenedores de
+resultados en vez del DOM completo (páginas de 1-3 MB).
+"""
+
+from bs4 import BeautifulSoup, SoupStrainer
+from config import Config
+from app.services.stores import get_store
+
+# Importar lxml de forma opcional
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+PARSER_BACKENDS = ['lxml', 'html.parser', 'html5lib']
+
+
+def get_parser_backend(name=None):
+    """Backend a usar; si lxml no está instalado se usa html5lib"""
+    name = name or Config.HTML_PARSER
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Parser HTML desconocido: {name}")
+    if name == 'lxml' and not LXML_AVAILABLE:
+        return 'html5lib'
+    return name
+
+
+def result_strainer(site):
+    """SoupStrainer con los contenedores de resultados de la tienda (o None)"""
+    store = get_store(site)
+    if store is None:
+        return None
+    return SoupStrainer(store.is_container)
+
+
+def make_soup(content, site, parser=None, parse_only=None):
+    """
+    Construye el árbol para una página de resultados
+
+    Args:
+        content (bytes|str): HTML de la respuesta
+        site (str): Tienda (decide qué contenedores conservar)
+        parser (str): Backend ('lxml', 'html.parser', 'html5lib')
+        parse_only (bool): Construir solo los contenedores de resultados.
+            Por defecto Config.PARSE_ONLY_RESULTS (html5lib no lo soporta)
+
+    Returns:
+        BeautifulSoup: Árbol listo para los parsers de tienda
+    """
+    parser = get_parser_backend(parser)
+    if parse_only is None:
+        parse_only = Config.PARSE_ONLY_RESULTS
+
+    strainer = result_strainer(site) if parse_only and parser != 'html5lib' else None
+    return BeautifulSoup(content, parser, parse_only=strainer)
@@ -0,0 +1,118 @@
+"""
+Sesión HTTP compartida para ScraperAPI
+Pool de conexiones keep-alive por proceso (un pool por worker de gunicorn)
+"""
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    'requests': 0,
+    'errors': 0,
+}
+
+
+def _count_request(response, *args, **kwargs):
+    """Hook de requests: cuenta cada respuesta recibida por la sesión"""
+    with _stats_lock:
+        _stats['requests'] += 1
+
+
+def _build_session():
+    """Crea la sesión con pool, keep-alive y reintentos a nivel de transporte"""
+    retry = Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        connect=Config.HTTP_MAX_RETRIES,
+        read=0,  # Un timeout de lectura ya costó REQUEST_TIMEOUT segundos: no repetir
+        status=Config.HTTP_MAX_RETRIES,
+        status_forcelist=(429, 503),  # Límite de concurrencia de ScraperAPI
+        allowed_methods=frozenset(['GET']),
+        backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=Config.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+        pool_block=Config.HTTP_POOL_BLOCK,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    session.hooks['response'].append(_count_request)
+    return session
+
+
+def get_session():
+    """Devuelve la sesión compartida del proceso (se crea la primera vez)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+                print(f"🔌 Pool HTTP creado: {Config.HTTP_POOL_MAXSIZE} conexiones por host")
+    return _session
+
+
+def record_error():
+    """Registra un error de transporte (timeout, conexión rechazada...)"""
+    with _stats_lock:
+        _stats['errors'] += 1
+
+
+def get_pool_stats():
+    """
+    Estadísticas del pool de conexiones
+
+    Returns:
+        dict: Requests totales, conexiones abiertas y reutilización por host
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+
+    hosts = {}
+    if _session is not None:
+        adapter = _session.get_adapter('https://')
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{key.key_scheme}://{key.key_host}:{key.key_port}"
+            hosts[host] = {
+                'conexiones_abiertas': pool.num_connections,
+                'requests': pool.num_requests,
+                'conexiones_reutilizadas': max(0, pool.num_requests - pool.num_connections),
+                'conexiones_libres': pool.pool.qsize() if pool.pool else 0,
+            }
+
+    connections = sum(h['conexiones_abiertas'] for h in hosts.values())
+    pooled_requests = sum(h['requests'] for h in hosts.values())
+    stats.update({
+        'pool_maxsize': Config.HTTP_POOL_MAXSIZE,
+        'conexiones_abiertas': connections,
+        'tasa_reutilizacion': round(1 - connections / pooled_requests, 3) if pooled_requests else 0.0,
+        'hosts': hosts,
+    })
+    return stats
+
+
+def reset_session():
+    """Cierra la sesión y reinicia las estadísticas (tests / post-fork)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
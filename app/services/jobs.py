@@ -0,0 +1,183 @@
+"""
+Cola de búsquedas en segundo plano
+POST devuelve un job id al instante; un pool de threads del proceso ejecuta
+scraping + análisis y el cliente consulta el progreso con GET. Búsquedas
+idénticas en curso (mismas API keys) se unen al mismo job.
+
+Nota: en Vercel los threads no sobreviven a la respuesta HTTP; este modo está
+pensado para Docker/gunicorn (un pool por worker).
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from app.services.cache import key_id, normalize_query
+from app.services.products import to_dicts
+from app.services.scraper import ProductScraper
+from app.services.gemini_analyzer import GeminiAnalyzer
+
+STATUS_QUEUED = 'queued'
+STATUS_SCRAPING = 'scraping'
+STATUS_ANALYZING = 'analyzing'
+STATUS_DONE = 'done'
+STATUS_ERROR = 'error'
+FINISHED = (STATUS_DONE, STATUS_ERROR)
+
+
+class SearchJob:
+    """Estado de una búsqueda en segundo plano"""
+
+    def __init__(self, key, product_name, sites):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.product_name = product_name
+        self.sites = list(sites)
+        self.status = STATUS_QUEUED
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.stores = {}      # tienda → productos encontrados
+        self.stale = {}       # tienda → edad (s) de la caché vencida servida
+        self.products = []    # productos crudos (parciales mientras scrapea)
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'product_name': self.product_name,
+            'tiendas_completadas': len(self.stores),
+            'tiendas_total': len(self.sites),
+            'tiendas': dict(self.stores),
+            'stale': dict(self.stale),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+        if self.status == STATUS_DONE:
+            data['data'] = self.result
+        elif self.status == STATUS_ERROR:
+            data['error'] = self.error
+        else:
+            data['partial_products'] = to_dicts(self.products)
+        return data
+
+
+class JobManager:
+    """Pool de workers + registro de jobs (en memoria del proceso)"""
+
+    def __init__(self, workers=None, ttl=None):
+        self.ttl = ttl if ttl is not None else Config.JOB_TTL
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.JOB_WORKERS,
+            thread_name_prefix='search-job'
+        )
+        self._jobs = {}
+        self._inflight = {}  # clave de búsqueda → job id
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def job_key(product_name, sites, gemini_key, scraper_key):
+        # Con las keys: un job no se comparte con quien usa otras credenciales
+        return (f"{normalize_query(product_name)}|{','.join(sorted(sites))}"
+                f"|{key_id(gemini_key)}|{key_id(scraper_key)}")
+
+    def submit(self, gemini_key, scraper_key, product_name):
+        """
+        Encola una búsqueda (o se une a una idéntica en curso)
+
+        Returns:
+            tuple: (SearchJob, creado) - creado=False si se reutilizó un job
+        """
+        sites = list(Config.TARGET_SITES)
+        key = self.job_key(product_name, sites, gemini_key, scraper_key)
+        with self._lock:
+            self._purge_expired()
+            job_id = self._inflight.get(key)
+            if job_id is not None:
+                return self._jobs[job_id], False
+
+            job = SearchJob(key, product_name, sites)
+            self._jobs[job.id] = job
+            self._inflight[key] = job.id
+
+        self._executor.submit(self._run, job, gemini_key, scraper_key)
+        return job, True
+
+    def get(self, job_id):
+        """Foto consistente del job (dict) o None si no existe / expiró"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def _update(self, job, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = time.time()
+            if job.status in FINISHED and self._inflight.get(job.key) == job.id:
+                del self._inflight[job.key]
+
+    def _purge_expired(self):
+        # Llamar con self._lock tomado
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _run(self, job, gemini_key, scraper_key):
+        print(f"\n🧵 Job {job.id[:8]}: '{job.product_name}'")
+        try:
+            self._update(job, status=STATUS_SCRAPING)
+            scraper = ProductScraper(scraper_key)
+            for site, products in scraper.iter_site_results(job.product_name, sites=job.sites):
+                with self._lock:
+                    job.stores[site] = len(products)
+                    if site in scraper.stale:
+                        job.stale[site] = scraper.stale[site]
+                    job.products = job.products + list(products)
+                    job.updated_at = time.time()
+
+            if not job.products:
+                self._update(
+                    job, status=STATUS_ERROR,
+                    error='No se encontraron productos. Posibles causas: API key de ScraperAPI incorrecta, límite de requests alcanzado, o el producto no existe en las tiendas.'
+                )
+                return
+
+            self._update(job, status=STATUS_ANALYZING)
+            analyzer = GeminiAnalyzer(gemini_key)
+            analysis = analyzer.analyze_products(job.products, job.product_name)
+            if not analysis:
+                self._update(job, status=STATUS_ERROR,
+                             error='Gemini no pudo analizar los productos. Intenta nuevamente.')
+                return
+
+            self._update(job, status=STATUS_DONE, result={
+                'summary': analysis.get('summary', ''),
+                'insights': analysis.get('insights', []),
+                'products': analysis.get('products', []),
+                'statistics': analysis.get('statistics', {})
+            })
+            print(f"✅ Job {job.id[:8]} completado")
+        except Exception as e:
+            print(f"❌ Job {job.id[:8]} falló: {str(e)[:150]}")
+            self._update(job, status=STATUS_ERROR, error=f'Error en la búsqueda: {str(e)}')
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Gestor de jobs compartido por el proceso"""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = JobManager()
+    return _job_manager
@@ -0,0 +1,161 @@
+"""
+Parser JSON incremental para respuestas de Gemini
+Recibe el texto por fragmentos (generate_content(stream=True)) y entrega cada
+campo de primer nivel y cada objeto de los arrays de primer nivel (productos)
+en cuanto se cierra. Si la respuesta se corta (max_output_tokens) se conserva
+todo lo que llegó completo en vez de descartar la llamada entera.
+"""
+
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Escáner de un objeto JSON de primer nivel
+
+    feed() devuelve los eventos completados con el texto nuevo:
+        ('item', clave, objeto)  → objeto completo dentro del array `clave`
+        ('field', clave, valor)  → campo de primer nivel completo
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.fields = {}
+        self.items = {}  # clave de array → objetos recuperados
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key = None
+        self._expect_key = False
+        self._value_start = None
+        self._value_is_array = False
+        self._item_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        events = []
+        buffer = self.buffer
+        i = self.pos
+
+        while i < len(buffer) and not self.done:
+            char = buffer[i]
+
+            if not self.started:
+                # Ignorar texto previo (```json, saludos, "{nota}"...) hasta una llave
+                # que abre un objeto JSON: seguida de una clave o de su cierre
+                if char == '{':
+                    j = i + 1
+                    while j < len(buffer) and buffer[j] in ' \t\r\n':
+                        j += 1
+                    if j == len(buffer):
+                        break  # Esperar el próximo fragmento para decidir
+                    if buffer[j] in '"}':
+                        self.started = True
+                        self._depth = 1
+                        self._expect_key = True
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key:
+                        self._key = json.loads(buffer[self._string_start:i + 1])
+                i += 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ':' and self._depth == 1 and self._expect_key:
+                self._expect_key = False
+                self._value_start = i + 1
+            elif char in '{[':
+                self._depth += 1
+                if self._depth == 2:
+                    self._value_is_array = char == '['
+                elif self._depth == 3 and char == '{' and self._value_is_array:
+                    self._item_start = i
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 2 and char == '}' and self._item_start is not None:
+                    item = self._load(buffer[self._item_start:i + 1])
+                    self._item_start = None
+                    if isinstance(item, dict):
+                        self.items.setdefault(self._key, []).append(item)
+                        events.append(('item', self._key, item))
+                elif self._depth == 1:
+                    # Cerró el valor contenedor de un campo de primer nivel
+                    events.extend(self._complete_field(buffer[self._value_start:i + 1]))
+                elif self._depth == 0:
+                    # Fin del objeto: el último campo termina en la llave de cierre
+                    if self._value_start is not None:
+                        events.extend(self._complete_field(buffer[self._value_start:i]))
+                    if self.fields or self.items:
+                        self.done = True
+                    else:
+                        self._restart()  # Objeto vacío o no-JSON: buscar el siguiente
+            elif char == ',' and self._depth == 1:
+                if self._value_start is not None:
+                    events.extend(self._complete_field(buffer[self._value_start:i]))
+                self._expect_key = True
+            i += 1
+
+        self.pos = i
+        return events
+
+    def _restart(self):
+        self.started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._expect_key = False
+        self._value_start = None
+        self._item_start = None
+
+    def _complete_field(self, raw):
+        self._value_start = None
+        raw = raw.strip()
+        if not raw or self._key is None:
+            return []
+        value = self._load(raw)
+        if value is _INVALID:
+            return []
+        self.fields[self._key] = value
+        return [('field', self._key, value)]
+
+    def _load(self, raw):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return _INVALID
+
+    def result(self):
+        """
+        Objeto con todo lo recuperado: los campos completos y, para arrays
+        cortados a la mitad, los objetos que alcanzaron a cerrarse
+        """
+        data = dict(self.fields)
+        for key, items in self.items.items():
+            if key not in data:
+                data[key] = list(items)
+        return data
+
+
+_INVALID = object()
+
+
+def parse_partial(text):
+    """Atajo: parsea un texto completo (o truncado) de una vez"""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.result(), parser.done
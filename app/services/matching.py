@@ -0,0 +1,269 @@
+"""
+Emparejamiento de productos entre tiendas
+Agrupa publicaciones equivalentes ("Apple iPhone 15 128GB Black" en Amazon y
+"iPhone 15 128 GB - Black (Unlocked)" en eBay) sin pasar por el LLM:
+
+  1. Normalización del título (unidades, ruido de marketplace)
+  2. Identificadores fuertes: GTIN/UPC/EAN válidos y números de modelo
+  3. Firma MinHash de los tokens + índice LSH por bandas (blocking): solo se
+     comparan los pares que comparten alguna banda
+  4. Verificación: similitud de Jaccard estimada y atributos numéricos
+     compatibles (128gb ≠ 256gb)
+
+Antes del análisis solo se envía a Gemini un representante por grupo (el más
+barato); el resto hereda sus campos descriptivos.
+
+Determinista (hash crc32, sin la semilla aleatoria de hash()) y cada
+comparación cuesta microsegundos.
+"""
+
+import re
+import unicodedata
+import zlib
+from config import Config
+
+# Primo de Mersenne para el hashing universal de MinHash
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Con el mismo número de modelo basta este parecido ("funda para SM-S921U" no es el teléfono)
+MODEL_MATCH_MIN_SIMILARITY = 0.25
+
+# Ruido frecuente en títulos de marketplace
+STOPWORDS = {
+    'a', 'an', 'and', 'the', 'for', 'with', 'w', 'by', 'of', 'in', 'on', 'to',
+    'new', 'brand', 'sealed', 'unlocked', 'free', 'shipping', 'fast', 'ship',
+    'ships', 'us', 'usa', 'version', 'model', 'edition', 'de', 'con', 'para',
+    'nuevo', 'el', 'la', 'y',
+}
+
+UNITS = r'gb|tb|mb|mah|mp|hz|w|in|inch|mm|cm|oz|lb|lbs|pack|pk|ct|qt'
+_STORAGE_GB = {'tb': 1024, 'gb': 1, 'mb': 1 / 1024}
+_UNIT_RE = re.compile(rf'(\d+(?:\.\d+)?)\s*[- ]?\s*({UNITS})\b')
+_TOKEN_RE = re.compile(r'[a-z0-9]+(?:[./-][a-z0-9]+)*')
+_GTIN_RE = re.compile(r'(?<!\d)(\d{12,14})(?!\d)')
+_MODEL_RE = re.compile(r'\b(?=[a-z0-9-]*\d)(?=[a-z0-9-]*[a-z])[a-z0-9]+(?:-[a-z0-9]+)*\b')
+
+
+def normalize_title(title):
+    """Título en minúsculas, sin acentos/puntuación y con unidades pegadas ('128 GB' → '128gb')"""
+    text = unicodedata.normalize('NFKD', title or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = _UNIT_RE.sub(lambda m: m.group(1) + m.group(2), text)
+    text = re.sub(r'[^\w./-]+', ' ', text)
+    return ' '.join(text.split())
+
+
+def title_tokens(title):
+    """Tokens significativos del título normalizado ('wh-1000xm5' → 'wh1000xm5')"""
+    return [
+        t.replace('-', '') if _MODEL_RE.fullmatch(t) else t
+        for t in _TOKEN_RE.findall(normalize_title(title)) if t not in STOPWORDS
+    ]
+
+
+def _valid_gtin(code):
+    digits = [int(c) for c in code]
+    check = digits.pop()
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return (10 - total % 10) % 10 == check
+
+
+def extract_identifiers(title):
+    """
+    Identificadores fuertes del título
+
+    Returns:
+        tuple: (gtins, modelos) - GTIN con dígito verificador válido y
+            códigos alfanuméricos tipo número de modelo (p. ej. 'sm-s921u')
+    """
+    text = normalize_title(title)
+    gtins = {code for code in _GTIN_RE.findall(text) if _valid_gtin(code)}
+    models = set()
+    for token in _MODEL_RE.findall(text):
+        if len(token) < 5 or _UNIT_RE.fullmatch(token) or token.isdigit():
+            continue
+        models.add(token.replace('-', ''))
+    return gtins, models
+
+
+def _numeric_attributes(tokens):
+    """Atributos con número (capacidad, tamaño...): deben coincidir para ser el mismo producto"""
+    attrs = {}
+    for token in tokens:
+        match = re.fullmatch(rf'(\d+(?:\.\d+)?)({UNITS})', token)
+        if match:
+            value, unit = float(match.group(1)), match.group(2)
+            # Capacidades en una sola unidad: 1tb y 256gb se comparan entre sí
+            if unit in _STORAGE_GB:
+                value, unit = value * _STORAGE_GB[unit], 'gb'
+            attrs.setdefault(unit, set()).add(value)
+    return attrs
+
+
+def _compatible(attrs_a, attrs_b):
+    for unit, values in attrs_a.items():
+        other = attrs_b.get(unit)
+        if other is not None and not values & other:
+            return False
+    return True
+
+
+class MinHasher:
+    """Firmas MinHash de conjuntos de tokens (permutaciones deterministas)"""
+
+    def __init__(self, num_perm=None, seed=1):
+        self.num_perm = num_perm or Config.MINHASH_PERMUTATIONS
+        # Generador lineal congruente: mismas permutaciones en todos los procesos
+        state = seed
+        self.params = []
+        for _ in range(self.num_perm):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = (state >> 3) % (_PRIME - 1) + 1
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b = (state >> 3) % _PRIME
+            self.params.append((a, b))
+
+    def signature(self, shingles):
+        hashes = [zlib.crc32(s.encode('utf-8')) for s in shingles] or [0]
+        return tuple(
+            min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.params
+        )
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """Jaccard estimada: fracción de permutaciones con el mismo mínimo"""
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def _shingles(tokens):
+    """Tokens + bigramas (el orden de las palabras aporta algo de señal)"""
+    return set(tokens) | {f'{a} {b}' for a, b in zip(tokens, tokens[1:])}
+
+
+class ProductMatcher:
+    """
+    Agrupa productos equivalentes
+
+    Args:
+        threshold (float): Jaccard estimada mínima para considerar dos títulos iguales
+        num_perm (int): Permutaciones MinHash (largo de la firma)
+        bands (int): Bandas del índice LSH (num_perm debe ser divisible)
+    """
+
+    def __init__(self, threshold=None, num_perm=None, bands=None):
+        self.threshold = threshold if threshold is not None else Config.MATCH_THRESHOLD
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands or Config.MINHASH_BANDS
+        if self.hasher.num_perm % self.bands:
+            raise ValueError("MINHASH_PERMUTATIONS debe ser divisible por MINHASH_BANDS")
+        self.rows = self.hasher.num_perm // self.bands
+
+    def fingerprint(self, title):
+        tokens = title_tokens(title)
+        gtins, models = extract_identifiers(title)
+        return {
+            'signature': self.hasher.signature(_shingles(tokens)),
+            'gtins': gtins,
+            'models': models,
+            'attrs': _numeric_attributes(tokens),
+        }
+
+    def is_match(self, a, b):
+        """¿Dos huellas describen el mismo producto?"""
+        if a['gtins'] and b['gtins']:
+            return bool(a['gtins'] & b['gtins'])
+        if not _compatible(a['attrs'], b['attrs']):
+            return False
+        similarity = MinHasher.similarity(a['signature'], b['signature'])
+        if a['models'] & b['models']:
+            return similarity >= MODEL_MATCH_MIN_SIMILARITY
+        return similarity >= self.threshold
+
+    @staticmethod
+    def _conflict(a, b):
+        """Atributos o códigos que prueban que son productos distintos"""
+        if a['gtins'] and b['gtins'] and not a['gtins'] & b['gtins']:
+            return True
+        return not _compatible(a['attrs'], b['attrs'])
+
+    def candidate_pairs(self, fingerprints):
+        """Pares que comparten una banda LSH o un identificador (blocking)"""
+        buckets = {}
+        for index, fp in enumerate(fingerprints):
+            signature = fp['signature']
+            keys = [('band', band, signature[band * self.rows:(band + 1) * self.rows])
+                    for band in range(self.bands)]
+            keys.extend(('gtin', code) for code in fp['gtins'])
+            keys.extend(('model', code) for code in fp['models'])
+            for key in keys:
+                buckets.setdefault(key, []).append(index)
+
+        pairs = set()
+        for members in buckets.values():
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    pairs.add((a, b))
+        return pairs
+
+    def cluster(self, titles):
+        """
+        Agrupa títulos equivalentes
+
+        Returns:
+            list: Grupos de índices (cada índice aparece en exactamente un grupo)
+        """
+        fingerprints = [self.fingerprint(title) for title in titles]
+        parent = list(range(len(titles)))
+        members = {index: [index] for index in range(len(titles))}
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for a, b in self.candidate_pairs(fingerprints):
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b or not self.is_match(fingerprints[a], fingerprints[b]):
+                continue
+            # Sin encadenar: un título sin capacidad no puede unir 256GB con 1TB
+            if any(self._conflict(fingerprints[i], fingerprints[j])
+                   for i in members[root_a] for j in members[root_b]):
+                continue
+            root, child = min(root_a, root_b), max(root_a, root_b)
+            parent[child] = root
+            members[root].extend(members.pop(child))
+
+        groups = {}
+        for index in range(len(titles)):
+            groups.setdefault(find(index), []).append(index)
+        return list(groups.values())
+
+
+_matcher = None
+
+
+def get_matcher():
+    """Matcher compartido (las permutaciones MinHash se generan una vez)"""
+    global _matcher
+    if _matcher is None:
+        _matcher = ProductMatcher()
+    return _matcher
+
+
+def cluster_products(products):
+    """
+    Grupos de productos equivalentes y su representante (el más barato)
+
+    Returns:
+        dict: id de producto → id del representante de su grupo
+    """
+    groups = get_matcher().cluster([p.nombre_crudo for p in products])
+    representative = {}
+    for group in groups:
+        cheapest = min(group, key=lambda i: products[i].precio)
+        for index in group:
+            representative[index] = cheapest
+    return representative
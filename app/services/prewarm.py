@@ -0,0 +1,292 @@
+"""
+Pre-calentamiento de cachés para las búsquedas más populares
+Fuera de horario pico se vuelven a scrapear las búsquedas más frecuentes (de
+un archivo de consultas o del registro de búsquedas) y, opcionalmente, se
+regenera su análisis de Gemini, para que el tráfico pico encuentre las cachés
+calientes.
+
+El gasto queda dentro de un presupuesto de créditos de ScraperAPI: por
+defecto solo se pre-calientan las tiendas de Config.FREE_TIER_SITES; las de
+Config.PREMIUM_SITES (render=true, más créditos) solo si se piden.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from app.services.cache import get_search_cache, normalize_query
+from app.services.products import ProductBatch
+from app.services.render_strategy import site_credits
+
+# Bloqueo entre procesos opcional (no existe en Windows)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+_query_log_lock = threading.Lock()
+
+
+def record_query(product_name):
+    """Agrega la búsqueda al registro (una línea JSON por búsqueda)"""
+    if not Config.QUERY_LOG_ENABLED or not product_name:
+        return
+    line = json.dumps({'ts': time.time(), 'q': normalize_query(product_name)}, ensure_ascii=False) + '\n'
+    try:
+        with _query_log_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(Config.QUERY_LOG_PATH)), exist_ok=True)
+            # O_APPEND: líneas cortas no se intercalan entre workers
+            with open(Config.QUERY_LOG_PATH, 'a', encoding='utf-8') as log:
+                log.write(line)
+    except OSError as e:
+        print(f"⚠ No se pudo registrar la búsqueda: {str(e)[:100]}")
+
+
+def top_queries(n=None, days=None, path=None):
+    """
+    Búsquedas más frecuentes del registro
+
+    Args:
+        n (int): Cuántas devolver. Por defecto Config.PREWARM_TOP_N
+        days (int): Solo búsquedas de los últimos días. Por defecto Config.PREWARM_LOG_DAYS
+        path (str): Registro a leer. Por defecto Config.QUERY_LOG_PATH
+
+    Returns:
+        list: Búsquedas normalizadas, de la más a la menos frecuente
+    """
+    n = n or Config.PREWARM_TOP_N
+    since = time.time() - (days or Config.PREWARM_LOG_DAYS) * 86400
+    counts = Counter()
+    try:
+        with open(path or Config.QUERY_LOG_PATH, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Línea cortada por un proceso que murió a la mitad
+                if entry.get('ts', 0) >= since and entry.get('q'):
+                    counts[entry['q']] += 1
+    except FileNotFoundError:
+        return []
+    return [query for query, _ in counts.most_common(n)]
+
+
+def load_queries(path):
+    """Búsquedas de un archivo de texto (una por línea, '#' para comentarios), sin duplicados"""
+    queries = []
+    seen = set()
+    with open(path, encoding='utf-8') as source:
+        for line in source:
+            query = normalize_query(line.split('#', 1)[0])
+            if query and query not in seen:
+                seen.add(query)
+                queries.append(query)
+    return queries
+
+
+class Prewarmer:
+    """
+    Refresca las cachés de búsqueda (y de análisis) de una lista de consultas
+
+    Args:
+        scraper_key (str): API key de ScraperAPI
+        gemini_key (str): API key de Gemini; sin ella solo se calienta la caché de búsquedas
+        budget (int): Créditos máximos de ScraperAPI. Por defecto Config.PREWARM_CREDIT_BUDGET
+        include_premium (bool): Incluir Config.PREMIUM_SITES. Por defecto Config.PREWARM_INCLUDE_PREMIUM
+    """
+
+    def __init__(self, scraper_key, gemini_key=None, budget=None, include_premium=None):
+        from app.services.scraper import ProductScraper
+        self.scraper = ProductScraper(scraper_key)
+        self.cache = get_search_cache()
+        self.gemini_key = gemini_key
+        self.budget = budget if budget is not None else Config.PREWARM_CREDIT_BUDGET
+        include_premium = Config.PREWARM_INCLUDE_PREMIUM if include_premium is None else include_premium
+        allowed = set(Config.FREE_TIER_SITES) | (set(Config.PREMIUM_SITES) if include_premium else set())
+        self.sites = [site for site in Config.TARGET_SITES if site in allowed]
+
+    def plan(self, queries):
+        """
+        Tareas (búsqueda, tienda) dentro del presupuesto, en orden de popularidad
+
+        Se omiten las entradas que siguen frescas por más de la mitad de su TTL
+        (se servirán desde caché igual) y las que ya no caben en el presupuesto.
+
+        Returns:
+            tuple: (tareas, créditos, omitidas_frescas, omitidas_presupuesto)
+        """
+        tasks = []
+        credits = skipped_fresh = skipped_budget = 0
+        for query in queries:
+            for site in self.sites:
+                age = self.cache.age(site, query)
+                if age is not None and age < self.cache.ttl_for(site) / 2:
+                    skipped_fresh += 1
+                    continue
+                cost = site_credits(site)
+                if credits + cost > self.budget:
+                    skipped_budget += 1
+                    continue
+                tasks.append((query, site))
+                credits += cost
+        return tasks, credits, skipped_fresh, skipped_budget
+
+    def run(self, queries):
+        """
+        Ejecuta el pre-calentamiento
+
+        Returns:
+            dict: Resumen (búsquedas, scrapes, omitidas, créditos, análisis, errores)
+        """
+        start = time.monotonic()
+        tasks, credits, skipped_fresh, skipped_budget = self.plan(queries)
+        print(f"🔥 Pre-calentando {len(queries)} búsquedas: {len(tasks)} scrapes "
+              f"(~{credits}/{self.budget} créditos, {skipped_fresh} frescas, {skipped_budget} fuera de presupuesto)")
+
+        errors = 0
+        with ThreadPoolExecutor(max_workers=Config.PREWARM_WORKERS, thread_name_prefix='prewarm') as executor:
+            futures = {executor.submit(self.scraper.refresh_site, site, query): (query, site) for query, site in tasks}
+            for future, (query, site) in futures.items():
+                try:
+                    products = future.result()
+                except Exception as e:
+                    products = None
+                    print(f"  ⚠ Pre-calentamiento falló: {str(e)[:100]}")
+                # _fetch_site no lanza: sin productos = timeout, bloqueo, API key inválida o circuito abierto
+                if not products:
+                    errors += 1
+                    print(f"  ⚠ Pre-calentamiento sin productos: {site} '{query}'")
+
+        analyses = 0
+        if self.gemini_key:
+            for query in dict.fromkeys(query for query, _ in tasks):
+                if self._warm_analysis(query):
+                    analyses += 1
+
+        report = {
+            'busquedas': len(queries),
+            'scrapes': len(tasks),
+            'omitidas_frescas': skipped_fresh,
+            'omitidas_presupuesto': skipped_budget,
+            'creditos': credits,
+            'analisis': analyses,
+            'errores': errors,
+            'segundos': round(time.monotonic() - start, 1),
+        }
+        print(f"✅ Pre-calentamiento terminado: {report}")
+        return report
+
+    def _warm_analysis(self, query):
+        """Análisis de los mismos productos que verá un usuario (todo desde caché)"""
+        from app.services.gemini_analyzer import GeminiAnalyzer
+        products = ProductBatch()
+        for site in Config.TARGET_SITES:
+            cached = self.cache.peek(site, query)  # No inflar hits/créditos ahorrados
+            if cached:
+                products.extend(cached[:Config.MAX_RESULTS_PER_SITE])
+        if not products:
+            return False
+        try:
+            GeminiAnalyzer(self.gemini_key).analyze_products(products, query)
+            return True
+        except Exception as e:
+            print(f"  ⚠ Análisis de '{query}' falló: {str(e)[:100]}")
+            return False
+
+
+class PrewarmScheduler:
+    """
+    Pre-calentamiento diario dentro del proceso (hilo daemon)
+
+    Corre a la hora Config.PREWARM_HOUR (hora local). Con varios workers de
+    gunicorn, un lock de archivo asegura que solo uno pre-caliente por vez.
+    """
+
+    def __init__(self, scraper_key, gemini_key=None, hour=None):
+        self.scraper_key = scraper_key
+        self.gemini_key = gemini_key
+        self.hour = Config.PREWARM_HOUR if hour is None else hour
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='prewarm-scheduler')
+            self._thread.start()
+            print(f"⏰ Pre-calentamiento programado a las {self.hour:02d}:00")
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def seconds_until_next_run(self, now=None):
+        now = time.localtime(now)
+        seconds_today = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
+        wait = self.hour * 3600 - seconds_today
+        return wait if wait > 0 else wait + 86400
+
+    def _loop(self):
+        while not self._stop.wait(self.seconds_until_next_run()):
+            self.run_once()
+
+    def run_once(self):
+        """Pre-calienta las búsquedas top del registro (si otro proceso no lo está haciendo)"""
+        with _exclusive(Config.PREWARM_LOCK_PATH) as acquired:
+            if not acquired:
+                print("⏭️ Pre-calentamiento en curso en otro proceso")
+                return None
+            queries = top_queries()
+            if not queries:
+                print("⏭️ Pre-calentamiento: sin búsquedas registradas")
+                return None
+            try:
+                return Prewarmer(self.scraper_key, self.gemini_key).run(queries)
+            except Exception as e:
+                print(f"❌ Pre-calentamiento falló: {str(e)[:200]}")
+                return None
+
+
+class _exclusive:
+    """Lock de archivo no bloqueante entre procesos (sin fcntl siempre se adquiere)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        if not FCNTL_AVAILABLE:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.handle = open(self.path, 'a')
+        try:
+            fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self.handle.close()
+            self.handle = None
+            return False
+
+    def __exit__(self, *exc):
+        if self.handle is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+        return False
+
+
+_scheduler = None
+
+
+def start_scheduler():
+    """Arranca el scheduler si está habilitado y hay API keys de servidor configuradas"""
+    global _scheduler
+    if not Config.PREWARM_ENABLED or _scheduler is not None:
+        return _scheduler
+    if not Config.PREWARM_SCRAPER_API_KEY:
+        print("⚠ PREWARM_ENABLED sin PREWARM_SCRAPER_API_KEY: pre-calentamiento desactivado")
+        return None
+    _scheduler = PrewarmScheduler(Config.PREWARM_SCRAPER_API_KEY, Config.PREWARM_GEMINI_API_KEY).start()
+    return _scheduler
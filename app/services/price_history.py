@@ -0,0 +1,215 @@
+"""
+Historial de precios
+Cada scrape real (no los hits de caché) agrega filas (tienda, producto, precio,
+ts) a una tabla SQLite append-only. Índices por clave normalizada de producto
++ tiempo y por búsqueda + tiempo: los rangos, mín/promedio por ventana y
+"¿bajó el precio?" se resuelven con el índice en milisegundos, sin volver a
+scrapear.
+
+La clave de producto ignora orden de palabras, mayúsculas, unidades y ruido
+de marketplace (mismos tokens que el emparejamiento entre tiendas), así el
+historial de una publicación se comparte entre tiendas.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from app.services.cache import make_key, normalize_query
+from app.services.matching import title_tokens
+
+DAY = 86400
+
+# Lote máximo de claves por consulta IN (límite de variables de SQLite)
+_MAX_KEYS_PER_QUERY = 500
+
+
+def product_key(name):
+    """Clave estable de un producto a partir de su título"""
+    return make_key('product', ' '.join(sorted(set(title_tokens(name)))))
+
+
+class PriceHistory:
+    """Serie temporal de precios en un archivo SQLite compartido entre workers"""
+
+    def __init__(self, path, retention_days=None):
+        self.path = path
+        self.retention = (retention_days or Config.PRICE_HISTORY_RETENTION_DAYS) * DAY
+        self._last_prune = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS price_history ('
+                ' product_key TEXT NOT NULL,'
+                ' query TEXT NOT NULL,'
+                ' store TEXT NOT NULL,'
+                ' nombre TEXT NOT NULL,'
+                ' precio REAL NOT NULL,'
+                ' url TEXT,'
+                ' ts REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_history_product_ts ON price_history (product_key, ts)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_history_query_ts ON price_history (query, ts)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_history_ts ON price_history (ts)')
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación: seguro entre threads y procesos
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, query, products, ts=None):
+        """
+        Agrega los productos de un scrape
+
+        Args:
+            query (str): Búsqueda que los devolvió
+            products (iterable): Product/ProductBatch (o dicts)
+            ts (float): Epoch del scrape. Por defecto ahora
+        """
+        ts = ts if ts is not None else time.time()
+        query = normalize_query(query)
+        rows = [
+            (product_key(p['nombre_crudo']), query, p['tienda'], p['nombre_crudo'], float(p['precio']), p.get('url'), ts)
+            for p in products if p.get('precio')
+        ]
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT INTO price_history (product_key, query, store, nombre, precio, url, ts) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            # Purgar lo vencido como mucho una vez por hora (usa idx_history_ts)
+            if ts - self._last_prune > 3600:
+                self._last_prune = ts
+                conn.execute('DELETE FROM price_history WHERE ts < ?', (ts - self.retention,))
+        return len(rows)
+
+    def history(self, name, store=None, since=None, until=None):
+        """Puntos (ts, tienda, precio) de un producto, del más antiguo al más nuevo"""
+        sql = 'SELECT ts, store, precio FROM price_history WHERE product_key = ? AND ts >= ? AND ts <= ?'
+        params = [product_key(name), since or 0, until if until is not None else time.time()]
+        if store:
+            sql += ' AND store = ?'
+            params.append(store)
+        with self._connect() as conn:
+            rows = conn.execute(sql + ' ORDER BY ts', params).fetchall()
+        return [{'ts': ts, 'tienda': store, 'precio': precio} for ts, store, precio in rows]
+
+    def window_stats(self, name, days=None, until=None, store=None):
+        """Mínimo/promedio/máximo de un producto en los últimos `days` días (None si no hay datos)"""
+        until = until if until is not None else time.time()
+        since = until - (days or Config.PRICE_HISTORY_WINDOW_DAYS) * DAY
+        sql = ('SELECT MIN(precio), AVG(precio), MAX(precio), COUNT(*), MIN(ts) FROM price_history'
+               ' WHERE product_key = ? AND ts >= ? AND ts <= ?')
+        params = [product_key(name), since, until]
+        if store:
+            sql += ' AND store = ?'
+            params.append(store)
+        with self._connect() as conn:
+            row = conn.execute(sql, params).fetchone()
+        return _stats_row(row)
+
+    def stats_for(self, names, days=None, until=None):
+        """
+        Estadísticas por ventana de muchos productos en una consulta agrupada
+
+        Returns:
+            dict: nombre → estadísticas (solo los que tienen historial)
+        """
+        until = until if until is not None else time.time()
+        since = until - (days or Config.PRICE_HISTORY_WINDOW_DAYS) * DAY
+        keys = {}
+        for name in names:
+            keys.setdefault(product_key(name), []).append(name)
+
+        by_key = {}
+        key_list = list(keys)
+        with self._connect() as conn:
+            for start in range(0, len(key_list), _MAX_KEYS_PER_QUERY):
+                chunk = key_list[start:start + _MAX_KEYS_PER_QUERY]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    'SELECT product_key, MIN(precio), AVG(precio), MAX(precio), COUNT(*), MIN(ts)'
+                    f' FROM price_history WHERE product_key IN ({placeholders}) AND ts >= ? AND ts <= ?'
+                    ' GROUP BY product_key',
+                    [*chunk, since, until]
+                ).fetchall()
+                for key, *values in rows:
+                    by_key[key] = _stats_row(values)
+
+        return {name: by_key[key] for key, group in keys.items() if key in by_key for name in group}
+
+    def query_stats(self, query, days=None, until=None):
+        """Mínimo/promedio/máximo de todo lo que devolvió una búsqueda en la ventana"""
+        until = until if until is not None else time.time()
+        since = until - (days or Config.PRICE_HISTORY_WINDOW_DAYS) * DAY
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT MIN(precio), AVG(precio), MAX(precio), COUNT(*), MIN(ts) FROM price_history'
+                ' WHERE query = ? AND ts >= ? AND ts <= ?',
+                (normalize_query(query), since, until)
+            ).fetchone()
+        return _stats_row(row)
+
+    def price_dropped(self, name, current_price, days=None, threshold=None, until=None):
+        """
+        ¿El precio actual está por debajo del promedio de la ventana?
+
+        Returns:
+            bool: True si bajó al menos `threshold` (fracción) vs el promedio histórico
+        """
+        threshold = threshold if threshold is not None else Config.PRICE_DROP_THRESHOLD
+        stats = self.window_stats(name, days=days, until=until)
+        if stats is None:
+            return False
+        return current_price <= stats['promedio'] * (1 - threshold)
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM price_history').fetchone()[0]
+
+
+def _stats_row(row):
+    low, avg, high, count, first_ts = row
+    if not count:
+        return None
+    return {
+        'minimo': round(low, 2),
+        'promedio': round(avg, 2),
+        'maximo': round(high, 2),
+        'muestras': count,
+        'desde': first_ts,
+    }
+
+
+_history = None
+_history_lock = threading.Lock()
+_history_failed = False
+
+
+def get_price_history():
+    """Historial compartido por el proceso; None si está desactivado o no se pudo abrir"""
+    global _history, _history_failed
+    if not Config.PRICE_HISTORY_ENABLED or _history_failed:
+        return None
+    if _history is None or _history.path != Config.PRICE_HISTORY_PATH:
+        with _history_lock:
+            if _history is None or _history.path != Config.PRICE_HISTORY_PATH:
+                try:
+                    _history = PriceHistory(Config.PRICE_HISTORY_PATH)
+                except Exception as e:
+                    # Sistema de archivos de solo lectura (Vercel), permisos...
+                    print(f"⚠ Historial de precios no disponible ({str(e)[:100]})")
+                    _history_failed = True
+                    return None
+    return _history
@@ -0,0 +1,249 @@
+"""
+Motor de estadísticas y puntuación de precios
+Los productos se convierten a columnas (precios, reviews, tiendas) y las
+estadísticas, diferencias vs promedio y recomendaciones se calculan en una
+pasada vectorizada con NumPy. Sin NumPy se usa una versión en Python puro con
+los mismos resultados (una pasada + un ordenamiento para percentiles).
+
+Las recomendaciones son un IntEnum; el texto con emoji solo se genera al
+construir la respuesta.
+"""
+
+import math
+from enum import IntEnum
+from app.services.products import ProductBatch
+
+# Importar NumPy de forma opcional
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Umbral de "⚠️ Considerar": hasta 15% sobre el promedio
+CONSIDER_THRESHOLD = 1.15
+
+
+class Recommendation(IntEnum):
+    BEST = 0
+    GOOD = 1
+    CONSIDER = 2
+    NOT_RECOMMENDED = 3
+    UNKNOWN = 4
+
+    @property
+    def label(self):
+        return RECOMMENDATION_LABELS[self]
+
+    @classmethod
+    def from_label(cls, text):
+        """Texto de recomendación (de Gemini o del análisis básico) → enum"""
+        if not text:
+            return cls.UNKNOWN
+        for member, emoji in RECOMMENDATION_EMOJIS.items():
+            if emoji in text:
+                return member
+        return cls.UNKNOWN
+
+
+RECOMMENDATION_LABELS = {
+    Recommendation.BEST: '🏆 Mejor Opción',
+    Recommendation.GOOD: '✅ Buena Alternativa',
+    Recommendation.CONSIDER: '⚠️ Considerar',
+    Recommendation.NOT_RECOMMENDED: '❌ No Recomendado',
+    Recommendation.UNKNOWN: '',
+}
+
+RECOMMENDATION_EMOJIS = {
+    Recommendation.BEST: '🏆',
+    Recommendation.GOOD: '✅',
+    Recommendation.CONSIDER: '⚠️',
+    Recommendation.NOT_RECOMMENDED: '❌',
+}
+
+
+def classify_price(price, avg_price, min_price):
+    """Recomendación de un precio contra el promedio/mínimo del conjunto"""
+    if price == min_price:
+        return Recommendation.BEST
+    if price <= avg_price:
+        return Recommendation.GOOD
+    if price <= avg_price * CONSIDER_THRESHOLD:
+        return Recommendation.CONSIDER
+    return Recommendation.NOT_RECOMMENDED
+
+
+class PriceTable:
+    """
+    Vista columnar de una lista de productos
+
+    Args:
+        products (ProductBatch|list): Lote de productos (se usan sus columnas
+            sin copiar) o dicts/Products con 'precio', 'tienda' y opcionalmente
+            'reviews' y 'recomendacion'
+    """
+
+    def __init__(self, products):
+        if isinstance(products, ProductBatch):
+            self.stores = products.tiendas
+            prices = products.precios
+            reviews = products.reviews
+            recommendations = [int(Recommendation.UNKNOWN)] * len(products)
+        else:
+            self.stores = [p.get('tienda', '') for p in products]
+            prices = [p.get('precio') or 0 for p in products]
+            reviews = [p.get('reviews', 4.0) for p in products]
+            recommendations = [int(Recommendation.from_label(p.get('recomendacion'))) for p in products]
+        self.store_names = sorted(set(self.stores))
+        store_index = {name: i for i, name in enumerate(self.store_names)}
+        codes = [store_index[s] for s in self.stores]
+
+        if NUMPY_AVAILABLE:
+            self.prices = np.asarray(prices, dtype=float)
+            self.reviews = np.asarray(reviews, dtype=float)
+            self.store_codes = np.asarray(codes, dtype=np.intp)
+            self.recommendations = np.asarray(recommendations, dtype=np.intp)
+        else:
+            self.prices = [float(p) for p in prices]
+            self.reviews = [float(r) for r in reviews]
+            self.store_codes = codes
+            self.recommendations = recommendations
+
+    def __len__(self):
+        return len(self.stores)
+
+    def score(self):
+        """
+        Recomendación, % vs promedio y puntaje de valor de cada producto
+
+        Returns:
+            tuple: (recomendaciones, diff_pct, valor_score) como listas
+        """
+        if not len(self):
+            return [], [], []
+        if NUMPY_AVAILABLE:
+            return self._score_numpy()
+
+        avg_price = sum(self.prices) / len(self.prices)
+        min_price = min(self.prices)
+        recommendations, diffs, scores = [], [], []
+        for price in self.prices:
+            diff = (price - avg_price) / avg_price * 100
+            recommendations.append(classify_price(price, avg_price, min_price))
+            diffs.append(diff)
+            scores.append(100 - int(abs(diff)))
+        return recommendations, diffs, scores
+
+    def _score_numpy(self):
+        prices = self.prices
+        avg_price = prices.mean()
+        min_price = prices.min()
+        diffs = (prices - avg_price) / avg_price * 100
+        codes = np.select(
+            [prices == min_price, prices <= avg_price, prices <= avg_price * CONSIDER_THRESHOLD],
+            [Recommendation.BEST, Recommendation.GOOD, Recommendation.CONSIDER],
+            default=Recommendation.NOT_RECOMMENDED,
+        )
+        scores = 100 - np.abs(diffs).astype(int)
+        return [Recommendation(c) for c in codes.tolist()], diffs.tolist(), scores.tolist()
+
+    def summary(self):
+        """
+        Estadísticas del conjunto en una pasada
+
+        Returns:
+            dict: promedio, mediana, percentiles, desviación, min/max,
+                conteo de recomendaciones y agregados por tienda
+        """
+        if not len(self):
+            return {}
+        if NUMPY_AVAILABLE:
+            return self._summary_numpy()
+
+        n = len(self.prices)
+        total = total_sq = 0.0
+        low, high = math.inf, -math.inf
+        counts = [0] * len(Recommendation)
+        per_store = [[0, math.inf, 0.0] for _ in self.store_names]  # [n, min, suma]
+        for price, store, rec in zip(self.prices, self.store_codes, self.recommendations):
+            total += price
+            total_sq += price * price
+            low = min(low, price)
+            high = max(high, price)
+            counts[rec] += 1
+            entry = per_store[store]
+            entry[0] += 1
+            entry[1] = min(entry[1], price)
+            entry[2] += price
+
+        mean = total / n
+        ordered = sorted(self.prices)
+        return self._build_summary(
+            mean=mean,
+            median=_percentile(ordered, 50),
+            p25=_percentile(ordered, 25),
+            p75=_percentile(ordered, 75),
+            std=math.sqrt(max(total_sq / n - mean * mean, 0.0)),
+            low=low,
+            high=high,
+            counts=counts,
+            per_store=[(count, store_min, store_sum / count) for count, store_min, store_sum in per_store],
+        )
+
+    def _summary_numpy(self):
+        prices = self.prices
+        p25, median, p75 = np.percentile(prices, [25, 50, 75])
+        store_count = np.bincount(self.store_codes, minlength=len(self.store_names))
+        store_sum = np.bincount(self.store_codes, weights=prices, minlength=len(self.store_names))
+        store_min = np.full(len(self.store_names), np.inf)
+        np.minimum.at(store_min, self.store_codes, prices)
+        counts = np.bincount(self.recommendations, minlength=len(Recommendation))
+        return self._build_summary(
+            mean=float(prices.mean()),
+            median=float(median),
+            p25=float(p25),
+            p75=float(p75),
+            std=float(prices.std()),
+            low=float(prices.min()),
+            high=float(prices.max()),
+            counts=counts.tolist(),
+            per_store=[
+                (int(c), float(m), float(s / c))
+                for c, m, s in zip(store_count, store_min, store_sum)
+            ],
+        )
+
+    def _build_summary(self, mean, median, p25, p75, std, low, high, counts, per_store):
+        return {
+            'precio_promedio': round(mean, 2),
+            'precio_minimo': round(low, 2),
+            'precio_maximo': round(high, 2),
+            'rango_precio': round(high - low, 2),
+            'precio_mediana': round(median, 2),
+            'percentil_25': round(p25, 2),
+            'percentil_75': round(p75, 2),
+            'desviacion_estandar': round(std, 2),
+            'total_productos': len(self),
+            'mejores_precios': counts[Recommendation.BEST],
+            'alternativas': counts[Recommendation.GOOD],
+            'considerar': counts[Recommendation.CONSIDER],
+            'no_recomendados': counts[Recommendation.NOT_RECOMMENDED],
+            'por_tienda': {
+                name: {
+                    'productos': count,
+                    'precio_minimo': round(store_min, 2),
+                    'precio_promedio': round(store_avg, 2),
+                }
+                for name, (count, store_min, store_avg) in zip(self.store_names, per_store)
+            },
+        }
+
+
+def _percentile(ordered, q):
+    """Percentil con interpolación lineal (igual que numpy.percentile)"""
+    if len(ordered) == 1:
+        return ordered[0]
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
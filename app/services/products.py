@@ -0,0 +1,141 @@
+"""
+Registro tipado de productos scrapeados
+Product (dataclass con __slots__) reemplaza los dicts ad-hoc de los parsers y
+ProductBatch guarda conjuntos grandes en columnas (precios/reviews en
+array('d')). La forma JSON de siempre ({'tienda', 'nombre_crudo', 'precio',
+'url', 'reviews'}) solo se genera en el borde: respuestas HTTP y caché.
+"""
+
+import sys
+from array import array
+from dataclasses import dataclass
+
+DEFAULT_REVIEWS = 4.0
+
+# Orden de las columnas en la forma compacta (caché)
+FIELDS = ('tienda', 'nombre_crudo', 'precio', 'url', 'reviews')
+
+
+@dataclass(slots=True)
+class Product:
+    tienda: str
+    nombre_crudo: str
+    precio: float
+    url: str
+    reviews: float = DEFAULT_REVIEWS
+
+    # Acceso tipo dict de solo lectura (código que aún usa p['precio'])
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in FIELDS else default
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def to_dict(self):
+        """Forma JSON de la API"""
+        return {
+            'tienda': self.tienda,
+            'nombre_crudo': self.nombre_crudo,
+            'precio': self.precio,
+            'url': self.url,
+            'reviews': self.reviews,
+        }
+
+    def to_row(self):
+        """Forma compacta para la caché: [tienda, nombre, precio, url, reviews]"""
+        return [self.tienda, self.nombre_crudo, self.precio, self.url, self.reviews]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            tienda=sys.intern(data['tienda']),
+            nombre_crudo=data['nombre_crudo'],
+            precio=float(data['precio']),
+            url=data['url'],
+            reviews=float(data.get('reviews', DEFAULT_REVIEWS)),
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        tienda, nombre, precio, url, reviews = row
+        return cls(sys.intern(tienda), nombre, float(precio), url, float(reviews))
+
+
+def as_product(value):
+    """Product a partir de Product, dict (API/tests) o fila compacta (caché)"""
+    if isinstance(value, Product):
+        return value
+    if isinstance(value, dict):
+        return Product.from_dict(value)
+    return Product.from_row(value)
+
+
+def to_dicts(products):
+    """Lista JSON de la API para cualquier colección de productos"""
+    return [as_product(p).to_dict() for p in products]
+
+
+class ProductBatch:
+    """
+    Conjunto de productos en columnas
+
+    Los precios y reviews viven en array('d') contiguos (sin un float de Python
+    por producto) y las tiendas se internan. Indexar devuelve un Product.
+    """
+
+    __slots__ = ('tiendas', 'nombres', 'precios', 'urls', 'reviews')
+
+    def __init__(self):
+        self.tiendas = []
+        self.nombres = []
+        self.precios = array('d')
+        self.urls = []
+        self.reviews = array('d')
+
+    @classmethod
+    def from_products(cls, products):
+        if isinstance(products, cls):
+            return products
+        batch = cls()
+        batch.extend(products)
+        return batch
+
+    def append(self, product):
+        product = as_product(product)
+        self.tiendas.append(sys.intern(product.tienda))
+        self.nombres.append(product.nombre_crudo)
+        self.precios.append(product.precio)
+        self.urls.append(product.url)
+        self.reviews.append(product.reviews)
+
+    def extend(self, products):
+        for product in products:
+            self.append(product)
+
+    def __len__(self):
+        return len(self.precios)
+
+    def __bool__(self):
+        return len(self.precios) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ProductBatch.from_products(self[i] for i in range(*index.indices(len(self))))
+        return Product(self.tiendas[index], self.nombres[index], self.precios[index],
+                       self.urls[index], self.reviews[index])
+
+    def __iter__(self):
+        for row in zip(self.tiendas, self.nombres, self.precios, self.urls, self.reviews):
+            yield Product(*row)
+
+    def rows(self):
+        """Filas compactas (caché, claves de caché)"""
+        return [list(row) for row in zip(self.tiendas, self.nombres, self.precios, self.urls, self.reviews)]
+
+    def to_dicts(self):
+        return [product.to_dict() for product in self]
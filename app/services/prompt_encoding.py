@@ -0,0 +1,160 @@
+"""
+Codificación compacta de productos para los prompts de Gemini
+En vez de JSON indentado (claves repetidas, URLs de tracking largas) cada
+producto es una fila separada por '|' con un id numérico. El modelo responde
+con ese id y el servidor recupera URL y demás datos localmente.
+"""
+
+import math
+from config import Config
+
+# Aproximación para Gemini: ~4 caracteres por token en texto latino
+CHARS_PER_TOKEN = 4
+
+# Encabezado de la tabla (columnas abreviadas)
+TABLE_HEADER = 'id|tienda|precio|rev|nombre'
+
+
+def estimate_tokens(text):
+    """Estimación rápida de tokens (sin llamar a count_tokens de la API)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def short_store(site):
+    """'amazon.com' → 'amazon'"""
+    return site.replace('www.', '').split('.')[0]
+
+
+def _clean_name(name, max_chars):
+    name = ' '.join(name.replace('|', '/').split())
+    if max_chars and len(name) > max_chars:
+        name = name[:max_chars].rstrip() + '…'
+    return name
+
+
+def encode_row(index, product, max_name_chars=None):
+    """Fila compacta de un producto: id|tienda|precio|rev|nombre"""
+    price = product.get('precio', 0)
+    reviews = product.get('reviews')
+    return '|'.join([
+        str(index),
+        short_store(product.get('tienda', '')),
+        f"{price:g}" if isinstance(price, (int, float)) else str(price),
+        f"{reviews:g}" if isinstance(reviews, (int, float)) else '',
+        _clean_name(product.get('nombre_crudo', ''), max_name_chars),
+    ])
+
+
+def encode_products(products, max_name_chars=None):
+    """
+    Tabla compacta de productos
+
+    Args:
+        products (list): Lista de (id, producto)
+        max_name_chars (int): Recortar nombres largos
+
+    Returns:
+        str: Encabezado + una fila por producto
+    """
+    rows = [TABLE_HEADER]
+    rows.extend(encode_row(index, product, max_name_chars) for index, product in products)
+    return '\n'.join(rows)
+
+
+def _round_robin_by_price(products):
+    """Intercala tiendas (más baratos primero) para que el recorte no deje una tienda fuera"""
+    by_store = {}
+    for index, product in products:
+        by_store.setdefault(product.get('tienda'), []).append((index, product))
+    queues = [sorted(items, key=lambda item: item[1].get('precio', 0)) for items in by_store.values()]
+
+    ordered = []
+    while any(queues):
+        for queue in queues:
+            if queue:
+                ordered.append(queue.pop(0))
+    return ordered
+
+
+def _indexed(products, indices):
+    if indices is None:
+        return list(enumerate(products))
+    return [(index, products[index]) for index in indices]
+
+
+def fit_to_budget(products, budget=None, max_name_chars=None, indices=None):
+    """
+    Selecciona los productos que caben en el presupuesto de tokens
+
+    Primero recorta nombres largos; si aún no alcanza, conserva los más
+    baratos de cada tienda por turnos hasta llenar el presupuesto.
+
+    Args:
+        products (list): Productos crudos (el id es su posición en la lista)
+        budget (int): Tokens máximos para la tabla. Por defecto Config.GEMINI_PROMPT_TOKEN_BUDGET
+        max_name_chars (int): Por defecto Config.PROMPT_MAX_NAME_CHARS
+        indices (list): Solo estos ids (p. ej. representantes de grupos). Por defecto todos
+
+    Returns:
+        tuple: (tabla_codificada, ids_incluidos, tokens_estimados)
+    """
+    budget = budget or Config.GEMINI_PROMPT_TOKEN_BUDGET
+    max_name_chars = max_name_chars or Config.PROMPT_MAX_NAME_CHARS
+    indexed = _indexed(products, indices)
+
+    table = encode_products(indexed, max_name_chars)
+    tokens = estimate_tokens(table)
+    if tokens <= budget:
+        return table, [index for index, _ in indexed], tokens
+
+    kept = []
+    used = estimate_tokens(TABLE_HEADER) + 1
+    for index, product in _round_robin_by_price(indexed):
+        row_tokens = estimate_tokens(encode_row(index, product, max_name_chars)) + 1
+        if used + row_tokens > budget:
+            continue
+        kept.append((index, product))
+        used += row_tokens
+
+    kept.sort(key=lambda item: item[0])
+    table = encode_products(kept, max_name_chars)
+    return table, [index for index, _ in kept], estimate_tokens(table)
+
+
+def split_batches(products, batch_size=None, budget=None, max_batches=None, max_name_chars=None, indices=None):
+    """
+    Reparte los productos en lotes para analizarlos en paralelo
+
+    Cada lote tiene como máximo batch_size filas y budget tokens, con las
+    tiendas intercaladas. Los productos que no caben en max_batches lotes
+    quedan fuera (se completan con el análisis básico).
+
+    Returns:
+        list: Lotes de (id, producto); un único lote si todo cabe en uno
+    """
+    batch_size = batch_size or Config.GEMINI_BATCH_SIZE
+    budget = budget or Config.GEMINI_PROMPT_TOKEN_BUDGET
+    max_batches = max_batches or Config.GEMINI_MAX_BATCHES
+    max_name_chars = max_name_chars or Config.PROMPT_MAX_NAME_CHARS
+    indexed = _indexed(products, indices)
+
+    if len(indexed) <= batch_size:
+        return [indexed]
+
+    header_tokens = estimate_tokens(TABLE_HEADER) + 1
+    batches = []
+    current, used = [], header_tokens
+    for index, product in _round_robin_by_price(indexed):
+        row_tokens = estimate_tokens(encode_row(index, product, max_name_chars)) + 1
+        if current and (len(current) >= batch_size or used + row_tokens > budget):
+            batches.append(current)
+            if len(batches) >= max_batches:
+                return batches
+            current, used = [], header_tokens
+        current.append((index, product))
+        used += row_tokens
+    if current:
+        batches.append(current)
+    return batches
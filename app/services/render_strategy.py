@@ -0,0 +1,173 @@
+"""
+Selección adaptativa de estrategia de ScraperAPI por tienda
+Cada intento usa una estrategia (render JS y/o proxies premium). Se registra
+éxito, latencia y créditos de cada combinación (tienda, render, premium) y el
+orden de los intentos se elige por costo esperado hasta obtener resultados:
+ordenar por costo/probabilidad de éxito es el orden óptimo para intentos
+secuenciales independientes.
+
+Mientras una estrategia tenga pocas muestras se respeta el orden por defecto
+de la tienda (stores.py), con algo de exploración para que las alternativas
+también acumulen historial.
+"""
+
+import random
+import threading
+from config import Config
+from app.services.stores import get_store
+
+# Estrategia → (render, premium)
+STRATEGIES = {
+    'basic': (False, False),
+    'render': (True, False),
+    'premium': (False, True),
+    'render+premium': (True, True),
+}
+
+
+def strategy_params(strategy):
+    """Parámetros de ScraperAPI de una estrategia"""
+    render, premium = STRATEGIES[strategy]
+    params = {}
+    if render:
+        params['render'] = 'true'
+    if premium:
+        params['premium'] = 'true'
+    return params
+
+
+def strategy_credits(strategy):
+    """Créditos de ScraperAPI por request exitoso con esta estrategia"""
+    return Config.STRATEGY_CREDIT_COST.get(strategy, 1)
+
+
+def site_credits(site):
+    """Créditos de un request a la tienda con su estrategia preferida (la primera en stores.py)"""
+    store = get_store(site)
+    return strategy_credits(store.strategies[0] if store else 'basic')
+
+
+class _Stats:
+    __slots__ = ('attempts', 'successes', 'billed', 'latency', 'credits')
+
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.billed = 0
+        self.latency = None  # Promedio móvil exponencial (segundos)
+        self.credits = 0
+
+    def record(self, success, latency, credits, billed):
+        self.attempts += 1
+        if success:
+            self.successes += 1
+        if billed:
+            self.billed += 1
+            self.credits += credits
+        alpha = Config.STRATEGY_LATENCY_ALPHA
+        self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+
+    @property
+    def success_rate(self):
+        # Suavizado de Laplace: sin muestras = 50%
+        return (self.successes + 1) / (self.attempts + 2)
+
+    @property
+    def billed_rate(self):
+        # Sin muestras se asume que se cobra
+        return (self.billed + 1) / (self.attempts + 1)
+
+    def to_dict(self):
+        return {
+            'intentos': self.attempts,
+            'exitos': self.successes,
+            'tasa_exito': round(self.success_rate, 3),
+            'latencia': round(self.latency, 2) if self.latency is not None else None,
+            'cobrados': self.billed,
+            'creditos': self.credits,
+        }
+
+
+class StrategySelector:
+    """Historial por (tienda, estrategia) y orden de intentos (compartido por el proceso)"""
+
+    def __init__(self, rng=None):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._rng = rng or random.Random()
+
+    def record(self, site, strategy, success, latency, billed=None):
+        """
+        Args:
+            billed (bool): ScraperAPI cobró el request (todo status 200, incluso
+                páginas de bloqueo o sin productos). Por defecto = success
+        """
+        billed = success if billed is None else billed
+        with self._lock:
+            stats = self._stats.setdefault((site, strategy), _Stats())
+            stats.record(success, latency, strategy_credits(strategy), billed)
+
+    def expected_cost(self, site, strategy):
+        """Costo de un intento / probabilidad de éxito (segundos equivalentes por éxito)"""
+        with self._lock:
+            stats = self._stats.get((site, strategy)) or _Stats()
+            rate = stats.success_rate
+            billed_rate = stats.billed_rate
+            latency = stats.latency if stats.latency is not None else Config.REQUEST_TIMEOUT / 2
+        # ScraperAPI cobra todo status 200, aunque la página sea un bloqueo
+        cost = latency + billed_rate * strategy_credits(strategy) * Config.STRATEGY_SECONDS_PER_CREDIT
+        return cost / rate
+
+    def order(self, site, candidates):
+        """
+        Orden de intentos para una tienda
+
+        Args:
+            candidates (list): Estrategias de la tienda en su orden por defecto
+
+        Returns:
+            list: Las mismas estrategias, la de menor costo esperado primero
+        """
+        if len(candidates) < 2:
+            return list(candidates)
+        with self._lock:
+            samples = {s: self._stats[(site, s)].attempts if (site, s) in self._stats else 0 for s in candidates}
+        undersampled = [s for s in candidates if samples[s] < Config.STRATEGY_MIN_SAMPLES]
+        if undersampled:
+            ordered = list(candidates)
+            # Exploración: a veces probar primero una alternativa con pocas muestras
+            if self._rng.random() < Config.STRATEGY_EXPLORE:
+                pick = self._rng.choice(undersampled)
+                ordered.remove(pick)
+                ordered.insert(0, pick)
+            return ordered
+        return sorted(candidates, key=lambda s: (self.expected_cost(site, s), candidates.index(s)))
+
+    def should_race(self, site, ordered):
+        """¿Lanzar las dos mejores estrategias en paralelo? (tiendas difíciles de scrapear)"""
+        if not Config.STRATEGY_RACE or len(ordered) < 2:
+            return False
+        with self._lock:
+            stats = self._stats.get((site, ordered[0]))
+        if stats is None or stats.attempts < Config.STRATEGY_MIN_SAMPLES:
+            return False
+        return stats.success_rate < Config.STRATEGY_RACE_BELOW
+
+    def stats(self):
+        with self._lock:
+            by_site = {}
+            for (site, strategy), stats in self._stats.items():
+                by_site.setdefault(site, {})[strategy] = stats.to_dict()
+        return by_site
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_selector = StrategySelector()
+
+
+def get_selector():
+    """Selector compartido por el proceso (motor sync y async)"""
+    return _selector
@@ -1,495 +1,622 @@
+import asyncio
 import requests
-from bs4 import BeautifulSoup
 import time
 import random
 import hashlib
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from config import Config
+from app.services.http_session import get_session, record_error
+from app.services.cache import get_search_cache, key_id, normalize_query
+from app.services.singleflight import get_flight
+from app.services.products import ProductBatch
+from app.services.price_history import get_price_history
+from app.services.html_parsing import make_soup
+from app.services.stores import get_store
+from app.services.render_strategy import STRATEGIES, get_selector, strategy_params
+from app.services.circuit_breaker import get_breaker
+from app.services.async_engine import fetch, http_session_scope, run_in_background
+
+
+# Cortesía por tienda: intervalo mínimo entre requests a la misma tienda.
+# Compartido por todo el proceso (todas las búsquedas, threads y el motor async).
+_site_next_slot = {}
+_site_slots_lock = threading.Lock()
+
+
+def _reserve_site_slot(site):
+    """Reserva el próximo turno para esta tienda y devuelve cuántos segundos esperar"""
+    with _site_slots_lock:
+        now = time.monotonic()
+        slot = max(now, _site_next_slot.get(site, 0.0))
+        _site_next_slot[site] = slot + Config.SITE_MIN_INTERVAL
+        return slot - now
+
+
+# Resultados de un intento que prueban que la tienda responde (para el circuit breaker)
+_REACHABLE = ('ok', 'vacío')
+# Errores de la cuenta de ScraperAPI (API key inválida, sin créditos, plan sin
+# premium, límite de concurrencia): no dicen nada de la tienda
+_ACCOUNT_STATUSES = (401, 403, 429)
+# Páginas de bloqueo/captcha que la tienda devuelve con status 200
+_BLOCK_MARKERS = (b'captcha', b'robot check', b'are you a human', b'access denied', b'unusual traffic')
+
+
+# Refrescos en segundo plano (stale-while-revalidate): pool propio y uno por clave
+_refresh_executor = None
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
+
+def _get_refresh_executor():
+    global _refresh_executor
+    if _refresh_executor is None:
+        _refresh_executor = ThreadPoolExecutor(
+            max_workers=Config.CACHE_REFRESH_WORKERS, thread_name_prefix='cache-refresh'
+        )
+    return _refresh_executor
+
+
+def _wait_for_site_slot(site):
+    """Espera lo necesario para respetar SITE_MIN_INTERVAL en esta tienda"""
+    wait = _reserve_site_slot(site)
+    if wait > 0:
+        time.sleep(wait)
+
 
 class ProductScraper:
     def __init__(self, api_key):
         self.api_key = api_key
         self.timeout = Config.REQUEST_TIMEOUT
         self.max_results = Config.MAX_RESULTS_PER_SITE
+        self.max_workers = Config.SEARCH_MAX_WORKERS
+        self.deadline = Config.SEARCH_DEADLINE
+        self.session = get_session()
+        self.cache = get_search_cache()
+        self.flight = get_flight('search')
+        self.strategies = get_selector()
+        self.breaker = get_breaker()
+        # Tiendas omitidas en esta búsqueda por circuito abierto
+        self.skipped = set()
+        # Tiendas servidas con caché vencida en esta búsqueda: {tienda: edad en segundos}
+        self.stale = {}
+        
+    def search_products(self, product_name, concurrent=None):
+        """
+        Busca el producto en todas las tiendas configuradas
+        
+        Args:
+            product_name (str): Nombre del producto a buscar
+            concurrent (bool): Buscar en todas las tiendas a la vez.
+                Por defecto usa Config.CONCURRENT_SEARCH
+        
+        Returns:
+            ProductBatch: Productos encontrados en todas las tiendas
+        """
+        if concurrent is None:
+            concurrent = Config.CONCURRENT_SEARCH
         
-    def search_products(self, product_name):
         print(f"\n🔍 Buscando: '{product_name}'")
         print(f"   Sitios a buscar: {', '.join(Config.TARGET_SITES)}")
         print(f"   Productos por sitio: hasta {self.max_results}")
+        print(f"   Modo: {Config.SCRAPER_ENGINE + ' concurrente' if concurrent else 'secuencial'}")
         
-        all_products = []
-        for site in Config.TARGET_SITES:
-            try:
-                print(f"\n  📡 Buscando en {site}...")
-                products = self._search_site(site, product_name)
+        all_products = ProductBatch()
+        if concurrent and Config.SCRAPER_ENGINE == 'async':
+            # Todas las búsquedas del proceso comparten un event loop y un limitador
+            all_products = run_in_background(
+                self.asearch_products(product_name),
+                timeout=self.deadline + self.timeout
+            )
+        elif concurrent:
+            for site, products in self.iter_site_results(product_name):
                 all_products.extend(products)
-                if products:
-                    print(f"  ✅ {site}: {len(products)} productos encontrados")
-                else:
-                    print(f"  ⚠️ {site}: No se encontraron productos")
-                time.sleep(1)  # Pausa entre sitios para no sobrecargar
-            except Exception as e:
-                print(f"  ❌ Error en {site}: {str(e)[:100]}")
-                continue
+        else:
+            for site in Config.TARGET_SITES:
+                try:
+                    print(f"\n  📡 Buscando en {site}...")
+                    products = self._search_site(site, product_name)
+                    all_products.extend(products)
+                    self._log_site_result(site, products)
+                except Exception as e:
+                    print(f"  ❌ Error en {site}: {str(e)[:100]}")
+                    continue
         
         print(f"\n📊 Total encontrados: {len(all_products)} productos de {len(Config.TARGET_SITES)} tiendas")
         return all_products
     
-    def _search_site(self, site, product_name):
-        products = []
-        search_query = product_name.replace(" ", "+")
+    def iter_site_results(self, product_name, sites=None, deadline=None):
+        """
+        Busca en todas las tiendas en paralelo y entrega los resultados
+        a medida que cada tienda termina.
         
-        search_urls = {
-            'amazon.com': f'https://www.amazon.com/s?k={search_query}',
-            'walmart.com': f'https://www.walmart.com/search?q={search_query}',
-            'ebay.com': f'https://www.ebay.com/sch/i.html?_nkw={search_query}',
-            'bestbuy.com': f'https://www.bestbuy.com/site/searchpage.jsp?st={search_query}'
-        }
+        Args:
+            product_name (str): Nombre del producto a buscar
+            sites (list): Tiendas a consultar (por defecto Config.TARGET_SITES)
+            deadline (float): Segundos máximos para toda la búsqueda
         
-        target_url = search_urls.get(site)
-        if not target_url:
-            return products
+        Yields:
+            tuple: (site, products) en orden de llegada
+        """
+        sites = list(sites or Config.TARGET_SITES)
+        deadline = self.deadline if deadline is None else deadline
+        if not sites:
+            return
         
-        # Configuración óptima de ScraperAPI por tienda
-        scraper_params = {
-            'api_key': self.api_key,
-            'url': target_url,
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(sites))))
+        futures = {
+            executor.submit(self._search_site, site, product_name): site
+            for site in sites
         }
         
-        # Amazon: Simple y efectivo (sin parámetros extra)
-        if 'amazon' in site:
-            scraper_params['country_code'] = 'us'
-            # Amazon funciona perfecto así
-        
-        # eBay: Configuración especial para mejor compatibilidad
-        elif 'ebay' in site:
-            scraper_params['country_code'] = 'us'
-            scraper_params['keep_headers'] = 'true'
-            # eBay a veces necesita render también
-            scraper_params['render'] = 'false'  # Explícitamente false primero
-        
-        # Walmart: Necesita render JS + parámetros premium
-        elif 'walmart' in site:
-            scraper_params['render'] = 'true'
-            scraper_params['country_code'] = 'us'
-            scraper_params['premium'] = 'true'  # Usar premium proxies si están disponibles
-            scraper_params['session_number'] = '123'
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                site = futures[future]
+                try:
+                    products = future.result()
+                    self._log_site_result(site, products)
+                except Exception as e:
+                    print(f"  ❌ Error en {site}: {str(e)[:100]}")
+                    products = []
+                yield site, products
+        except FuturesTimeoutError:
+            pending = [site for future, site in futures.items() if not future.done()]
+            print(f"  ⏱️ Deadline de {deadline}s alcanzado. Sin respuesta de: {', '.join(pending)}")
+        finally:
+            # No esperar a las tiendas lentas: sus threads terminan solos por timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def asearch_products(self, product_name, sites=None, deadline=None):
+        """
+        Versión asyncio de search_products: todas las tiendas en el event loop
+        actual, con el limitador compartido del plan de ScraperAPI.
         
-        # BestBuy: Necesita render JS + parámetros premium
-        elif 'bestbuy' in site:
-            scraper_params['render'] = 'true'
-            scraper_params['country_code'] = 'us'
-            scraper_params['premium'] = 'true'  # Usar premium proxies si están disponibles
-            scraper_params['session_number'] = '456'
+        Returns:
+            ProductBatch: Productos encontrados en todas las tiendas
+        """
+        all_products = ProductBatch()
+        async for site, products in self.aiter_site_results(product_name, sites, deadline):
+            all_products.extend(products)
+        return all_products
+    
+    async def aiter_site_results(self, product_name, sites=None, deadline=None):
+        """Igual que iter_site_results pero sobre asyncio (async generator)"""
+        sites = list(sites or Config.TARGET_SITES)
+        deadline = self.deadline if deadline is None else deadline
+        if not sites:
+            return
         
-        # Construir URL de ScraperAPI
-        scraper_url = 'http://api.scraperapi.com'
+        loop = asyncio.get_running_loop()
+        ends_at = loop.time() + deadline
         
-        try:
-            print(f"    📡 Request URL: {scraper_url}")
-            print(f"    📋 Target: {target_url}")
-            print(f"    ⚙️ Params: {scraper_params}")
-            
-            response = requests.get(scraper_url, params=scraper_params, timeout=self.timeout)
-            print(f"    ✓ Response status: {response.status_code}")
-            print(f"    📦 Content length: {len(response.content)} bytes")
+        async with http_session_scope() as http:
+            tasks = {
+                asyncio.ensure_future(self._asearch_site(site, product_name, http)): site
+                for site in sites
+            }
+            pending = set(tasks)
+            try:
+                while pending:
+                    remaining = ends_at - loop.time()
+                    if remaining <= 0:
+                        break
+                    done, pending = await asyncio.wait(
+                        pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        site = tasks[task]
+                        try:
+                            products = task.result()
+                            self._log_site_result(site, products)
+                        except Exception as e:
+                            print(f"  ❌ Error en {site}: {str(e)[:100]}")
+                            products = []
+                        yield site, products
+                
+                if pending:
+                    print(f"  ⏱️ Deadline de {deadline}s alcanzado. Sin respuesta de: "
+                          f"{', '.join(tasks[t] for t in pending)}")
+            finally:
+                for task in pending:
+                    task.cancel()
+    
+    def _log_site_result(self, site, products):
+        if products:
+            print(f"  ✅ {site}: {len(products)} productos encontrados")
+        else:
+            print(f"  ⚠️ {site}: No se encontraron productos")
+    
+    def _search_site(self, site, product_name, use_cache=True):
+        """Busca en una tienda, sirviendo desde caché si hay resultados recientes"""
+        if use_cache:
+            cached = self._from_cache(site, product_name)
+            if cached is not None:
+                return cached
             
-            if response.status_code == 200:
-                # Verificar que hay contenido
-                if len(response.content) < 1000:
-                    print(f"    ⚠ Respuesta muy pequeña, probablemente bloqueada")
-                    print(f"    Contenido: {response.text[:500]}")
-                
-                soup = BeautifulSoup(response.content, 'html5lib')
-                
-                if 'amazon.com' in site:
-                    products = self._parse_amazon(soup, site)
-                    print(f"    ✓ Amazon parseado: {len(products)} productos")
-                elif 'walmart.com' in site:
-                    products = self._parse_walmart(soup, site)
-                    print(f"    ✓ Walmart parseado: {len(products)} productos")
-                elif 'ebay.com' in site:
-                    products = self._parse_ebay(soup, site)
-                    print(f"    ✓ eBay parseado: {len(products)} productos")
-                elif 'bestbuy.com' in site:
-                    products = self._parse_bestbuy(soup, site)
-                    print(f"    ✓ BestBuy parseado: {len(products)} productos")
-            else:
-                print(f"    ⚠ Status code no exitoso: {response.status_code}")
-                
-                # FALLBACK STRATEGY
-                # Si falló, intentar estrategia alternativa
-                if 'ebay' in site and scraper_params.get('render') == 'false':
-                    # eBay falló sin render, intentar CON render
-                    print(f"    → eBay: Reintentando CON render...")
-                    scraper_params['render'] = 'true'
-                    response = requests.get(scraper_url, params=scraper_params, timeout=self.timeout)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html5lib')
-                        products = self._parse_ebay(soup, site)
-                        print(f"    ✓ eBay parseado (con render): {len(products)} productos")
-                
-                elif 'render' in scraper_params and scraper_params['render'] == 'true':
-                    # Walmart/BestBuy falló con render, intentar SIN render
-                    print(f"    → Reintentando sin render para ahorrar créditos...")
-                    scraper_params['render'] = 'false'
-                    if 'session_number' in scraper_params:
-                        del scraper_params['session_number']
-                    if 'wait_for_selector' in scraper_params:
-                        del scraper_params['wait_for_selector']
-                    
-                    response = requests.get(scraper_url, params=scraper_params, timeout=self.timeout)
-                    if response.status_code == 200:
-                        soup = BeautifulSoup(response.content, 'html5lib')
-                        
-                        if 'walmart.com' in site:
-                            products = self._parse_walmart(soup, site)
-                            print(f"    ✓ Walmart parseado (sin render): {len(products)} productos")
-                        elif 'bestbuy.com' in site:
-                            products = self._parse_bestbuy(soup, site)
-                            print(f"    ✓ BestBuy parseado (sin render): {len(products)} productos")
-        except requests.Timeout:
-            print(f"    ⏱️ Timeout después de {self.timeout}s - Sitio muy lento")
-        except Exception as e:
-            print(f"    ✗ Error en scraping: {str(e)[:150]}")
+            # Búsquedas idénticas en curso comparten un solo scrape
+            products, shared = self.flight.do(
+                self._flight_key(site, product_name),
+                lambda: self._fetch_and_store(site, product_name)
+            )
+            if shared:
+                print(f"    🔗 {site}: resultado compartido con una búsqueda idéntica en curso")
+            return products[:self.max_results]
         
+        return self._fetch_site(site, product_name)
+    
+    def _flight_key(self, site, product_name):
+        # Con la API key: el error de una key inválida o sin cuota no llega a otros usuarios
+        return site, normalize_query(product_name), key_id(self.api_key)
+    
+    def _from_cache(self, site, product_name):
+        """
+        Productos desde caché: vigentes tal cual; vencidos (dentro del TTL duro)
+        se sirven al instante y se refrescan en segundo plano. None si no hay.
+        """
+        cached = self.cache.lookup(site, product_name)
+        if cached is None:
+            return None
+        products, age, stale = cached
+        if stale:
+            self.stale[site] = int(age)
+            scheduled = self._schedule_refresh(site, product_name)
+            print(f"    ♻️ {site}: {len(products)} productos de hace {int(age)}s desde caché"
+                  f"{' (refrescando en segundo plano)' if scheduled else ''}")
+        else:
+            print(f"    💾 {site}: {len(products)} productos desde caché")
         return products[:self.max_results]
     
-    def _parse_amazon(self, soup, site):
-        products = []
-        items = soup.find_all('div', {'data-component-type': 's-search-result'})
-        print(f"    Amazon: Encontrados {len(items)} items en HTML")
+    def _schedule_refresh(self, site, product_name):
+        """Refresca una entrada vencida fuera del request (una sola vez por clave)"""
+        key = self._flight_key(site, product_name)
+        with _refresh_lock:
+            if key in _refreshing:
+                return False
+            _refreshing.add(key)
         
-        for item in items[:self.max_results]:
+        def refresh():
             try:
-                name_elem = item.find('h2')
-                if not name_elem:
-                    continue
-                
-                price_elem = item.find('span', class_='a-price')
-                if not price_elem:
-                    continue
-                
-                price_whole = price_elem.find('span', class_='a-price-whole')
-                if not price_whole:
-                    continue
-                
-                link_elem = item.find('a', href=True)
-                if not link_elem:
-                    continue
-                
-                try:
-                    # Extraer precio correctamente (ej: $1,299.99 → 1299.99)
-                    price_text = price_whole.text.replace(',', '')
-                    # Eliminar todo excepto números y punto decimal
-                    price_text = ''.join(c for c in price_text if c.isdigit() or c == '.')
-                    price = float(price_text)
-                except:
-                    continue
-                
-                # Construir URL completa y válida
-                href = link_elem['href']
-                if href.startswith('/'):
-                    # Link relativo: /dp/B08N5WRWNW/ref=...
-                    product_url = f"https://www.amazon.com{href}"
-                elif href.startswith('http'):
-                    # Link absoluto completo
-                    product_url = href
-                else:
-                    # Otro caso: agregar dominio
-                    product_url = f"https://www.amazon.com/{href}"
-                
-                # Limpiar parámetros innecesarios pero mantener /dp/ o /gp/
-                if '/dp/' in product_url or '/gp/' in product_url:
-                    # Link válido de producto
-                    pass
-                else:
-                    # Si no tiene /dp/ o /gp/, mantener todo
-                    pass
-                
-                rating_elem = item.find('span', class_='a-icon-alt')
-                reviews = 4.0
-                if rating_elem:
-                    try:
-                        reviews = float(rating_elem.text.split()[0])
-                    except:
-                        pass
-                
-                products.append({
-                    'tienda': site,
-                    'nombre_crudo': name_elem.text.strip(),
-                    'precio': price,
-                    'url': product_url,
-                    'reviews': reviews
-                })
-            except:
-                continue
+                self.refresh_site(site, product_name)
+            except Exception as e:
+                print(f"    ⚠ Refresco de {site} falló: {str(e)[:100]}")
+            finally:
+                with _refresh_lock:
+                    _refreshing.discard(key)
         
+        try:
+            _get_refresh_executor().submit(refresh)
+        except RuntimeError:
+            # Intérprete cerrándose: no se puede programar el refresco
+            with _refresh_lock:
+                _refreshing.discard(key)
+            return False
+        return True
+    
+    def refresh_site(self, site, product_name):
+        """Scrapea de nuevo una tienda y actualiza la caché (refresco/pre-calentamiento)"""
+        # Un scrape en primer plano de la misma clave comparte este
+        products, _ = self.flight.do(
+            self._flight_key(site, product_name),
+            lambda: self._fetch_and_store(site, product_name)
+        )
         return products
     
-    def _parse_bestbuy(self, soup, site):
-        products = []
-        
-        # Intentar múltiples selectores (Best Buy cambia su HTML frecuentemente)
-        items = soup.find_all('li', class_='sku-item')
-        if not items:
-            items = soup.find_all('div', class_='sku-item')
-        if not items:
-            items = soup.find_all('div', {'data-sku-id': True})
-        
-        print(f"    BestBuy: Encontrados {len(items)} items en HTML")
-        
-        for item in items[:self.max_results]:
-            try:
-                # Buscar nombre del producto con múltiples selectores
-                name_elem = item.find('h4', class_='sku-title')
-                if not name_elem:
-                    name_elem = item.find('h4')
-                if not name_elem:
-                    name_elem = item.find('a', class_='v-fw-medium')
-                if not name_elem:
-                    continue
-                
-                # Buscar precio con múltiples selectores
-                price_elem = item.find('span', {'aria-hidden': 'true'})
-                if not price_elem:
-                    price_elem = item.find('span', class_='priceView-customer-price')
-                if not price_elem:
-                    price_elem = item.find('span', class_='priceView-hero-price')
-                if not price_elem:
-                    continue
-                
-                # Buscar link
-                link_elem = item.find('a', href=True)
-                if not link_elem:
-                    continue
-                
-                try:
-                    # Extraer precio (ej: $1,299.99 → 1299.99)
-                    price_text = price_elem.text.replace('$', '').replace(',', '').strip()
-                    # Buscar el primer número con o sin decimales
-                    match = re.search(r'(\d+\.?\d*)', price_text)
-                    if match:
-                        price = float(match.group(1))
-                    else:
-                        continue
-                except:
-                    continue
-                
-                # Construir URL completa
-                href = link_elem['href']
-                if href.startswith('/'):
-                    product_url = f"https://www.bestbuy.com{href}"
-                elif href.startswith('http'):
-                    product_url = href
-                else:
-                    product_url = f"https://www.bestbuy.com/{href}"
-                
-                products.append({
-                    'tienda': site,
-                    'nombre_crudo': name_elem.text.strip(),
-                    'precio': price,
-                    'url': product_url,
-                    'reviews': 4.0
-                })
-                print(f"    ✓ BestBuy producto añadido: {name_elem.text.strip()[:50]}... - ${price}")
-            except Exception as e:
-                print(f"    ⚠ Error parseando item de BestBuy: {str(e)[:50]}")
-                continue
-        
+    def _fetch_and_store(self, site, product_name):
+        products = self._fetch_site(site, product_name)
+        self.cache.set(site, product_name, products)
+        self._record_history(product_name, products)
         return products
     
-    def _parse_walmart(self, soup, site):
-        """Parser REAL para Walmart.com"""
-        products = []
-        
-        # Walmart usa diferentes estructuras según el tipo de página
-        # Intentar múltiples selectores
-        items = soup.find_all('div', {'data-item-id': True})
-        if not items:
-            items = soup.find_all('div', class_=re.compile('search-result'))
-        if not items:
-            items = soup.find_all('div', {'data-testid': 'list-view'})
+    def _record_history(self, product_name, products):
+        """Registra los precios de un scrape real en el historial (los hits de caché no)"""
+        history = get_price_history()
+        if history is None or not products:
+            return
+        try:
+            history.record(product_name, products)
+        except Exception as e:
+            print(f"    ⚠ Error registrando historial de precios: {str(e)[:100]}")
+    
+    async def _asearch_site(self, site, product_name, http, use_cache=True):
+        """Versión asyncio de _search_site (misma caché)"""
+        if use_cache:
+            cached = self._from_cache(site, product_name)
+            if cached is not None:
+                return cached
+            
+            async def fetch_and_store():
+                products = await self._afetch_site(site, product_name, http)
+                self.cache.set(site, product_name, products)
+                self._record_history(product_name, products)
+                return products
+            
+            products, shared = await self.flight.ado(self._flight_key(site, product_name), fetch_and_store)
+            if shared:
+                print(f"    🔗 {site}: resultado compartido con una búsqueda idéntica en curso")
+            return products[:self.max_results]
         
-        print(f"    Walmart: Encontrados {len(items)} items en HTML")
+        return await self._afetch_site(site, product_name, http)
+    
+    async def _afetch_site(self, site, product_name, http):
+        """Versión asyncio de _fetch_site: mismo plan de intentos y parsers"""
+        products = []
+        store = get_store(site)
+        if store is None:
+            return products
         
-        for item in items[:self.max_results]:
-            try:
-                # Buscar nombre
-                name_elem = item.find('span', {'data-automation-id': 'product-title'})
-                if not name_elem:
-                    name_elem = item.find('a', {'link-identifier': True})
-                if not name_elem:
-                    name_elem = item.find('span', class_=re.compile('product-title'))
-                if not name_elem:
-                    continue
-                
-                # Buscar precio
-                price_elem = item.find('span', {'data-automation-id': 'product-price'})
-                if not price_elem:
-                    price_elem = item.find('div', class_=re.compile('price'))
-                if not price_elem:
-                    continue
-                
-                # Buscar link
-                link_elem = item.find('a', href=True)
-                if not link_elem:
-                    continue
-                
-                try:
-                    # Extraer precio
-                    price_text = price_elem.text.replace('$', '').replace(',', '').strip()
-                    match = re.search(r'(\d+\.?\d*)', price_text)
-                    if match:
-                        price = float(match.group(1))
-                    else:
-                        continue
-                except:
-                    continue
-                
-                # Construir URL
-                href = link_elem['href']
-                if href.startswith('/'):
-                    product_url = f"https://www.walmart.com{href}"
-                elif href.startswith('http'):
-                    product_url = href
-                else:
-                    product_url = f"https://www.walmart.com/{href}"
-                
-                products.append({
-                    'tienda': site,
-                    'nombre_crudo': name_elem.text.strip(),
-                    'precio': price,
-                    'url': product_url,
-                    'reviews': 4.0
-                })
-                print(f"    ✓ Walmart producto: {name_elem.text.strip()[:50]}... - ${price}")
-            except Exception as e:
-                print(f"    ⚠ Error parseando item de Walmart: {str(e)[:50]}")
-                continue
+        allowed, probe = self._breaker_allows(site, store)
+        if not allowed:
+            return products
         
-        return products
+        plan = self._request_plan(site, store.search_url(product_name))
+        if probe:
+            plan = plan[:1]
+        if not probe and self.strategies.should_race(site, [strategy for strategy, _ in plan]):
+            products, outcomes = await self._arace(site, store, plan[:2], http)
+        else:
+            outcomes = []
+            for number, (strategy, params) in enumerate(plan):
+                if number:
+                    print(f"    → {store.label}: Reintentando con '{strategy}'...")
+                success, products, outcome = await self._aattempt(site, store, strategy, params, http)
+                outcomes.append(outcome)
+                if success:
+                    break
+        self._record_breaker(site, outcomes, probe)
+        return products[:self.max_results]
     
-    def _parse_ebay(self, soup, site):
-        """Parser REAL para eBay.com - MEJORADO con múltiples selectores"""
+    async def _aattempt(self, site, store, strategy, params, http):
+        """Un intento asyncio con una estrategia: (éxito, productos, resultado), registrado en el selector"""
+        wait = _reserve_site_slot(site)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        started = time.monotonic()
         products = []
+        status = None
+        try:
+            status, content = await fetch(http, Config.SCRAPER_API_URL, params, self.timeout)
+            print(f"    ✓ {store.label} [{strategy}] response status: {status} ({len(content)} bytes)")
+            if status == 200:
+                # Parsear fuera del event loop (CPU)
+                loop = asyncio.get_running_loop()
+                products = await loop.run_in_executor(None, self._parse_response, content, site)
+                print(f"    ✓ {store.label} parseado [{strategy}]: {len(products)} productos")
+            outcome = self._outcome(status, content, products)
+        except (asyncio.TimeoutError, requests.Timeout):
+            record_error()
+            outcome = 'timeout'
+            print(f"    ⏱️ {store.label} [{strategy}]: timeout después de {self.timeout}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            record_error()
+            outcome = 'error'
+            print(f"    ✗ Error en scraping [{strategy}]: {str(e)[:150]}")
+        # Éxito = la tienda devolvió una página real (con o sin productos): no hay que escalar
+        success = outcome in _REACHABLE
+        self.strategies.record(site, strategy, success, time.monotonic() - started, billed=status == 200)
+        return success, products, outcome
+    
+    async def _arace(self, site, store, plan, http):
+        """Dos estrategias en paralelo: gana el primer éxito, la otra se cancela"""
+        print(f"    🏁 {store.label}: carrera {' vs '.join(strategy for strategy, _ in plan)}")
+        tasks = [asyncio.ensure_future(self._aattempt(site, store, strategy, params, http))
+                 for strategy, params in plan]
+        pending = set(tasks)
+        outcomes = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    success, products, outcome = task.result()
+                    outcomes.append(outcome)
+                    if success:
+                        return products, outcomes
+            return [], outcomes
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def _request_plan(self, site, target_url):
+        """
+        Intentos de ScraperAPI en orden para una tienda: (estrategia, params).
+        Las estrategias y parámetros vienen de stores.py; el orden lo decide el
+        selector adaptativo con el historial de éxito, latencia y créditos de
+        la tienda. Cada intento solo se usa si el anterior no trajo productos.
+        """
+        store = get_store(site)
+        candidates = store.strategies if store else ['basic']
+        plan = []
+        for strategy in self.strategies.order(site, candidates):
+            params = {
+                'api_key': self.api_key,
+                'url': target_url,
+            }
+            if store:
+                params.update(store.request_params)
+            params.update(strategy_params(strategy))
+            # Sesión fija solo con render (misma IP para los recursos JS)
+            if store and store.render_session and STRATEGIES[strategy][0]:
+                params['session_number'] = store.render_session
+            plan.append((strategy, params))
+        return plan
+    
+    def _parse_response(self, content, site):
+        """Parsea el HTML devuelto por ScraperAPI"""
+        # Verificar que hay contenido
+        if len(content) < Config.BLOCKED_RESPONSE_BYTES:
+            print(f"    ⚠ Respuesta muy pequeña, probablemente bloqueada")
+            print(f"    Contenido: {content[:500].decode('utf-8', errors='replace')}")
         
-        # eBay tiene varias estructuras dependiendo de la vista
-        items = soup.find_all('li', class_='s-item')
-        if not items:
-            items = soup.find_all('div', class_='s-item')
-        if not items:
-            items = soup.find_all('li', class_=re.compile('s-item'))
-        if not items:
-            # Fallback: buscar cualquier item con enlace y precio
-            items = soup.find_all('div', class_=re.compile('item'))
-        
-        print(f"    eBay: Encontrados {len(items)} items en HTML")
+        soup = make_soup(content, site)
+        return self._parse_store(soup, site)
+    
+    def _fetch_site(self, site, product_name):
+        """Consulta ScraperAPI para una tienda y parsea los resultados"""
+        products = []
+        store = get_store(site)
+        if store is None:
+            return products
         
-        # Debug: Ver qué clases hay
-        if items:
-            first_item = items[0] if len(items) > 0 else None
-            if first_item:
-                print(f"    eBay: Primer item classes: {first_item.get('class', [])}")
+        allowed, probe = self._breaker_allows(site, store)
+        if not allowed:
+            return products
         
-        productos_encontrados = 0
-        for idx, item in enumerate(items):
-            if productos_encontrados >= self.max_results:
-                break
-                
-            try:
-                # Buscar nombre con MÚLTIPLES selectores
-                name_elem = item.find('h3', class_='s-item__title')
-                if not name_elem:
-                    name_elem = item.find('div', class_='s-item__title')
-                if not name_elem:
-                    name_elem = item.find('h3')
-                if not name_elem:
-                    name_elem = item.find('span', class_=re.compile('title'))
-                if not name_elem:
-                    print(f"    eBay item {idx}: No se encontró nombre")
-                    continue
-                
-                nombre_texto = name_elem.text.strip()
-                
-                # Filtro MUY SIMPLE - Solo eliminar basura obvia
-                if len(nombre_texto) < 5:
-                    print(f"    eBay item {idx}: Nombre muy corto")
-                    continue
-                
-                nombre_lower = nombre_texto.lower()
-                
-                # Solo filtrar si EMPIEZA con estas frases exactas
-                if nombre_lower.startswith('shop on ebay') or nombre_lower.startswith('based on'):
-                    print(f"    eBay item {idx}: Item especial filtrado")
-                    continue
-                
-                print(f"    eBay item {idx}: ✓ '{nombre_texto[:60]}'...")
-                
-                # Buscar precio con MÚLTIPLES selectores
-                price_elem = item.find('span', class_='s-item__price')
-                if not price_elem:
-                    price_elem = item.find('span', class_=re.compile('price'))
-                if not price_elem:
-                    price_elem = item.find('div', class_=re.compile('price'))
-                if not price_elem:
-                    print(f"    eBay item {idx}: No se encontró precio")
-                    continue
-                
-                # Buscar link
-                link_elem = item.find('a', class_='s-item__link', href=True)
-                if not link_elem:
-                    link_elem = item.find('a', href=True)
-                if not link_elem:
-                    print(f"    eBay item {idx}: No se encontró link")
-                    continue
-                
-                try:
-                    # Extraer precio (puede tener "to" para rangos)
-                    price_text = price_elem.text.replace('$', '').replace(',', '').strip()
-                    # Limpiar texto extra
-                    price_text = price_text.replace('USD', '').replace('Free shipping', '').strip()
-                    
-                    # Si hay rango (ej: "$100 to $200"), tomar el primero
-                    if 'to' in price_text.lower():
-                        price_text = price_text.lower().split('to')[0].strip()
-                    
-                    match = re.search(r'(\d+\.?\d*)', price_text)
-                    if match:
-                        price = float(match.group(1))
-                        if price < 1:  # Precio inválido
-                            print(f"    eBay item {idx}: Precio inválido: ${price}")
-                            continue
-                    else:
-                        print(f"    eBay item {idx}: No se pudo extraer precio de '{price_text}'")
-                        continue
-                except Exception as price_error:
-                    print(f"    eBay item {idx}: Error en precio: {str(price_error)[:50]}")
-                    continue
-                
-                # URL de eBay
-                product_url = link_elem['href']
-                if not product_url.startswith('http'):
-                    product_url = f"https://www.ebay.com{product_url}"
-                
-                # Producto válido encontrado
-                products.append({
-                    'tienda': site,
-                    'nombre_crudo': nombre_texto,
-                    'precio': price,
-                    'url': product_url,
-                    'reviews': 4.0
-                })
-                productos_encontrados += 1
-                print(f"    ✓ eBay producto {productos_encontrados}: {nombre_texto[:50]}... - ${price}")
-                
-            except Exception as e:
-                print(f"    ⚠ eBay item {idx} error general: {str(e)[:100]}")
-                continue
+        target_url = store.search_url(product_name)
+        print(f"    📡 Request URL: {Config.SCRAPER_API_URL}")
+        print(f"    📋 Target: {target_url}")
         
-        print(f"    eBay: Total productos válidos: {len(products)}")
-        return products
+        plan = self._request_plan(site, target_url)
+        if probe:
+            plan = plan[:1]
+        if not probe and self.strategies.should_race(site, [strategy for strategy, _ in plan]):
+            products, outcomes = self._race(site, store, plan[:2])
+        else:
+            outcomes = []
+            for number, (strategy, params) in enumerate(plan):
+                if number:
+                    print(f"    → {store.label}: Reintentando con '{strategy}'...")
+                success, products, outcome = self._attempt(site, store, strategy, params)
+                outcomes.append(outcome)
+                if success:
+                    break
+        self._record_breaker(site, outcomes, probe)
+        return products[:self.max_results]
+    
+    def _breaker_allows(self, site, store):
+        """
+        (permitido, es_prueba) según el circuit breaker de la tienda. Con el
+        circuito abierto la tienda se omite sin pagar sus timeouts; la prueba
+        half-open hace un solo intento (sin cadena de fallback).
+        """
+        if self.breaker is None:
+            return True, False
+        try:
+            allowed, probe = self.breaker.allow(site)
+        except Exception as e:
+            print(f"    ⚠ Circuit breaker no disponible: {str(e)[:100]}")
+            return True, False
+        if not allowed:
+            self.skipped.add(site)
+            print(f"    🔌 {store.label}: circuito abierto, se omite la tienda")
+        elif probe:
+            print(f"    🔌 {store.label}: probando si la tienda volvió a responder")
+        return allowed, probe
+    
+    def _record_breaker(self, site, outcomes, probe=False):
+        """
+        La tienda respondió si algún intento trajo una página real; si no, es
+        un fallo. Los errores de cuenta no cuentan: el estado es compartido por
+        todos los usuarios y una API key inválida no significa que la tienda
+        esté caída.
+        """
+        if self.breaker is None:
+            return
+        outcomes = [outcome for outcome in outcomes if outcome != 'cuenta']
+        try:
+            if not outcomes:
+                if probe:
+                    self.breaker.release(site)  # Que otro request haga la prueba
+            elif any(outcome in _REACHABLE for outcome in outcomes):
+                self.breaker.record_success(site)
+            else:
+                blocked = all(outcome == 'bloqueado' for outcome in outcomes)
+                self.breaker.record_failure(site, outcomes[-1], blocked=blocked)
+        except Exception as e:
+            print(f"    ⚠ Circuit breaker no disponible: {str(e)[:100]}")
+    
+    @staticmethod
+    def _outcome(status, content, products):
+        """
+        Resultado de un intento que respondió: ok, vacío (página real sin
+        productos), cuenta, bloqueado o status. Solo 'bloqueado' y los errores
+        pasan a la siguiente estrategia (más cara); una búsqueda sin resultados no.
+        """
+        if products:
+            return 'ok'
+        if status in _ACCOUNT_STATUSES:
+            return 'cuenta'
+        if len(content) < Config.BLOCKED_RESPONSE_BYTES:
+            return 'bloqueado'
+        if status == 200:
+            lowered = content.lower()
+            if any(marker in lowered for marker in _BLOCK_MARKERS):
+                return 'bloqueado'
+        if status != 200:
+            return f'status {status}'
+        return 'vacío'
+    
+    def _attempt(self, site, store, strategy, params):
+        """Un intento con una estrategia: (éxito, productos, resultado), registrado en el selector"""
+        print(f"    ⚙️ Params [{strategy}]: {dict(params, api_key='***')}")
+        _wait_for_site_slot(site)
+        started = time.monotonic()
+        products = []
+        status = None
+        try:
+            response = self.session.get(Config.SCRAPER_API_URL, params=params, timeout=self.timeout)
+            status = response.status_code
+            print(f"    ✓ Response status: {status}")
+            print(f"    📦 Content length: {len(response.content)} bytes")
+            if response.status_code == 200:
+                products = self._parse_response(response.content, site)
+                print(f"    ✓ {store.label} parseado [{strategy}]: {len(products)} productos")
+            else:
+                print(f"    ⚠ Status code no exitoso: {response.status_code}")
+            outcome = self._outcome(response.status_code, response.content, products)
+        except requests.Timeout:
+            record_error()
+            outcome = 'timeout'
+            print(f"    ⏱️ Timeout después de {self.timeout}s - Sitio muy lento")
+        except Exception as e:
+            record_error()
+            outcome = 'error'
+            print(f"    ✗ Error en scraping: {str(e)[:150]}")
+        # Éxito = la tienda devolvió una página real (con o sin productos): no hay que escalar
+        success = outcome in _REACHABLE
+        self.strategies.record(site, strategy, success, time.monotonic() - started, billed=status == 200)
+        return success, products, outcome
+    
+    def _race(self, site, store, plan):
+        """
+        Dos estrategias en paralelo para tiendas difíciles: gana el primer
+        éxito. El intento perdedor termina solo y su resultado (y sus créditos,
+        si respondió con status 200) igual alimenta el historial.
+        """
+        print(f"    🏁 {store.label}: carrera {' vs '.join(strategy for strategy, _ in plan)}")
+        executor = ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix='strategy-race')
+        futures = [executor.submit(self._attempt, site, store, strategy, params) for strategy, params in plan]
+        outcomes = []
+        try:
+            for future in as_completed(futures):
+                success, products, outcome = future.result()
+                outcomes.append(outcome)
+                if success:
+                    return products, outcomes
+            return [], outcomes
+        finally:
+            executor.shutdown(wait=False)
+    
+    def _parse_store(self, soup, site):
+        """Extrae productos con la definición declarativa de la tienda (ver stores.py)"""
+        store = get_store(site)
+        if store is None:
+            return []
+        return store.parse(soup, self.max_results)
+    
+    # Atajos por tienda (usados por /api/test, tests y benchmarks)
+    def _parse_amazon(self, soup, site):
+        return self._parse_store(soup, site)
+    
+    def _parse_bestbuy(self, soup, site):
+        return self._parse_store(soup, site)
+    
+    def _parse_walmart(self, soup, site):
+        return self._parse_store(soup, site)
+    
+    def _parse_ebay(self, soup, site):
+        return self._parse_store(soup, site)
     
     def _parse_target(self, soup, site):
-        """Target no implementado aún"""
-        return []
+        return self._parse_store(soup, site)
@@ -0,0 +1,152 @@
+"""
+Single-flight: coalescencia de peticiones idénticas concurrentes
+Si llegan varias búsquedas iguales mientras una está en curso, solo la
+primera (líder) llama a ScraperAPI / Gemini; el resto espera y comparte su
+resultado. La carga upstream queda en una petición por consulta única.
+"""
+
+import asyncio
+import copy
+import threading
+import weakref
+
+
+class _Call:
+    """Petición en curso: las demás esperan a que termine"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _cancelling():
+    """¿Se pidió cancelar la tarea actual? (Task.cancelling() existe desde Python 3.11)"""
+    task = asyncio.current_task()
+    cancelling = getattr(task, 'cancelling', None)
+    return bool(cancelling and cancelling())
+
+
+class SingleFlight:
+    """
+    Registro de peticiones en curso por clave
+
+    Los seguidores reciben una copia del resultado del líder (nadie comparte
+    listas/dicts mutables) o la misma excepción si el líder falló.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._async_calls = weakref.WeakKeyDictionary()  # loop → {clave: Future}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """
+        Ejecuta fn() una sola vez por clave entre llamadas concurrentes
+
+        Returns:
+            tuple: (resultado, compartido) - compartido=True si se esperó a otra petición
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.leaders += 1
+            else:
+                leader = False
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, coro_fn):
+        """
+        Versión asyncio de do() (coalesce dentro del mismo event loop)
+
+        Si el líder se cancela (p. ej. por el deadline de SU búsqueda), los
+        seguidores no heredan la cancelación: uno de ellos pasa a ser líder y
+        vuelve a ejecutar coro_fn.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                calls = self._async_calls.setdefault(loop, {})
+                future = calls.get(key)
+                leader = future is None
+                if leader:
+                    future = calls[key] = loop.create_future()
+                    self.leaders += 1
+                else:
+                    self.shared += 1
+
+            if leader:
+                break
+            try:
+                # shield: cancelar a un seguidor no cancela al líder
+                result = await asyncio.shield(future)
+                return copy.deepcopy(result), True
+            except asyncio.CancelledError:
+                if future.cancelled() and not _cancelling():
+                    continue  # Se canceló el líder, no este seguidor: reintentar
+                raise
+
+        try:
+            result = await coro_fn()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evitar el aviso "exception was never retrieved" si no hay seguidores
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                if calls.get(key) is future:
+                    del calls[key]
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls) + sum(len(c) for c in self._async_calls.values())
+        total = self.leaders + self.shared
+        return {
+            'en_curso': in_flight,
+            'peticiones_upstream': self.leaders,
+            'peticiones_compartidas': self.shared,
+            'tasa_coalescencia': f"{(self.shared / total * 100) if total else 0:.1f}%"
+        }
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name):
+    """Grupo single-flight compartido por el proceso ('search', 'analysis')"""
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
@@ -0,0 +1,320 @@
+"""
+Registro declarativo de tiendas
+Cada tienda se define con datos (URLs, selectores en orden de fallback,
+reglas de precio y filtros). Los selectores se compilan una sola vez al
+importar y un único motor de extracción recorre cada item en una pasada.
+
+Sintaxis de selectores (subconjunto de CSS):
+    tag.clase[attr][attr=valor][attr*=subcadena]
+    'padre hijo'  → busca 'hijo' dentro del primer 'padre'
+"""
+
+import re
+from urllib.parse import quote_plus
+from bs4 import Tag
+from app.services.products import DEFAULT_REVIEWS, Product
+
+PRICE_NUMBER = re.compile(r'(\d+\.?\d*)')
+RATING_NUMBER = re.compile(r'(\d+(?:\.\d+)?)')
+
+# Definiciones de tiendas: agregar una tienda = agregar una entrada aquí
+STORE_DEFINITIONS = {
+    'amazon.com': {
+        'label': 'Amazon',
+        'base_url': 'https://www.amazon.com',
+        'search_url': 'https://www.amazon.com/s?k={query}',
+        # Amazon funciona perfecto sin render
+        'request_params': {'country_code': 'us'},
+        'strategies': ['basic'],
+        'containers': ['div[data-component-type=s-search-result]'],
+        'name': ['h2'],
+        'price': ['span.a-price span.a-price-whole'],
+        'link': ['a[href]'],
+        'rating': ['span.a-icon-alt'],
+        'price_strip': [','],
+    },
+    'ebay.com': {
+        'label': 'eBay',
+        'base_url': 'https://www.ebay.com',
+        'search_url': 'https://www.ebay.com/sch/i.html?_nkw={query}',
+        # eBay a veces necesita render: sin render primero, con render como fallback
+        'request_params': {'country_code': 'us', 'keep_headers': 'true'},
+        'strategies': ['basic', 'render'],
+        # eBay tiene varias estructuras dependiendo de la vista
+        'containers': ['li.s-item', 'div.s-item', 'li[class*=s-item]', 'div[class*=item]'],
+        'name': ['h3.s-item__title', 'div.s-item__title', 'h3', 'span[class*=title]'],
+        'price': ['span.s-item__price', 'span[class*=price]', 'div[class*=price]'],
+        'link': ['a.s-item__link[href]', 'a[href]'],
+        'price_strip': ['$', ',', 'USD', 'Free shipping'],
+        'price_range_separator': 'to',  # "$100 to $200" → 100
+        'min_price': 1,
+        'min_name_length': 5,
+        'skip_name_prefixes': ['shop on ebay', 'based on'],
+    },
+    'walmart.com': {
+        'label': 'Walmart',
+        'base_url': 'https://www.walmart.com',
+        'search_url': 'https://www.walmart.com/search?q={query}',
+        # Render JS + proxies premium; fallback sin render para ahorrar créditos
+        'request_params': {'country_code': 'us'},
+        'render_session': '123',
+        'strategies': ['render+premium', 'premium'],
+        'containers': ['div[data-item-id]', 'div[class*=search-result]', 'div[data-testid=list-view]'],
+        'name': ['span[data-automation-id=product-title]', 'a[link-identifier]', 'span[class*=product-title]'],
+        'price': ['span[data-automation-id=product-price]', 'div[class*=price]'],
+        'link': ['a[href]'],
+        'price_strip': ['$', ','],
+    },
+    'bestbuy.com': {
+        'label': 'BestBuy',
+        'base_url': 'https://www.bestbuy.com',
+        'search_url': 'https://www.bestbuy.com/site/searchpage.jsp?st={query}',
+        'request_params': {'country_code': 'us'},
+        'render_session': '456',
+        'strategies': ['render+premium', 'premium'],
+        # Best Buy cambia su HTML frecuentemente
+        'containers': ['li.sku-item', 'div.sku-item', 'div[data-sku-id]'],
+        'name': ['h4.sku-title', 'h4', 'a.v-fw-medium'],
+        'price': ['span[aria-hidden=true]', 'span.priceView-customer-price', 'span.priceView-hero-price'],
+        'link': ['a[href]'],
+        'price_strip': ['$', ','],
+    },
+    'target.com': {
+        'label': 'Target',
+        'base_url': 'https://www.target.com',
+        'search_url': 'https://www.target.com/s?searchTerm={query}',
+        'containers': ['div[data-test=@web/site-top-of-funnel/ProductCardWrapper]'],
+        'name': ['a[data-test=product-title]'],
+        'price': ['span[data-test=current-price]'],
+        'link': ['a[data-test=product-title][href]', 'a[href]'],
+        'rating': ['span[data-test=ratings]'],
+        'price_strip': ['$', ','],
+        'price_range_separator': '-',
+    },
+}
+
+_STEP_RE = re.compile(r'^(?P<tag>[\w-]+)?(?P<classes>(?:\.[\w-]+)*)(?P<attrs>(?:\[[^\]]+\])*)$')
+_ATTR_RE = re.compile(r'\[([\w-]+)(?:(\*?=)([^\]]*))?\]')
+
+
+def _values(value):
+    # 'class' llega como lista en un Tag y como string durante el parseo (SoupStrainer)
+    if isinstance(value, (list, tuple)):
+        return value, ' '.join(value)
+    return value.split(), value
+
+
+class SelectorStep:
+    """Un paso compilado: tag + condiciones sobre atributos"""
+
+    __slots__ = ('tag', 'checks')
+
+    def __init__(self, text):
+        match = _STEP_RE.match(text)
+        if not match:
+            raise ValueError(f"Selector inválido: {text}")
+        self.tag = match.group('tag')
+        self.checks = []
+        for cls in filter(None, match.group('classes').split('.')):
+            self.checks.append(('class', '=', cls))
+        for name, op, value in _ATTR_RE.findall(match.group('attrs')):
+            self.checks.append((name, op or 'exists', value))
+
+    def matches(self, name, attrs):
+        if self.tag is not None and name != self.tag:
+            return False
+        for attr, op, expected in self.checks:
+            value = attrs.get(attr)
+            if value is None:
+                return False
+            if op == 'exists':
+                continue
+            parts, joined = _values(value)
+            if op == '=':
+                if expected not in parts and joined != expected:
+                    return False
+            elif expected not in joined:  # '*=' subcadena
+                return False
+        return True
+
+    def find_in(self, element):
+        """Primer descendiente que cumple el paso (como element.find)"""
+        return element.find(lambda tag: self.matches(tag.name, tag.attrs))
+
+    def find_all_in(self, element):
+        return element.find_all(lambda tag: self.matches(tag.name, tag.attrs))
+
+
+class Selector:
+    """Selector compilado: primer paso evaluado en la pasada, el resto anidado"""
+
+    __slots__ = ('text', 'steps')
+
+    def __init__(self, text):
+        self.text = text
+        self.steps = [SelectorStep(part) for part in text.split()]
+
+    def resolve(self, element):
+        """Completa los pasos anidados a partir del elemento del primer paso"""
+        for step in self.steps[1:]:
+            element = step.find_in(element)
+            if element is None:
+                return None
+        return element
+
+
+class StoreDefinition:
+    """Definición compilada de una tienda"""
+
+    FIELDS = ('name', 'price', 'link', 'rating')
+
+    def __init__(self, site, spec):
+        self.site = site
+        self.label = spec.get('label', site)
+        self.base_url = spec['base_url']
+        self.search_url_template = spec['search_url']
+        self.containers = [SelectorStep(s) for s in spec['containers']]
+        self.selectors = {
+            field: [Selector(s) for s in spec.get(field, [])]
+            for field in self.FIELDS
+        }
+        self.price_strip = spec.get('price_strip', [])
+        self.price_range_separator = spec.get('price_range_separator')
+        self.min_price = spec.get('min_price', 0)
+        self.min_name_length = spec.get('min_name_length', 0)
+        self.skip_name_prefixes = tuple(spec.get('skip_name_prefixes', []))
+        # Request a ScraperAPI: parámetros fijos y estrategias en orden por defecto
+        self.request_params = dict(spec.get('request_params', {}))
+        self.render_session = spec.get('render_session')
+        self.strategies = list(spec.get('strategies', ['basic']))
+
+        # Índice por tag del primer paso: (campo, prioridad, paso)
+        self._by_tag = {}
+        for field, selectors in self.selectors.items():
+            for priority, selector in enumerate(selectors):
+                first = selector.steps[0]
+                self._by_tag.setdefault(first.tag, []).append((field, priority, first))
+        self._any_tag = self._by_tag.pop(None, [])
+        self._field_count = sum(1 for selectors in self.selectors.values() if selectors)
+        self._required = [f for f in ('name', 'price', 'link') if self.selectors[f]]
+
+    def search_url(self, product_name):
+        return self.search_url_template.format(query=quote_plus(product_name))
+
+    def is_container(self, name, attrs):
+        """Predicado para SoupStrainer: ¿es un contenedor de resultados?"""
+        return any(step.matches(name, attrs) for step in self.containers)
+
+    def find_items(self, soup):
+        """Contenedores de resultados: primer selector con resultados gana"""
+        for step in self.containers:
+            items = step.find_all_in(soup)
+            if items:
+                return items
+        return []
+
+    def match_fields(self, item):
+        """
+        Una sola pasada por los descendientes del item. Para cada campo se queda
+        con el primer elemento del selector de mayor prioridad (mismo resultado
+        que encadenar find() de fallback, sin recorrer el item varias veces).
+        """
+        found = {}
+        pending = self._field_count  # Campos aún sin su selector preferido
+        for element in item.descendants:
+            if not isinstance(element, Tag):
+                continue
+            candidates = self._by_tag.get(element.name)
+            if candidates is None and not self._any_tag:
+                continue
+            for field, priority, step in (candidates or []) + self._any_tag:
+                current = found.get(field)
+                if current is not None and current[0] <= priority:
+                    continue
+                if step.matches(element.name, element.attrs):
+                    if priority == 0:
+                        pending -= 1
+                    found[field] = (priority, element)
+            if pending <= 0:
+                break
+
+        # Resolver pasos anidados (ej: span.a-price → span.a-price-whole)
+        result = {}
+        for field, (priority, element) in found.items():
+            result[field] = self.selectors[field][priority].resolve(element)
+        return result
+
+    def parse_price(self, text):
+        for token in self.price_strip:
+            text = text.replace(token, '')
+        text = text.strip()
+        if self.price_range_separator and self.price_range_separator in text.lower():
+            text = text.lower().split(self.price_range_separator)[0].strip()
+        match = PRICE_NUMBER.search(text)
+        if not match:
+            return None
+        price = float(match.group(1))
+        return price if price >= self.min_price else None
+
+    def build_url(self, href):
+        if href.startswith('http'):
+            return href
+        if href.startswith('/'):
+            return f"{self.base_url}{href}"
+        return f"{self.base_url}/{href}"
+
+    def extract(self, item):
+        """Producto del item o None si le falta algún dato obligatorio"""
+        fields = self.match_fields(item)
+        if any(fields.get(f) is None for f in self._required):
+            return None
+
+        name = fields['name'].text.strip()
+        if len(name) < self.min_name_length:
+            return None
+        if self.skip_name_prefixes and name.lower().startswith(self.skip_name_prefixes):
+            return None
+
+        price = self.parse_price(fields['price'].text)
+        if price is None:
+            return None
+
+        reviews = DEFAULT_REVIEWS
+        rating_elem = fields.get('rating')
+        if rating_elem is not None:
+            match = RATING_NUMBER.search(rating_elem.text)
+            if match:
+                reviews = float(match.group(1))
+
+        return Product(self.site, name, price, self.build_url(fields['link']['href']), reviews)
+
+    def parse(self, soup, max_results):
+        """Extrae hasta max_results productos válidos de la página"""
+        items = self.find_items(soup)
+        print(f"    {self.label}: Encontrados {len(items)} items en HTML")
+        products = []
+        for item in items:
+            if len(products) >= max_results:
+                break
+            try:
+                product = self.extract(item)
+            except Exception as e:
+                print(f"    ⚠ Error parseando item de {self.label}: {str(e)[:50]}")
+                continue
+            if product:
+                products.append(product)
+        return products
+
+
+# Compilado una sola vez al importar
+STORES = {site: StoreDefinition(site, spec) for site, spec in STORE_DEFINITIONS.items()}
+
+
+def get_store(site):
+    """Definición de la tienda para un sitio ('amazon.com', 'www.amazon.com'...)"""
+    if site in STORES:
+        return STORES[site]
+    for key, store in STORES.items():
+        if key in site:
+            return store
+    return None
@@ -7,7 +7,8 @@ document.addEventListener('DOMContentLoaded', function() {
     searchForm.addEventListener('submit', handleSearch);
 });
 
-// Función principal para manejar la búsqueda (MEJORADA)
+// Función principal para manejar la búsqueda (STREAMING)
+// Los productos de cada tienda se muestran en cuanto llegan, luego el análisis IA
 async function handleSearch(event) {
     event.preventDefault();
     
@@ -29,8 +30,7 @@ async function handleSearch(event) {
     try {
         updateProgress(20, 'Conectando con tiendas en línea...');
         
-        // Realizar petición al backend
-        const response = await fetch('/api/search', {
+        const response = await fetch('/api/search/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -38,29 +38,17 @@ async function handleSearch(event) {
             body: JSON.stringify(formData)
         });
         
-        updateProgress(60, 'Analizando productos con IA...');
-        
-        const result = await response.json();
-        
-        updateProgress(90, 'Generando recomendaciones...');
-        
-        hideLoading();
-        
-        if (result.success) {
-            updateProgress(100, 'Completado!');
-            displayResults(result.data);
-            
-            // Scroll suave al resultado
-            setTimeout(() => {
-                document.getElementById('resultsSection').scrollIntoView({ 
-                    behavior: 'smooth', 
-                    block: 'start' 
-                });
-            }, 300);
-        } else {
+        // Errores de validación llegan como JSON normal
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('text/event-stream') || !response.body) {
+            const result = await response.json();
+            hideLoading();
             showError(result.error || 'Error desconocido. Por favor intenta de nuevo.');
+            return;
         }
         
+        await readSearchStream(response.body);
+        
     } catch (error) {
         hideLoading();
         showError('Error de conexión con el servidor. Por favor verifica tu conexión a internet e intenta nuevamente.');
@@ -68,6 +56,103 @@ async function handleSearch(event) {
     }
 }
 
+// Leer el stream SSE de /api/search/stream y despachar cada evento
+async function readSearchStream(body) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    const state = { products: [], analyzed: {}, finished: false };
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Los eventos SSE se separan con una línea en blanco
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+            handleStreamEvent(parseSSE(rawEvent), state);
+        }
+    }
+    
+    if (!state.finished) {
+        hideLoading();
+        showError('La conexión se cerró antes de completar el análisis. Intenta nuevamente.');
+    }
+}
+
+function parseSSE(rawEvent) {
+    let event = 'message';
+    const dataLines = [];
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) dataLines.push(line.slice(6));
+    });
+    return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+}
+
+function handleStreamEvent({ event, data }, state) {
+    switch (event) {
+        case 'store': {
+            state.products.push(...data.products);
+            const pct = 20 + Math.round(40 * data.completadas / data.total);
+            const age = data.stale ? ` · caché de hace ${Math.round(data.edad / 60)} min`
+                : data.omitida ? ' · omitida (sin respuesta reciente)' : '';
+            updateProgress(pct, `${data.tienda}: ${data.products.length} productos${age} (${data.completadas}/${data.total} tiendas)`);
+            if (state.products.length > 0) {
+                displayPartialProducts(state.products);
+            }
+            break;
+        }
+        case 'statistics':
+            updateProgress(70, 'Analizando productos con IA...');
+            displayStatistics(data);
+            break;
+        case 'ai_summary':
+            if (data.summary) displayAISummary(data.summary);
+            if (data.insights && data.insights.length > 0) displayAIInsights(data.insights);
+            break;
+        case 'ai_product': {
+            // Reemplazar el producto crudo por su versión analizada
+            state.analyzed[productKey(data)] = data;
+            updateProgress(70 + Math.round(25 * Object.keys(state.analyzed).length / state.products.length),
+                'Recibiendo recomendaciones de la IA...');
+            displayPartialProducts(state.products, state.analyzed);
+            break;
+        }
+        case 'analysis':
+            state.finished = true;
+            updateProgress(100, 'Completado!');
+            hideLoading();
+            displayResults(data);
+            break;
+        case 'error':
+            state.finished = true;
+            hideLoading();
+            showError(data.error || 'Error desconocido. Por favor intenta de nuevo.');
+            break;
+    }
+}
+
+function productKey(product) {
+    return `${product.tienda}|${product.url}`;
+}
+
+// Mostrar productos crudos (o ya analizados) mientras la IA termina el análisis
+function displayPartialProducts(products, analyzed = {}) {
+    document.getElementById('resultsSection').classList.remove('hidden');
+    if (Object.keys(analyzed).length === 0) {
+        displayAISummary('Analizando precios con IA...');
+    }
+    displayProductsTable(products.map(p => analyzed[productKey(p)] || {
+        ...p,
+        recomendacion: '⏳ Analizando...',
+        razon: ''
+    }));
+}
+
 // Función para actualizar el progreso
 function updateProgress(percentage, status) {
     const progressBar = document.getElementById('progressBar');
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline del análisis por lotes de Gemini (sin red)
+
+Un modelo simulado responde cada prompt con una latencia fija. Con lotes en
+paralelo el análisis completo debería tardar cerca de una sola llamada.
+
+Uso:
+    python benchmarks/bench_batches.py
+    python benchmarks/bench_batches.py --products 120 --latency 0.2 --check --slack-ms 150
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import gemini_analyzer  # noqa: E402
+from app.services.cache import AnalysisCache, MemoryCacheBackend  # noqa: E402
+from app.services.gemini_analyzer import GeminiAnalyzer  # noqa: E402
+from config import Config  # noqa: E402
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class SimulatedModel:
+    """Responde lotes con deltas por id y el resumen con texto, tras `latency` segundos"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        if prompt.startswith('Resume'):
+            return _Response(json.dumps({'summary': 'resumen', 'insights': []}))
+        ids = [int(m) for m in re.findall(r'^(\d+)\|', prompt, re.M)]
+        return _Response(json.dumps({'products': [{'id': i, 'rec': 'A', 'v': 70} for i in ids]}))
+
+
+def make_analyzer(latency):
+    analyzer = GeminiAnalyzer.__new__(GeminiAnalyzer)
+    analyzer.api_key = 'benchmark'
+    analyzer.model = SimulatedModel(latency)
+    analyzer.model_name = 'simulated'
+    analyzer.use_fallback = False
+    analyzer.cache = AnalysisCache(MemoryCacheBackend(10), ttl=60)
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline del análisis por lotes')
+    parser.add_argument('--products', type=int, default=60, help='Productos a analizar')
+    parser.add_argument('--latency', type=float, default=0.1, help='Segundos por llamada simulada')
+    parser.add_argument('--check', action='store_true',
+                        help='Salir con error si el análisis supera una llamada + slack')
+    parser.add_argument('--slack-ms', type=float, default=200, help='Margen sobre una sola llamada')
+    args = parser.parse_args()
+
+    Config.GEMINI_MIN_INTERVAL = 0
+    Config.MATCHING_ENABLED = False
+    gemini_analyzer._gemini_next_slot = 0.0
+    products = [
+        {'tienda': 'amazon.com', 'nombre_crudo': f'Producto {i}', 'precio': 500.0 + i,
+         'url': f'https://example.com/{i}', 'reviews': 4.0}
+        for i in range(args.products)
+    ]
+
+    analyzer = make_analyzer(args.latency)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.analyze_products(products, 'benchmark')
+    elapsed = (time.perf_counter() - start) * 1000
+    single = args.latency * 1000
+    print(f"{args.products} productos: {analyzer.model.calls} llamadas en {elapsed:.1f} ms "
+          f"(una llamada: {single:.0f} ms, secuencial: {single * analyzer.model.calls:.0f} ms)")
+
+    if args.check and elapsed > single + args.slack_ms:
+        print(f"\n❌ Análisis por lotes: {elapsed:.0f}ms > {single + args.slack_ms:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline del agrupamiento de productos equivalentes (sin red)
+
+Mide cuánto cuesta comparar dos huellas y agrupar una búsqueda completa
+antes de cada análisis de Gemini.
+
+Uso:
+    python benchmarks/bench_matching.py
+    python benchmarks/bench_matching.py --pairs 5000 --titles 200 --check --budget-ms 1
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.matching import ProductMatcher  # noqa: E402
+
+TITLES = [
+    'Apple iPhone 15 128GB Black',
+    'iPhone 15 128 GB - Black (Unlocked)',
+    'Apple iPhone 15 256GB Black',
+    'Apple iPhone 15 Pro Max Natural Titanium 1TB',
+    'Samsung Galaxy S24 Ultra 512GB Titanium Gray',
+    'Sony WH-1000XM5 Wireless Noise Canceling Headphones, Black',
+    'Sony WH1000XM5 Headphones Black',
+    'Nintendo Switch OLED Model White',
+]
+
+
+def measure_pairs(matcher, pairs):
+    """Tiempo medio (ms) de is_match entre dos huellas ya calculadas"""
+    a = matcher.fingerprint(TITLES[0])
+    b = matcher.fingerprint(TITLES[1])
+    start = time.perf_counter()
+    for _ in range(pairs):
+        matcher.is_match(a, b)
+    return (time.perf_counter() - start) * 1000 / pairs
+
+
+def measure_cluster(matcher, titles, runs):
+    """Mediana (ms) de agrupar `titles` títulos (huellas incluidas)"""
+    corpus = [f'{TITLES[i % len(TITLES)]} #{i // len(TITLES)}' for i in range(titles)]
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        matcher.cluster(corpus)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline del agrupamiento de productos')
+    parser.add_argument('--pairs', type=int, default=1000, help='Comparaciones de huellas a medir')
+    parser.add_argument('--titles', type=int, default=80, help='Títulos por agrupamiento')
+    parser.add_argument('--runs', type=int, default=5, help='Repeticiones del agrupamiento')
+    parser.add_argument('--check', action='store_true', help='Salir con error si se excede el presupuesto')
+    parser.add_argument('--budget-ms', type=float, default=1.0,
+                        help='Tiempo máximo por comparación de huellas')
+    args = parser.parse_args()
+
+    matcher = ProductMatcher()
+    pair_ms = measure_pairs(matcher, args.pairs)
+    cluster_ms = measure_cluster(matcher, args.titles, args.runs)
+    print(f"is_match:  {pair_ms * 1000:.1f} µs por comparación ({args.pairs} pares)")
+    print(f"cluster:   {cluster_ms:.2f} ms para {args.titles} títulos (mediana de {args.runs})")
+
+    if args.check and pair_ms > args.budget_ms:
+        print(f"\n❌ Comparación de huellas: {pair_ms:.3f}ms > {args.budget_ms}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
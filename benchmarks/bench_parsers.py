@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline de los parsers de tiendas (sin red)
+
+Ejecuta cada ProductScraper._parse_* sobre páginas de resultados grabadas
+y compara backends de parsing. Reporta tiempo de parseo, memoria pico y
+productos extraídos por página.
+
+Uso:
+    python benchmarks/bench_parsers.py
+    python benchmarks/bench_parsers.py --runs 20 --inflate 100
+    python benchmarks/bench_parsers.py --corpus /ruta/a/html --check --budget-ms 50
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.scraper import ProductScraper  # noqa: E402
+from app.services.html_parsing import make_soup, get_parser_backend  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures')
+STORES = ['amazon', 'ebay', 'walmart', 'bestbuy']
+
+# (backend, solo contenedores de resultados)
+VARIANTS = [
+    ('html5lib', False),
+    ('html.parser', False),
+    ('html.parser', True),
+    ('lxml', False),
+    ('lxml', True),
+]
+
+# Marcado que no es resultado (navegación, scripts, recomendaciones...) para simular
+# páginas reales de 1-3 MB a partir de fixtures pequeños
+NOISE_BLOCK = (
+    '<div class="nav-flyout"><ul>' +
+    ''.join(f'<li><a href="/b?node={i}"><span>Categoría {i}</span></a></li>' for i in range(20)) +
+    '</ul><script>var d={"k":[1,2,3,4,5,6,7,8,9]};</script></div>'
+)
+
+
+def load_corpus(corpus_dir, inflate=0):
+    """Páginas grabadas: {store: [(nombre, html_bytes)]}"""
+    pages = {}
+    for store in STORES:
+        for path in sorted(glob.glob(os.path.join(corpus_dir, f'{store}*.html'))):
+            with open(path, 'rb') as f:
+                html = f.read()
+            if inflate:
+                noise = (NOISE_BLOCK * inflate).encode('utf-8')
+                html = html.replace(b'<footer>', noise + b'<footer>', 1)
+            pages.setdefault(store, []).append((os.path.basename(path), html))
+    return pages
+
+
+def parse_page(scraper, store, html, parser, parse_only):
+    site = f'{store}.com'
+    # Los parsers imprimen mucho: silenciar para no medir I/O de consola
+    with contextlib.redirect_stdout(io.StringIO()):
+        soup = make_soup(html, site, parser=parser, parse_only=parse_only)
+        return getattr(scraper, f'_parse_{store}')(soup, site)
+
+
+def measure(scraper, store, html, parser, parse_only, runs):
+    """Mediana de tiempo (ms), memoria pico (KB) y productos extraídos"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        products = parse_page(scraper, store, html, parser, parse_only)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    parse_page(scraper, store, html, parser, parse_only)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'ms': statistics.median(timings),
+        'peak_kb': peak / 1024,
+        'products': products,
+    }
+
+
+def run_benchmark(corpus_dir=DEFAULT_CORPUS, runs=5, inflate=0, max_results=50, out=sys.stdout):
+    """
+    Ejecuta el benchmark completo
+
+    Returns:
+        list: Una fila por (página, variante) con tiempo, memoria y paridad
+    """
+    scraper = ProductScraper('benchmark')
+    scraper.max_results = max_results
+    pages = load_corpus(corpus_dir, inflate)
+    rows = []
+
+    header = f"{'página':<24} {'parser':<12} {'solo res.':<9} {'KB':>7} {'ms':>9} {'mem KB':>9} {'prods':>6} {'paridad':>8}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+
+    for store, store_pages in pages.items():
+        for name, html in store_pages:
+            reference = None
+            for parser, parse_only in VARIANTS:
+                backend = get_parser_backend(parser)
+                if backend != parser:
+                    continue  # lxml no instalado
+                result = measure(scraper, store, html, parser, parse_only, runs)
+                if reference is None:
+                    reference = result['products']
+                row = {
+                    'page': name,
+                    'store': store,
+                    'parser': parser,
+                    'parse_only': parse_only,
+                    'size_kb': len(html) / 1024,
+                    'ms': result['ms'],
+                    'peak_kb': result['peak_kb'],
+                    'products': len(result['products']),
+                    'parity': result['products'] == reference,
+                }
+                rows.append(row)
+                print(
+                    f"{name:<24} {parser:<12} {'sí' if parse_only else 'no':<9} "
+                    f"{row['size_kb']:>7.0f} {row['ms']:>9.2f} {row['peak_kb']:>9.0f} "
+                    f"{row['products']:>6} {'✓' if row['parity'] else '✗':>8}",
+                    file=out
+                )
+    return rows
+
+
+def check_rows(rows, budget_ms=None):
+    """Puerta de regresión: paridad con html5lib y presupuesto de tiempo del backend configurado"""
+    default_parser = get_parser_backend()
+    failures = []
+    for row in rows:
+        if not row['parity']:
+            failures.append(f"{row['page']} [{row['parser']}]: productos distintos a html5lib")
+        if row['products'] == 0:
+            failures.append(f"{row['page']} [{row['parser']}]: 0 productos extraídos")
+        if (budget_ms is not None and row['parser'] == default_parser
+                and row['parse_only'] and row['ms'] > budget_ms):
+            failures.append(f"{row['page']} [{row['parser']}]: {row['ms']:.1f}ms > {budget_ms}ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline de parsers de tiendas')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='Directorio con <tienda>*.html')
+    parser.add_argument('--runs', type=int, default=5, help='Repeticiones por medición')
+    parser.add_argument('--inflate', type=int, default=0,
+                        help='Bloques de ruido a insertar por página (simula páginas grandes)')
+    parser.add_argument('--check', action='store_true', help='Salir con error si hay regresiones')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Tiempo máximo por página para el parser configurado')
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print("  BENCHMARK DE PARSERS (offline)")
+    print("=" * 60 + "\n")
+
+    rows = run_benchmark(args.corpus, runs=args.runs, inflate=args.inflate)
+    if not rows:
+        print(f"❌ No se encontraron páginas en {args.corpus}")
+        sys.exit(1)
+
+    if args.check:
+        failures = check_rows(rows, args.budget_ms)
+        if failures:
+            print("\n❌ Regresiones detectadas:")
+            for failure in failures:
+                print(f"   • {failure}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline de la búsqueda concurrente (sin red)
+
+Simula la latencia de cada tienda y compara la búsqueda secuencial con la
+concurrente: la concurrente debería tardar lo que la tienda más lenta.
+
+Uso:
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --runs 5 --check --slack-ms 300
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.scraper import ProductScraper  # noqa: E402
+from config import Config  # noqa: E402
+
+# Latencia simulada por tienda (segundos)
+DELAYS = {'amazon.com': 0.1, 'ebay.com': 0.2, 'walmart.com': 0.3, 'bestbuy.com': 0.3}
+
+
+def make_scraper():
+    scraper = ProductScraper('benchmark')
+
+    def fake_search_site(site, product_name):
+        time.sleep(DELAYS[site])
+        return [{'tienda': site, 'nombre_crudo': f'Producto {site}', 'precio': 100.0,
+                 'url': f'https://www.{site}/item', 'reviews': 4.0}]
+
+    scraper._search_site = fake_search_site
+    return scraper
+
+
+def measure(concurrent, runs):
+    """Mediana (ms) de una búsqueda en todas las tiendas"""
+    scraper = make_scraper()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            scraper.search_products('iPhone 15', concurrent=concurrent)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline de la búsqueda concurrente')
+    parser.add_argument('--runs', type=int, default=3, help='Repeticiones por modo')
+    parser.add_argument('--check', action='store_true',
+                        help='Salir con error si la concurrente supera a la tienda más lenta + slack')
+    parser.add_argument('--slack-ms', type=float, default=300, help='Margen sobre la tienda más lenta')
+    args = parser.parse_args()
+
+    Config.TARGET_SITES = list(DELAYS)
+    Config.SCRAPER_ENGINE = 'threads'
+    slowest_ms = max(DELAYS.values()) * 1000
+    sequential = measure(False, args.runs)
+    concurrent = measure(True, args.runs)
+    print(f"secuencial:  {sequential:8.1f} ms (suma de tiendas {sum(DELAYS.values()) * 1000:.0f} ms)")
+    print(f"concurrente: {concurrent:8.1f} ms (tienda más lenta {slowest_ms:.0f} ms)")
+
+    if args.check and concurrent > slowest_ms + args.slack_ms:
+        print(f"\n❌ Búsqueda concurrente: {concurrent:.0f}ms > {slowest_ms + args.slack_ms:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
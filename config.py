@@ -40,6 +40,121 @@ class Config:
     # Límites optimizados
     MAX_RESULTS_PER_SITE = 5
     REQUEST_TIMEOUT = 25
+    
+    # Búsqueda concurrente (todas las tiendas a la vez)
+    CONCURRENT_SEARCH = os.environ.get('CONCURRENT_SEARCH', 'True').lower() == 'true'
+    SEARCH_MAX_WORKERS = int(os.environ.get('SEARCH_MAX_WORKERS', 4))
+    SEARCH_DEADLINE = int(os.environ.get('SEARCH_DEADLINE', 60))  # Segundos por búsqueda completa
+    SITE_MIN_INTERVAL = 1.0  # Segundos mínimos entre requests a la MISMA tienda
+    
+    # Motor de búsqueda concurrente: 'threads' (ThreadPool por búsqueda) o
+    # 'async' (un event loop compartido por todas las búsquedas del proceso)
+    SCRAPER_ENGINE = os.environ.get('SCRAPER_ENGINE', 'threads')
+    SCRAPER_API_CONCURRENCY = int(os.environ.get('SCRAPER_API_CONCURRENCY', 5))  # Límite del plan (gratis: 5)
+    SCRAPER_API_RATE = float(os.environ.get('SCRAPER_API_RATE', 5.0))  # Requests por segundo
+    
+    # Búsquedas en segundo plano (POST /api/search/jobs + GET /api/search/<id>)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+    JOB_TTL = int(os.environ.get('JOB_TTL', 600))  # Segundos que se conserva un job terminado
+    
+    # Pool HTTP compartido para ScraperAPI (keep-alive por worker)
+    SCRAPER_API_URL = os.environ.get('SCRAPER_API_URL', 'http://api.scraperapi.com')
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 4))  # Hosts distintos en caché
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))  # Conexiones por host
+    HTTP_POOL_BLOCK = False  # Si se llena el pool, abrir conexión extra en vez de esperar
+    HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2))
+    HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.5))
+    
+    # Estrategia adaptativa de ScraperAPI por tienda (render/premium aprendido del historial).
+    # Créditos por request de cada estrategia (ver SCRAPERAPI_OPTIMIZATION.md): única
+    # fuente de costos; el de una tienda sale de su estrategia en stores.py
+    STRATEGY_CREDIT_COST = {
+        'basic': 1,
+        'render': 5,
+        'premium': 10,
+        'render+premium': 25,
+    }
+    STRATEGY_SECONDS_PER_CREDIT = float(os.environ.get('STRATEGY_SECONDS_PER_CREDIT', 1.0))  # Peso de créditos vs latencia
+    STRATEGY_MIN_SAMPLES = int(os.environ.get('STRATEGY_MIN_SAMPLES', 5))  # Antes: orden por defecto de la tienda
+    STRATEGY_EXPLORE = float(os.environ.get('STRATEGY_EXPLORE', 0.1))  # Probabilidad de probar primero una alternativa
+    STRATEGY_LATENCY_ALPHA = float(os.environ.get('STRATEGY_LATENCY_ALPHA', 0.3))  # Promedio móvil de latencia
+    STRATEGY_RACE = os.environ.get('STRATEGY_RACE', 'False').lower() == 'true'  # Carrera de 2 estrategias en tiendas difíciles
+    STRATEGY_RACE_BELOW = float(os.environ.get('STRATEGY_RACE_BELOW', 0.6))  # Tasa de éxito que activa la carrera
+    
+    # Circuit breaker por tienda: omitir tiendas caídas/bloqueadas en vez de esperar sus timeouts
+    BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', 'True').lower() == 'true'
+    BREAKER_STATE_PATH = os.environ.get('BREAKER_STATE_PATH', os.path.join('instance', 'circuit_breaker.sqlite3'))
+    BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 3))  # Fallos seguidos que abren el circuito
+    BREAKER_COOLDOWN = float(os.environ.get('BREAKER_COOLDOWN', 120))  # Segundos abierto (se duplica en cada disparo)
+    BREAKER_MAX_COOLDOWN = float(os.environ.get('BREAKER_MAX_COOLDOWN', 1800))
+    BREAKER_PROBE_LEASE = float(os.environ.get('BREAKER_PROBE_LEASE', 60))  # Segundos reservados para la prueba half-open
+    BLOCKED_RESPONSE_BYTES = int(os.environ.get('BLOCKED_RESPONSE_BYTES', 1000))  # Respuesta menor = bloqueada
+    
+    # Caché de búsquedas: 'memory' (Vercel), 'sqlite' (Docker/gunicorn) o 'redis'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', os.path.join('instance', 'cache.sqlite3'))
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 500))
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 900))  # 15 minutos
+    CACHE_TTL_BY_SITE = {
+        'amazon.com': 900,
+        'ebay.com': 600,      # Subastas: precios cambian más rápido
+        'walmart.com': 1800,  # Caro de scrapear (25 créditos, render+premium)
+        'bestbuy.com': 1800,
+    }
+    # Stale-while-revalidate: pasado el TTL de la tienda, servir la entrada vencida
+    # hasta CACHE_MAX_STALE segundos más mientras se refresca en segundo plano (0 = desactivado)
+    CACHE_MAX_STALE = int(os.environ.get('CACHE_MAX_STALE', 3600))
+    CACHE_REFRESH_WORKERS = int(os.environ.get('CACHE_REFRESH_WORKERS', 2))  # Refrescos simultáneos
+    
+    # Registro de búsquedas (una línea JSON por búsqueda) para elegir qué pre-calentar
+    QUERY_LOG_ENABLED = os.environ.get('QUERY_LOG_ENABLED', 'True').lower() == 'true'
+    QUERY_LOG_PATH = os.environ.get('QUERY_LOG_PATH', os.path.join('instance', 'queries.log'))
+    
+    # Pre-calentamiento de cachés fuera de horario pico (CLI: python prewarm.py)
+    PREWARM_ENABLED = os.environ.get('PREWARM_ENABLED', 'False').lower() == 'true'  # Scheduler en el proceso
+    PREWARM_HOUR = int(os.environ.get('PREWARM_HOUR', 4))  # Hora local del pre-calentamiento diario
+    PREWARM_SCRAPER_API_KEY = os.environ.get('PREWARM_SCRAPER_API_KEY', '')
+    PREWARM_GEMINI_API_KEY = os.environ.get('PREWARM_GEMINI_API_KEY', '')  # Vacío = solo caché de búsquedas
+    PREWARM_CREDIT_BUDGET = int(os.environ.get('PREWARM_CREDIT_BUDGET', 200))  # Créditos de ScraperAPI por corrida
+    PREWARM_INCLUDE_PREMIUM = os.environ.get('PREWARM_INCLUDE_PREMIUM', 'False').lower() == 'true'
+    PREWARM_TOP_N = int(os.environ.get('PREWARM_TOP_N', 200))
+    PREWARM_LOG_DAYS = int(os.environ.get('PREWARM_LOG_DAYS', 7))
+    PREWARM_WORKERS = int(os.environ.get('PREWARM_WORKERS', 2))
+    PREWARM_LOCK_PATH = os.environ.get('PREWARM_LOCK_PATH', os.path.join('instance', 'prewarm.lock'))
+    
+    # Historial de precios (SQLite append-only): cada scrape real queda registrado
+    PRICE_HISTORY_ENABLED = os.environ.get('PRICE_HISTORY_ENABLED', 'True').lower() == 'true'
+    PRICE_HISTORY_PATH = os.environ.get('PRICE_HISTORY_PATH', os.path.join('instance', 'price_history.sqlite3'))
+    PRICE_HISTORY_WINDOW_DAYS = int(os.environ.get('PRICE_HISTORY_WINDOW_DAYS', 7))  # Ventana para mín/promedio
+    PRICE_HISTORY_RETENTION_DAYS = int(os.environ.get('PRICE_HISTORY_RETENTION_DAYS', 90))
+    PRICE_HISTORY_MIN_AGE = int(os.environ.get('PRICE_HISTORY_MIN_AGE', 300))  # Excluir el scrape actual del contexto
+    PRICE_DROP_THRESHOLD = float(os.environ.get('PRICE_DROP_THRESHOLD', 0.05))  # 5% bajo el promedio = "bajó"
+    
+    # Caché de análisis de Gemini (mismo backend que la caché de búsquedas)
+    ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 1800))
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 200))
+    GEMINI_MODEL_CACHE_TTL = int(os.environ.get('GEMINI_MODEL_CACHE_TTL', 3600))  # Modelo resuelto por API key
+    GEMINI_MODEL_NEGATIVE_TTL = int(os.environ.get('GEMINI_MODEL_NEGATIVE_TTL', 300))  # API key sin modelos disponibles
+    GEMINI_STRUCTURED_OUTPUT = os.environ.get('GEMINI_STRUCTURED_OUTPUT', 'True').lower() == 'true'  # JSON con esquema
+    GEMINI_PROMPT_TOKEN_BUDGET = int(os.environ.get('GEMINI_PROMPT_TOKEN_BUDGET', 4000))  # Tokens para la tabla de productos
+    PROMPT_MAX_NAME_CHARS = int(os.environ.get('PROMPT_MAX_NAME_CHARS', 120))
+    
+    # Análisis por lotes en paralelo (conjuntos grandes de productos)
+    GEMINI_BATCH_SIZE = int(os.environ.get('GEMINI_BATCH_SIZE', 20))  # Productos por prompt
+    GEMINI_MAX_BATCHES = int(os.environ.get('GEMINI_MAX_BATCHES', 8))
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 4))  # Llamadas simultáneas por proceso
+    GEMINI_MIN_INTERVAL = float(os.environ.get('GEMINI_MIN_INTERVAL', 0.2))  # Segundos entre inicios de llamadas
+    
+    # Emparejamiento local de productos equivalentes entre tiendas (antes de Gemini)
+    MATCHING_ENABLED = os.environ.get('MATCHING_ENABLED', 'True').lower() == 'true'
+    MATCH_THRESHOLD = float(os.environ.get('MATCH_THRESHOLD', 0.7))  # Jaccard estimada mínima
+    MINHASH_PERMUTATIONS = int(os.environ.get('MINHASH_PERMUTATIONS', 64))
+    MINHASH_BANDS = int(os.environ.get('MINHASH_BANDS', 16))  # Bandas LSH (blocking)
+    
+    # Parser HTML: 'lxml' (rápido, recomendado), 'html.parser' o 'html5lib' (lento, referencia)
+    HTML_PARSER = os.environ.get('HTML_PARSER', 'lxml')
+    PARSE_ONLY_RESULTS = True  # Construir solo los contenedores de resultados, no el DOM completo
 
 class ProductionConfig(Config):
     """Configuración para producción"""
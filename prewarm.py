@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Pre-calentamiento de cachés para las búsquedas más populares
+
+Vuelve a scrapear (y opcionalmente analizar) las búsquedas top fuera de
+horario pico, dentro de un presupuesto de créditos de ScraperAPI. Pensado
+para cron con CACHE_BACKEND=sqlite/redis (la caché en memoria no se comparte
+con el servidor).
+
+Uso:
+    python prewarm.py --top 200 --budget 300
+    python prewarm.py --queries top_queries.txt --premium --analyze
+    python prewarm.py --top 50 --dry-run
+
+Variables de entorno:
+    PREWARM_SCRAPER_API_KEY   API key de ScraperAPI (o --scraper-key)
+    PREWARM_GEMINI_API_KEY    API key de Gemini para --analyze (o --gemini-key)
+"""
+import argparse
+import sys
+
+from config import Config
+from app.services.prewarm import Prewarmer, load_queries, top_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-calentamiento de cachés de búsqueda y análisis')
+    parser.add_argument('--queries', help='Archivo con una búsqueda por línea (por defecto: registro de búsquedas)')
+    parser.add_argument('--top', type=int, default=Config.PREWARM_TOP_N, help='Búsquedas top del registro')
+    parser.add_argument('--days', type=int, default=Config.PREWARM_LOG_DAYS, help='Días del registro a considerar')
+    parser.add_argument('--budget', type=int, default=Config.PREWARM_CREDIT_BUDGET, help='Créditos máximos de ScraperAPI')
+    parser.add_argument('--premium', action='store_true', default=Config.PREWARM_INCLUDE_PREMIUM,
+                        help='Incluir PREMIUM_SITES (más créditos por request)')
+    parser.add_argument('--analyze', action='store_true', help='Regenerar también la caché de análisis de Gemini')
+    parser.add_argument('--scraper-key', default=Config.PREWARM_SCRAPER_API_KEY)
+    parser.add_argument('--gemini-key', default=Config.PREWARM_GEMINI_API_KEY)
+    parser.add_argument('--dry-run', action='store_true', help='Mostrar el plan sin scrapear')
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print("  PRE-CALENTAMIENTO DE CACHÉS")
+    print("=" * 60 + "\n")
+
+    if not args.scraper_key:
+        print("❌ Se requiere PREWARM_SCRAPER_API_KEY o --scraper-key")
+        sys.exit(1)
+    if args.analyze and not args.gemini_key:
+        print("❌ --analyze requiere PREWARM_GEMINI_API_KEY o --gemini-key")
+        sys.exit(1)
+    if Config.CACHE_BACKEND == 'memory':
+        print("⚠ CACHE_BACKEND=memory: la caché calentada no se comparte con el servidor")
+
+    queries = load_queries(args.queries) if args.queries else top_queries(args.top, args.days)
+    if not queries:
+        print("⏭️ No hay búsquedas para pre-calentar")
+        return
+
+    prewarmer = Prewarmer(
+        args.scraper_key,
+        gemini_key=args.gemini_key if args.analyze else None,
+        budget=args.budget,
+        include_premium=args.premium,
+    )
+    if args.dry_run:
+        tasks, credits, skipped_fresh, skipped_budget = prewarmer.plan(queries)
+        for query, site in tasks:
+            print(f"  • {site:12} {query}")
+        print(f"\n{len(tasks)} scrapes, ~{credits}/{args.budget} créditos "
+              f"({skipped_fresh} frescas, {skipped_budget} fuera de presupuesto)")
+        return
+
+    report = prewarmer.run(queries)
+    # Error solo si fallaron todos los scrapes (p. ej. API key inválida)
+    sys.exit(1 if report['scrapes'] and report['errores'] == report['scrapes'] else 0)
+
+
+if __name__ == "__main__":
+    main()
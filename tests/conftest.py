@@ -0,0 +1,13 @@
+import pytest
+from config import Config
+from app.services.circuit_breaker import reset_breaker
+
+@pytest.fixture(autouse=True)
+def isolated_instance_files(tmp_path, monkeypatch):
+    """Every test records prices, queries and breaker state into its own files (never instance/)"""
+    monkeypatch.setattr(Config, 'PRICE_HISTORY_PATH', str(tmp_path / 'price_history.sqlite3'))
+    monkeypatch.setattr(Config, 'QUERY_LOG_PATH', str(tmp_path / 'queries.log'))
+    monkeypatch.setattr(Config, 'BREAKER_STATE_PATH', str(tmp_path / 'circuit_breaker.sqlite3'))
+    reset_breaker()
+    yield
+    reset_breaker()
@@ -0,0 +1,299 @@
+import json
+import re
+import threading
+import time
+import pytest
+from app.services.cache import AnalysisCache, MemoryCacheBackend
+from app.services.gemini_analyzer import GeminiAnalyzer
+from app.services.products import ProductBatch
+from config import Config
+
+PRODUCTS = [
+    {'tienda': 'amazon.com', 'nombre_crudo': 'iPhone 15 128GB', 'precio': 799.0,
+     'url': 'https://www.amazon.com/dp/A', 'reviews': 4.5},
+    {'tienda': 'ebay.com', 'nombre_crudo': 'Apple iPhone 15', 'precio': 699.0,
+     'url': 'https://www.ebay.com/itm/B', 'reviews': 4.0},
+]
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel (no network)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        self.calls += 1
+        products = [dict(p, recomendacion='✅ Buena Alternativa') for p in PRODUCTS]
+        return FakeResponse(json.dumps({'summary': 'ok', 'insights': [], 'products': products}))
+
+@pytest.fixture
+def analyzer():
+    """Analyzer wired to a fake Gemini model and a private cache"""
+    analyzer = GeminiAnalyzer.__new__(GeminiAnalyzer)
+    analyzer.api_key = 'test-key'
+    analyzer.model = FakeModel()
+    analyzer.model_name = 'fake-model'
+    analyzer.use_fallback = False
+    analyzer.cache = AnalysisCache(MemoryCacheBackend(10), ttl=60)
+    return analyzer
+
+def test_repeat_analysis_is_served_from_cache(analyzer):
+    """Identical query + products only call Gemini once"""
+    first = analyzer.analyze_products(PRODUCTS, 'iPhone 15')
+    second = analyzer.analyze_products(PRODUCTS, 'iphone 15')
+    assert analyzer.model.calls == 1
+    assert second == first
+
+def test_cache_key_ignores_store_arrival_order(analyzer):
+    """Stores answer in any order; the same products reuse the same analysis"""
+    analyzer.analyze_products(PRODUCTS, 'iPhone 15')
+    analyzer.analyze_products(PRODUCTS[::-1], 'iPhone 15')
+    assert analyzer.model.calls == 1
+
+def test_different_products_miss_cache(analyzer):
+    """A changed product list triggers a new analysis"""
+    analyzer.analyze_products(PRODUCTS, 'iPhone 15')
+    analyzer.analyze_products(PRODUCTS[:1], 'iPhone 15')
+    assert analyzer.model.calls == 2
+    assert analyzer.cache.stats()['misses'] == 2
+
+class NotFound(Exception):
+    pass
+
+class FakeGenAI:
+    """Minimal google.generativeai replacement that counts API calls"""
+
+    def __init__(self, available):
+        self.available = available
+        self.list_calls = 0
+        self.missing = set()
+
+    def configure(self, api_key):
+        pass
+
+    def list_models(self):
+        self.list_calls += 1
+        return [type('M', (), {'name': f'models/{name}',
+                               'supported_generation_methods': ['generateContent']})
+                for name in self.available]
+
+    def GenerativeModel(self, name):
+        genai = self
+        model = FakeModel()
+        original = model.generate_content
+
+        def generate_content(prompt, **kwargs):
+            if name in genai.missing:
+                raise NotFound(f'404 models/{name} is not found')
+            return original(prompt, **kwargs)
+
+        model.generate_content = generate_content
+        return model
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    from app.services import gemini_analyzer
+    genai = FakeGenAI(['gemini-1.5-flash', 'gemini-pro'])
+    monkeypatch.setattr(gemini_analyzer, 'genai', genai, raising=False)
+    monkeypatch.setattr(gemini_analyzer, 'GEMINI_AVAILABLE', True)
+    monkeypatch.setattr(gemini_analyzer, '_model_cache', {})
+    return genai
+
+def test_model_resolved_once_per_api_key(fake_genai):
+    """Constructing analyzers does not probe models on every request"""
+    first = GeminiAnalyzer('key-1')
+    second = GeminiAnalyzer('key-1')
+    assert fake_genai.list_calls == 1
+    assert first.model_name == second.model_name == 'gemini-1.5-flash'
+
+def test_key_without_models_is_cached_briefly(fake_genai):
+    """No available models is remembered too, instead of calling list_models per request"""
+    fake_genai.available = []
+    assert GeminiAnalyzer('key-3').use_fallback
+    assert GeminiAnalyzer('key-3').use_fallback
+    assert fake_genai.list_calls == 1
+
+def test_model_not_found_invalidates_cache(fake_genai):
+    """A vanished model is dropped and the next candidate is used"""
+    analyzer = GeminiAnalyzer('key-2')
+    analyzer.cache = AnalysisCache(MemoryCacheBackend(10), ttl=60)
+    fake_genai.missing.add('gemini-1.5-flash')
+
+    result = analyzer.analyze_products(PRODUCTS, 'iPhone 15')
+    assert result['products']
+    assert analyzer.model_name == 'gemini-pro'
+    assert GeminiAnalyzer('key-2').model_name == 'gemini-pro'
+    assert fake_genai.list_calls == 1
+
+def test_prompt_uses_compact_rows_without_urls(analyzer):
+    """Products are sent as id rows; URLs stay on the server"""
+    prompt, included = analyzer._build_analysis_prompt(PRODUCTS, 'iPhone 15')
+    assert included == [0, 1]
+    assert '0|amazon|799|4.5|iPhone 15 128GB' in prompt
+    assert 'https://' not in prompt
+
+def test_token_budget_trims_but_keeps_every_store(analyzer, monkeypatch):
+    """Over budget, the cheapest rows per store are kept and the rest analyzed locally"""
+    from app.services.prompt_encoding import fit_to_budget
+    products = [dict(PRODUCTS[i % 2], precio=100.0 + i, nombre_crudo=f'iPhone 15 variante {i}')
+                for i in range(40)]
+    table, included, tokens = fit_to_budget(products, budget=60)
+    assert 0 < len(included) < len(products)
+    assert tokens <= 60
+    assert {products[i]['tienda'] for i in included} == {'amazon.com', 'ebay.com'}
+
+    analyzed = [{'id': i, 'recomendacion': '✅ Buena Alternativa'} for i in included]
+    merged = analyzer._merge_source_fields(analyzed, ProductBatch.from_products(products), included)
+    assert len(merged) == len(products)
+    assert all(p['url'].startswith('https://') for p in merged)
+
+def test_delta_response_is_joined_with_scraped_records(analyzer):
+    """Gemini returns ids + AI fields only; the rest comes from the scrape"""
+    delta = {'summary': 'ok', 'insights': ['x'], 'products': [
+        {'id': 1, 'n': 'Apple iPhone 15', 'cat': 'I', 'cond': 'N', 'sp': ['128GB'],
+         'rec': 'B', 'why': 'Más barato', 'v': 92},
+    ]}
+    analyzer.model.generate_content = lambda prompt, **kwargs: FakeResponse(json.dumps(delta))
+
+    result = analyzer.analyze_products(PRODUCTS, 'iPhone 15')
+    ebay, amazon = result['products']
+    assert ebay['url'] == PRODUCTS[1]['url']
+    assert ebay['precio'] == 699.0
+    assert ebay['recomendacion'] == '🏆 Mejor Opción'
+    assert ebay['categoria'] == 'Idéntico'
+    assert ebay['precio_vs_promedio'] == '-6.7%'
+    # Omitted by the model: filled in by the local basic analysis
+    assert amazon['url'] == PRODUCTS[0]['url']
+    assert amazon['recomendacion']
+
+def test_equivalent_listings_send_one_representative_to_gemini(analyzer):
+    """Matched listings share one prompt row; the others inherit its AI fields"""
+    products = [
+        dict(PRODUCTS[0], nombre_crudo='Apple iPhone 15 128GB Black'),
+        dict(PRODUCTS[1], nombre_crudo='iPhone 15 128 GB - Black (Unlocked)'),
+        {'tienda': 'walmart.com', 'nombre_crudo': 'Samsung Galaxy S24 256GB', 'precio': 650.0,
+         'url': 'https://www.walmart.com/ip/C', 'reviews': 4.2},
+    ]
+    prompts = []
+
+    def generate_content(prompt, **kwargs):
+        prompts.append(prompt)
+        return FakeResponse(json.dumps({'summary': 'ok', 'insights': [], 'products': [
+            {'id': 1, 'n': 'Apple iPhone 15 128GB', 'cat': 'I', 'cond': 'N', 'rec': 'A', 'v': 80},
+            {'id': 2, 'n': 'Samsung Galaxy S24', 'cat': 'D', 'cond': 'N', 'rec': 'B', 'v': 70},
+        ]}))
+    analyzer.model.generate_content = generate_content
+
+    result = analyzer.analyze_products(products, 'iPhone 15')
+    assert re.findall(r'^(\d+)\|', prompts[0], re.M) == ['1', '2']
+    amazon = next(p for p in result['products'] if p['tienda'] == 'amazon.com')
+    assert amazon['nombre_normalizado'] == 'Apple iPhone 15 128GB'
+    assert amazon['categoria'] == 'Idéntico'
+    assert amazon['url'] == products[0]['url']
+    assert amazon['recomendacion'] == '⚠️ Considerar'  # Still judged by its own price
+    assert len(result['products']) == 3
+
+class BatchModel:
+    """Answers batch prompts with deltas for every row id and summary prompts with text"""
+
+    def __init__(self, delay=0.1, barrier=None):
+        self.delay = delay
+        self.barrier = barrier
+        self.prompts = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self.lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        if self.barrier is not None:
+            self.barrier.wait()  # Only passes if the calls are in flight together
+        else:
+            time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        if prompt.startswith('Resume'):
+            return FakeResponse(json.dumps({'summary': 'resumen global', 'insights': ['a', 'b', 'c']}))
+        ids = [int(m) for m in re.findall(r'^(\d+)\|', prompt, re.M)]
+        return FakeResponse(json.dumps({'products': [{'id': i, 'rec': 'A', 'v': 70} for i in ids]}))
+
+def test_large_product_sets_are_analyzed_in_parallel_batches(analyzer, monkeypatch):
+    """Batches run concurrently and are reduced into one result"""
+    monkeypatch.setattr(Config, 'GEMINI_BATCH_SIZE', 20)
+    monkeypatch.setattr(Config, 'GEMINI_MIN_INTERVAL', 0)
+    monkeypatch.setattr(Config, 'MATCHING_ENABLED', False)  # Same titles would collapse into 2 groups
+    monkeypatch.setattr('app.services.gemini_analyzer._gemini_next_slot', 0.0)
+    products = [dict(PRODUCTS[i % 2], precio=500.0 + i, url=f'https://example.com/{i}')
+                for i in range(60)]
+    analyzer.model = BatchModel(barrier=threading.Barrier(4, timeout=5))
+
+    result = analyzer.analyze_products(products, 'iPhone 15')
+
+    assert len(analyzer.model.prompts) == 4  # 3 batches + summary
+    assert analyzer.model.peak == 4  # All in flight together (timing: benchmarks/bench_batches.py)
+    assert result['summary'] == 'resumen global'
+    assert sorted(p['url'] for p in result['products']) == sorted(p['url'] for p in products)
+    assert result['statistics']['total_productos'] == 60
+
+class StreamingModel:
+    """Streams the response in chunks, optionally cut short like max_output_tokens"""
+
+    def __init__(self, text, cut=None, json_mode=True):
+        self.text = text[:cut] if cut else text
+        self.json_mode = json_mode
+        self.configs = []
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        self.configs.append(generation_config)
+        if 'response_schema' in (generation_config or {}) and not self.json_mode:
+            raise ValueError('400 response_mime_type is not supported by this model')
+        return [FakeResponse(self.text[i:i + 16]) for i in range(0, len(self.text), 16)]
+
+def test_truncated_stream_recovers_complete_products(analyzer):
+    """Products decoded before the cut are kept; the rest are filled locally"""
+    text = json.dumps({'summary': 'ok', 'insights': [], 'products': [
+        {'id': 0, 'n': 'iPhone 15', 'rec': 'A', 'v': 80},
+        {'id': 1, 'n': 'Apple iPhone 15', 'rec': 'B', 'v': 90},
+    ]})
+    analyzer.model = StreamingModel(text, cut=text.index('{"id": 1') + 10)
+
+    result = analyzer.analyze_products(PRODUCTS, 'iPhone 15')
+    assert analyzer.model.configs[0]['response_mime_type'] == 'application/json'
+    amazon, ebay = result['products']
+    assert amazon['recomendacion'] == '✅ Buena Alternativa'
+    assert ebay['url'] == PRODUCTS[1]['url']
+
+def test_models_without_json_mode_fall_back_to_free_text(analyzer, monkeypatch):
+    """A model rejecting response_schema is retried without it once"""
+    monkeypatch.setattr('app.services.gemini_analyzer._json_mode_unsupported', set())
+    text = json.dumps({'summary': 'ok', 'insights': [], 'products': [{'id': 0, 'rec': 'B'}]})
+    analyzer.model = StreamingModel(text, json_mode=False)
+
+    result = analyzer.analyze_products(PRODUCTS, 'iPhone 15')
+    assert result['products'][0]['recomendacion'] == '🏆 Mejor Opción'
+    assert 'response_schema' not in analyzer.model.configs[-1]
+
+def test_stream_analysis_yields_products_before_the_final_result(analyzer):
+    """Summary and each product are yielded as soon as they are decoded"""
+    text = json.dumps({'summary': 'ok', 'insights': ['x'], 'products': [
+        {'id': 1, 'rec': 'B', 'v': 90},
+        {'id': 0, 'rec': 'A', 'v': 80},
+    ]})
+    analyzer.model = StreamingModel(text)
+
+    events = list(analyzer.stream_analysis(PRODUCTS, 'iPhone 15'))
+    kinds = [kind for kind, _ in events]
+    assert kinds == ['summary', 'summary', 'product', 'product', 'analysis']
+    assert events[2][1]['url'] == PRODUCTS[1]['url']
+    assert events[2][1]['recomendacion'] == '🏆 Mejor Opción'
+    assert len(events[-1][1]['products']) == 2
+
+    # Second run comes from the cache: only the final analysis
+    assert [kind for kind, _ in analyzer.stream_analysis(PRODUCTS, 'iPhone 15')] == ['analysis']
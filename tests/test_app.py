@@ -43,4 +43,56 @@ def test_search_endpoint_empty_data(client):
     })
     assert response.status_code == 400
     data = response.get_json()
-    assert data['success'] == False
\ No newline at end of file
+    assert data['success'] == False
+
+
+def test_search_stream_missing_data(client):
+    """Streaming search validates input like /api/search"""
+    response = client.post('/api/search/stream', json={})
+    assert response.status_code == 400
+    assert response.get_json()['success'] == False
+
+def test_search_stream_emits_progressive_events(client, monkeypatch):
+    """Each store is streamed before statistics and the final analysis"""
+    from app.services.scraper import ProductScraper
+
+    def fake_iter_site_results(self, product_name, sites=None, deadline=None):
+        yield 'amazon.com', [{'tienda': 'amazon.com', 'nombre_crudo': 'iPhone 15',
+                              'precio': 799.0, 'url': 'https://www.amazon.com/dp/A', 'reviews': 4.5}]
+        yield 'ebay.com', [{'tienda': 'ebay.com', 'nombre_crudo': 'iPhone 15',
+                            'precio': 699.0, 'url': 'https://www.ebay.com/itm/B', 'reviews': 4.0}]
+
+    monkeypatch.setattr(ProductScraper, 'iter_site_results', fake_iter_site_results)
+    monkeypatch.setattr('app.services.gemini_analyzer.GEMINI_AVAILABLE', False)
+    response = client.post('/api/search/stream', json={
+        'gemini_api_key': 'g', 'scraper_api_key': 's', 'product_name': 'iPhone 15'
+    })
+    assert response.mimetype == 'text/event-stream'
+    events = [line.split(': ', 1)[1] for line in response.get_data(as_text=True).splitlines()
+              if line.startswith('event: ')]
+    assert events == ['store', 'store', 'statistics', 'analysis', 'done']
+
+def test_search_stream_forwards_ai_events(client, monkeypatch):
+    """AI recommendations are streamed before the final analysis event"""
+    from app.services.gemini_analyzer import GeminiAnalyzer
+    from app.services.scraper import ProductScraper
+    product = {'tienda': 'ebay.com', 'nombre_crudo': 'iPhone 15', 'precio': 699.0,
+               'url': 'https://www.ebay.com/itm/B', 'reviews': 4.0}
+
+    def fake_iter_site_results(self, product_name, sites=None, deadline=None):
+        yield 'ebay.com', [product]
+
+    def fake_stream_analysis(self, raw_products, product_name):
+        yield 'summary', {'summary': 'ok'}
+        yield 'product', dict(product, recomendacion='🏆 Mejor Opción')
+        yield 'analysis', {'summary': 'ok', 'insights': [], 'products': [product], 'statistics': {}}
+
+    monkeypatch.setattr(ProductScraper, 'iter_site_results', fake_iter_site_results)
+    monkeypatch.setattr(GeminiAnalyzer, 'stream_analysis', fake_stream_analysis)
+    monkeypatch.setattr('app.services.gemini_analyzer.GEMINI_AVAILABLE', False)
+    response = client.post('/api/search/stream', json={
+        'gemini_api_key': 'g', 'scraper_api_key': 's', 'product_name': 'iPhone 15'
+    })
+    events = [line.split(': ', 1)[1] for line in response.get_data(as_text=True).splitlines()
+              if line.startswith('event: ')]
+    assert events == ['store', 'statistics', 'ai_summary', 'ai_product', 'analysis', 'done']
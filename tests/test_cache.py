@@ -0,0 +1,108 @@
+import threading
+import time
+import pytest
+from app.services.cache import (
+    MemoryCacheBackend, SQLiteCacheBackend, SearchCache, normalize_query
+)
+from app.services.products import to_dicts
+from app.services.scraper import ProductScraper
+
+PRODUCTS = [{'tienda': 'amazon.com', 'nombre_crudo': 'iPhone 15', 'precio': 799.0,
+             'url': 'https://www.amazon.com/dp/X', 'reviews': 4.5}]
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    """Each cache backend that runs without external services"""
+    if request.param == 'sqlite':
+        return SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    return MemoryCacheBackend(max_entries=2)
+
+def test_backend_roundtrip_and_ttl(backend):
+    """Entries are returned until their TTL expires"""
+    backend.set('a', {'products': PRODUCTS}, ttl=60)
+    assert backend.get('a') == {'products': PRODUCTS}
+    backend.set('b', {'products': []}, ttl=-1)
+    assert backend.get('b') is None
+
+def test_backend_lru_eviction(backend):
+    """The least recently used entry is evicted when full"""
+    backend.set('a', 1, ttl=60)
+    time.sleep(0.01)
+    backend.set('b', 2, ttl=60)
+    time.sleep(0.01)
+    backend.get('a')
+    time.sleep(0.01)
+    backend.set('c', 3, ttl=60)
+    assert backend.get('b') is None
+    assert backend.get('a') == 1
+    assert backend.get('c') == 3
+
+def test_query_normalization():
+    """Case and whitespace do not create new cache entries"""
+    assert normalize_query('  iPhone   15 ') == normalize_query('iphone 15')
+
+def test_search_cache_counters():
+    """Hits, misses and saved credits are tracked per store"""
+    cache = SearchCache(MemoryCacheBackend(10), ttl_by_site={}, default_ttl=60)
+    assert cache.get('walmart.com', 'iPhone 15') is None
+    cache.set('walmart.com', 'iPhone 15', PRODUCTS)
+    assert to_dicts(cache.get('walmart.com', 'iphone  15')) == PRODUCTS
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['creditos_ahorrados'] == 25  # render+premium
+
+def test_scraper_uses_cache(monkeypatch):
+    """Second search for the same store/query skips ScraperAPI"""
+    calls = []
+    scraper = ProductScraper('test-key')
+    scraper.cache = SearchCache(MemoryCacheBackend(10), ttl_by_site={}, default_ttl=60)
+    monkeypatch.setattr(scraper, '_fetch_site', lambda site, name: calls.append(site) or PRODUCTS)
+
+    scraper._search_site('amazon.com', 'iPhone 15')
+    scraper._search_site('amazon.com', 'iphone 15')
+    assert calls == ['amazon.com']
+
+def test_stale_entries_are_served_until_the_hard_ttl():
+    """Past the soft TTL the entry is stale; past soft + max_stale it is gone"""
+    cache = SearchCache(MemoryCacheBackend(10), ttl_by_site={}, default_ttl=0.05, max_stale=0.15)
+    cache.set('amazon.com', 'iPhone 15', PRODUCTS)
+    assert cache.lookup('amazon.com', 'iPhone 15')[2] is False
+    time.sleep(0.08)
+    products, age, stale = cache.lookup('amazon.com', 'iPhone 15')
+    assert stale and age >= 0.05
+    assert to_dicts(products) == PRODUCTS
+    assert cache.get('amazon.com', 'iPhone 15') is None  # get() only returns fresh entries
+    time.sleep(0.15)
+    assert cache.lookup('amazon.com', 'iPhone 15') is None
+    assert cache.stats()['stale'] == 1
+
+def test_scraper_serves_stale_results_and_refreshes_once(monkeypatch):
+    """Stale hits return immediately; one background refresh per key updates the cache"""
+    calls = []
+    release = threading.Event()
+    scraper = ProductScraper('test-key')
+    scraper.cache = SearchCache(MemoryCacheBackend(10), ttl_by_site={}, default_ttl=0.05, max_stale=60)
+    scraper.cache.set('amazon.com', 'iPhone 15', PRODUCTS)
+    time.sleep(0.08)
+
+    def slow_fetch(site, name):
+        calls.append(site)
+        release.wait(2)
+        return [dict(PRODUCTS[0], precio=749.0)]
+    monkeypatch.setattr(scraper, '_fetch_site', slow_fetch)
+
+    start = time.monotonic()
+    first = scraper._search_site('amazon.com', 'iPhone 15')
+    second = scraper._search_site('amazon.com', 'iphone 15')
+    assert time.monotonic() - start < 0.05
+    assert to_dicts(first) == to_dicts(second) == PRODUCTS
+    assert scraper.stale['amazon.com'] >= 0
+
+    release.set()
+    for _ in range(100):
+        fresh = scraper.cache.get('amazon.com', 'iPhone 15')
+        if fresh is not None:
+            break
+        time.sleep(0.01)
+    assert fresh[0].precio == 749.0
+    assert calls == ['amazon.com']
@@ -0,0 +1,158 @@
+import time
+import requests
+from config import Config
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.services.render_strategy import get_selector
+from app.services.scraper import ProductScraper
+
+
+def _breaker(tmp_path, **kwargs):
+    kwargs.setdefault('failure_threshold', 3)
+    kwargs.setdefault('cooldown', 60)
+    kwargs.setdefault('probe_lease', 30)
+    return CircuitBreaker(str(tmp_path / 'breaker.sqlite3'), **kwargs)
+
+
+def test_opens_after_consecutive_failures_and_success_resets(tmp_path):
+    """Only consecutive failures count; an open circuit denies requests"""
+    breaker = _breaker(tmp_path)
+    breaker.record_failure('walmart.com', 'timeout')
+    breaker.record_failure('walmart.com', 'timeout')
+    breaker.record_success('walmart.com')
+    breaker.record_failure('walmart.com', 'timeout')
+    breaker.record_failure('walmart.com', 'timeout')
+    assert breaker.state('walmart.com') == CLOSED
+    assert breaker.allow('walmart.com') == (True, False)
+
+    breaker.record_failure('walmart.com', 'timeout')
+    assert breaker.state('walmart.com') == OPEN
+    assert breaker.allow('walmart.com') == (False, False)
+    assert breaker.allow('amazon.com') == (True, False)
+    assert breaker.stats()['walmart.com']['ultimo_error'] == 'timeout'
+
+
+def test_blocked_response_opens_immediately(tmp_path):
+    """A fetch where every attempt was a tiny blocked page trips at once"""
+    breaker = _breaker(tmp_path)
+    breaker.record_failure('bestbuy.com', 'bloqueado', blocked=True)
+    assert breaker.state('bestbuy.com') == OPEN
+
+
+def test_half_open_lets_a_single_probe_through(tmp_path):
+    """After the cool-down one caller probes; a failed probe doubles the cool-down"""
+    breaker = _breaker(tmp_path, failure_threshold=1, cooldown=0.05)
+    breaker.record_failure('walmart.com', 'timeout')
+    assert breaker.allow('walmart.com') == (False, False)
+    time.sleep(0.06)
+
+    assert breaker.allow('walmart.com') == (True, True)
+    assert breaker.allow('walmart.com') == (False, False)
+    assert breaker.state('walmart.com') == HALF_OPEN
+
+    breaker.record_failure('walmart.com', 'timeout')
+    assert breaker.state('walmart.com') == OPEN
+    assert breaker.stats()['walmart.com']['disparos'] == 2
+    time.sleep(0.06)
+    assert breaker.allow('walmart.com') == (False, False)  # 0.1s now
+    time.sleep(0.05)
+    assert breaker.allow('walmart.com') == (True, True)
+    breaker.record_success('walmart.com')
+    assert breaker.state('walmart.com') == CLOSED
+    assert breaker.stats()['walmart.com']['disparos'] == 0
+
+
+def test_state_is_shared_between_workers(tmp_path):
+    """Two breakers on the same file (two gunicorn workers) see one state"""
+    first = _breaker(tmp_path)
+    second = _breaker(tmp_path)
+    first.record_failure('ebay.com', 'bloqueado', blocked=True)
+    assert second.allow('ebay.com') == (False, False)
+
+    in_memory = CircuitBreaker(None, failure_threshold=1)
+    in_memory.record_failure('ebay.com', 'timeout')
+    assert in_memory.state('ebay.com') == OPEN
+
+
+class _Response:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+def test_scraper_skips_a_store_with_an_open_circuit(monkeypatch):
+    """Blocked responses trip the breaker and later searches skip the store"""
+    monkeypatch.setattr(Config, 'SITE_MIN_INTERVAL', 0)
+    get_selector().reset()
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(dict(params))
+        return _Response(500, b'Request failed')
+
+    scraper = ProductScraper('test-key')
+    monkeypatch.setattr(scraper.session, 'get', fake_get)
+    assert scraper._fetch_site('walmart.com', 'iPhone 15') == []
+    assert len(calls) == 2  # Toda la cadena de fallback
+    assert scraper.breaker.state('walmart.com') == OPEN
+
+    scraper = ProductScraper('test-key')
+    monkeypatch.setattr(scraper.session, 'get', fake_get)
+    assert scraper._fetch_site('walmart.com', 'iPhone 15') == []
+    assert len(calls) == 2
+    assert scraper.skipped == {'walmart.com'}
+    get_selector().reset()
+
+
+def test_half_open_probe_makes_a_single_attempt(monkeypatch):
+    """The probe skips the fallback chain; an empty but real page closes the circuit"""
+    monkeypatch.setattr(Config, 'SITE_MIN_INTERVAL', 0)
+    monkeypatch.setattr(Config, 'BREAKER_FAILURE_THRESHOLD', 1)
+    get_selector().reset()
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(dict(params))
+        if len(calls) == 1:
+            raise requests.Timeout()
+        return _Response(200, b'<html>' + b' ' * 2000 + b'</html>')
+
+    scraper = ProductScraper('test-key')
+    monkeypatch.setattr(scraper.session, 'get', fake_get)
+    scraper.breaker.cooldown = 0
+    monkeypatch.setattr(scraper, '_request_plan', lambda site, url: [('basic', {}), ('render', {})])
+    monkeypatch.setattr(scraper, '_parse_response', lambda content, site: [])
+
+    scraper.breaker.record_failure('ebay.com', 'timeout')
+    assert scraper._fetch_site('ebay.com', 'iPhone 15') == []
+    assert len(calls) == 1
+    assert scraper.breaker.state('ebay.com') == OPEN
+
+    assert scraper._fetch_site('ebay.com', 'iPhone 15') == []
+    assert len(calls) == 2
+    assert scraper.breaker.state('ebay.com') == CLOSED
+    get_selector().reset()
+
+
+def test_scraperapi_account_errors_do_not_trip_the_breaker(monkeypatch):
+    """A 401/403/429 from ScraperAPI (bad key, no credits) says nothing about the store"""
+    monkeypatch.setattr(Config, 'SITE_MIN_INTERVAL', 0)
+    monkeypatch.setattr(Config, 'BREAKER_FAILURE_THRESHOLD', 1)
+    get_selector().reset()
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(dict(params))
+        return _Response(401, b'Invalid API key')
+
+    scraper = ProductScraper('bad-key')
+    monkeypatch.setattr(scraper.session, 'get', fake_get)
+    assert scraper._fetch_site('amazon.com', 'iPhone 15') == []
+    assert scraper.breaker.state('amazon.com') == CLOSED
+
+    # Una prueba half-open que choca con un error de cuenta libera el lease
+    scraper.breaker.cooldown = 0
+    scraper.breaker.record_failure('amazon.com', 'timeout')
+    assert scraper._fetch_site('amazon.com', 'iPhone 15') == []
+    assert scraper.breaker.allow('amazon.com') == (True, True)
+    assert len(calls) == 2
+    get_selector().reset()
@@ -0,0 +1,44 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.services.http_session import get_session, get_pool_stats, reset_session
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def local_server():
+    """Local keep-alive HTTP server (no network)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    reset_session()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    reset_session()
+
+def test_session_is_shared_per_process(local_server):
+    """Every caller gets the same pooled session"""
+    assert get_session() is get_session()
+
+def test_connections_are_reused(local_server):
+    """Sequential requests reuse a single keep-alive connection"""
+    session = get_session()
+    for _ in range(5):
+        assert session.get(local_server, timeout=5).status_code == 200
+
+    stats = get_pool_stats()
+    assert stats['requests'] == 5
+    assert stats['conexiones_abiertas'] == 1
+    host = next(iter(stats['hosts'].values()))
+    assert host['conexiones_reutilizadas'] == 4
@@ -0,0 +1,111 @@
+import threading
+import time
+import pytest
+from app.services.jobs import JobManager
+from app.services.scraper import ProductScraper
+from app import create_app
+from config import Config
+
+PRODUCTS = {
+    'amazon.com': [{'tienda': 'amazon.com', 'nombre_crudo': 'iPhone 15', 'precio': 799.0,
+                    'url': 'https://www.amazon.com/dp/A', 'reviews': 4.5}],
+    'ebay.com': [{'tienda': 'ebay.com', 'nombre_crudo': 'iPhone 15', 'precio': 699.0,
+                  'url': 'https://www.ebay.com/itm/B', 'reviews': 4.0}],
+}
+
+@pytest.fixture
+def release(monkeypatch):
+    """Fake scraping that blocks until the test releases it"""
+    gate = threading.Event()
+    calls = []
+
+    def fake_iter_site_results(self, product_name, sites=None, deadline=None):
+        calls.append(product_name)
+        yield 'amazon.com', PRODUCTS['amazon.com']
+        gate.wait(5)
+        yield 'ebay.com', PRODUCTS['ebay.com']
+
+    monkeypatch.setattr(ProductScraper, 'iter_site_results', fake_iter_site_results)
+    monkeypatch.setattr(Config, 'TARGET_SITES', list(PRODUCTS))
+    monkeypatch.setattr('app.services.gemini_analyzer.GEMINI_AVAILABLE', False)
+    gate.calls = calls
+    return gate
+
+@pytest.fixture
+def client():
+    """Create test client"""
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+def wait_for(manager, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job stuck in {job["status"]}')
+
+def test_job_reports_partial_then_final_results(release):
+    """Partial products are visible while scraping; analysis when done"""
+    manager = JobManager(workers=2)
+    job, created = manager.submit('g', 's', 'iPhone 15')
+    assert created
+
+    deadline = time.monotonic() + 5
+    while not manager.get(job.id)['partial_products'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager.get(job.id)['tiendas'] == {'amazon.com': 1}
+
+    release.set()
+    final = wait_for(manager, job.id, ('done', 'error'))
+    assert final['status'] == 'done'
+    assert len(final['data']['products']) == 2
+
+def test_identical_inflight_searches_share_a_job(release):
+    """A duplicate query while the first is running joins the same job"""
+    manager = JobManager(workers=2)
+    first, _ = manager.submit('g', 's', 'iPhone 15')
+    second, created = manager.submit('g', 's', '  iphone 15 ')
+    assert not created and second.id == first.id
+
+    release.set()
+    wait_for(manager, first.id, ('done',))
+    assert release.calls == ['iPhone 15']
+
+    third, created = manager.submit('g', 's', 'iPhone 15')
+    assert created and third.id != first.id
+    wait_for(manager, third.id, ('done',))
+
+def test_searches_with_other_api_keys_get_their_own_job(release):
+    """Another user's keys never join a job (its errors must not reach them)"""
+    manager = JobManager(workers=2)
+    first, _ = manager.submit('g', 's', 'iPhone 15')
+    other_gemini, created = manager.submit('g2', 's', 'iPhone 15')
+    assert created and other_gemini.id != first.id
+    other_scraper, created = manager.submit('g', 's2', 'iPhone 15')
+    assert created and other_scraper.id not in (first.id, other_gemini.id)
+
+    release.set()
+    for job in (first, other_gemini, other_scraper):
+        wait_for(manager, job.id, ('done',))
+    assert release.calls == ['iPhone 15'] * 3
+
+def test_job_routes(client, release):
+    """POST returns 202 with a job id; GET polls it"""
+    release.set()
+    response = client.post('/api/search/jobs', json={
+        'gemini_api_key': 'g', 'scraper_api_key': 's', 'product_name': 'Galaxy S24'
+    })
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/search/{job_id}').get_json()['job']
+        if job['status'] == 'done':
+            break
+        time.sleep(0.01)
+    assert job['status'] == 'done'
+    assert client.get('/api/search/unknown').status_code == 404
@@ -0,0 +1,46 @@
+import json
+from app.services.json_stream import IncrementalJSONParser, parse_partial
+
+DOC = {
+    'summary': 'Mejor precio en eBay {ahorro 12%} "oferta"',
+    'insights': ['a', 'b, c'],
+    'products': [{'id': i, 'n': f'iPhone 15 }} {i}', 'sp': ['128GB']} for i in range(5)],
+}
+
+def test_chunked_feed_matches_json_loads():
+    """Feeding small chunks yields the same object as json.loads"""
+    text = '```json\n' + json.dumps(DOC, ensure_ascii=False) + '\n```'
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), 7):
+        events.extend(parser.feed(text[i:i + 7]))
+
+    assert parser.done
+    assert parser.result() == DOC
+    assert [e[2]['id'] for e in events if e[0] == 'item'] == list(range(5))
+
+def test_truncated_response_keeps_complete_products():
+    """A cut-off response still returns every product that closed"""
+    text = json.dumps(DOC)
+    cut = text.index('"id": 3')
+    result, complete = parse_partial(text[:cut + 4])
+
+    assert not complete
+    assert result['summary'] == DOC['summary']
+    assert [p['id'] for p in result['products']] == [0, 1, 2]
+
+def test_garbage_yields_nothing():
+    """Text without a JSON object is not started"""
+    parser = IncrementalJSONParser()
+    parser.feed('Lo siento, no puedo ayudar con eso.')
+    assert not parser.started and parser.result() == {}
+
+def test_braces_in_leading_prose_are_skipped():
+    """Free-text fallback output with braces before the JSON still parses"""
+    text = 'Aquí tienes {nota}: {} ' + json.dumps(DOC, ensure_ascii=False)
+    assert parse_partial(text) == (DOC, True)
+
+    parser = IncrementalJSONParser()
+    for char in text:
+        parser.feed(char)
+    assert parser.done and parser.result() == DOC
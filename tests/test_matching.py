@@ -0,0 +1,61 @@
+from app.services.matching import (
+    MinHasher, ProductMatcher, cluster_products, extract_identifiers, normalize_title, title_tokens,
+)
+from app.services.products import ProductBatch
+
+def test_titles_are_normalized_for_units_and_accents():
+    """Units are glued to their numbers and accents/punctuation dropped"""
+    assert normalize_title('iPhone 15 — 128 GB, Teléfono') == 'iphone 15 128gb telefono'
+    assert 'unlocked' not in title_tokens('iPhone 15 (Unlocked)')
+
+def test_identifiers_keep_valid_gtins_and_model_numbers():
+    """GTINs need a valid check digit; model numbers mix letters and digits"""
+    gtins, models = extract_identifiers('Galaxy S24 SM-S921U UPC 194253433248 / 194253433249')
+    assert gtins == {'194253433248'}
+    assert 'sms921u' in models
+    assert '128gb' not in extract_identifiers('iPhone 15 128GB')[1]
+
+def test_minhash_similarity_tracks_jaccard():
+    """Identical sets agree on every permutation, disjoint sets on almost none"""
+    hasher = MinHasher(num_perm=64)
+    a = hasher.signature({'iphone', '15', '128gb', 'black'})
+    assert MinHasher.similarity(a, hasher.signature({'black', '128gb', '15', 'iphone'})) == 1.0
+    assert MinHasher.similarity(a, hasher.signature({'galaxy', 's24', 'ultra'})) < 0.2
+
+def test_equivalent_listings_cluster_across_stores():
+    """Same product in different wording clusters; other capacities stay apart"""
+    matcher = ProductMatcher()
+    groups = matcher.cluster([
+        'Apple iPhone 15 128GB Black',
+        'iPhone 15 128 GB - Black (Unlocked)',
+        'Apple iPhone 15 256GB Black',
+        'Samsung Galaxy S24 Ultra',
+    ])
+    assert sorted(map(sorted, groups)) == [[0, 1], [2], [3]]
+
+def test_listing_without_capacity_does_not_chain_capacities():
+    """A title with no capacity joins one variant, never bridging 256GB and 1TB"""
+    matcher = ProductMatcher()
+    groups = matcher.cluster([
+        'Apple iPhone 15 Pro Max Natural Titanium 256GB',
+        'Apple iPhone 15 Pro Max Natural Titanium',
+        'Apple iPhone 15 Pro Max Natural Titanium 1TB',
+    ])
+    assert sorted(map(sorted, groups)) == [[0, 1], [2]]
+
+def test_shared_gtin_or_model_number_matches():
+    """Strong identifiers match even when the wording differs"""
+    matcher = ProductMatcher()
+    assert matcher.cluster(['Sony WH1000XM5 Wireless Headphones Black',
+                            'Sony WH-1000XM5 Noise Canceling Headphones, Black']) == [[0, 1]]
+    assert len(matcher.cluster(['Sony WH-1000XM5 Headphones', 'Case for WH1000XM5'])) == 2
+    assert len(matcher.cluster(['Widget 194253433248', 'Widget 012345678905'])) == 2
+
+def test_cluster_products_picks_the_cheapest_representative():
+    """Every member maps to the cheapest listing of its group"""
+    batch = ProductBatch.from_products([
+        {'tienda': 'amazon.com', 'nombre_crudo': 'Apple iPhone 15 128GB Black', 'precio': 799.0, 'url': 'a'},
+        {'tienda': 'ebay.com', 'nombre_crudo': 'iPhone 15 128GB Black', 'precio': 699.0, 'url': 'b'},
+        {'tienda': 'walmart.com', 'nombre_crudo': 'Samsung Galaxy S24', 'precio': 650.0, 'url': 'c'},
+    ])
+    assert cluster_products(batch) == {0: 1, 1: 1, 2: 2}
@@ -0,0 +1,73 @@
+import os
+import pytest
+from app.services.products import to_dicts
+from app.services.scraper import ProductScraper
+from app.services.html_parsing import make_soup, LXML_AVAILABLE
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+STORES = ['amazon', 'ebay', 'walmart', 'bestbuy']
+
+def load_fixture(store):
+    with open(os.path.join(FIXTURES, f'{store}_search.html'), 'rb') as f:
+        return f.read()
+
+def parse(store, parser, parse_only):
+    """Run the store parser over a recorded search page"""
+    scraper = ProductScraper('test-key')
+    scraper.max_results = 50
+    site = f'{store}.com'
+    soup = make_soup(load_fixture(store), site, parser=parser, parse_only=parse_only)
+    return getattr(scraper, f'_parse_{store}')(soup, site)
+
+@pytest.mark.parametrize('store', STORES)
+def test_reference_parser_extracts_products(store):
+    """html5lib (reference) finds every product in the fixture"""
+    assert len(parse(store, 'html5lib', parse_only=False)) == 8
+
+@pytest.mark.parametrize('store', STORES)
+@pytest.mark.parametrize('parser', [
+    pytest.param('lxml', marks=pytest.mark.skipif(not LXML_AVAILABLE, reason='lxml no instalado')),
+    'html.parser',
+])
+def test_fast_parser_parity(store, parser):
+    """Fast parsers with targeted extraction match the html5lib product list"""
+    reference = parse(store, 'html5lib', parse_only=False)
+    assert parse(store, parser, parse_only=True) == reference
+    assert parse(store, parser, parse_only=False) == reference
+
+def test_benchmark_harness_runs_offline():
+    """Parser benchmark runs on the fixtures and reports no regressions"""
+    import io
+    from benchmarks.bench_parsers import run_benchmark, check_rows
+
+    rows = run_benchmark(FIXTURES, runs=1, out=io.StringIO())
+    assert {row['store'] for row in rows} == set(STORES)
+    assert check_rows(rows) == []
+
+def test_registry_store_without_custom_parser():
+    """A store defined only in the registry (Target) is parsed by the generic engine"""
+    html = b'''<html><body>
+    <div data-test="@web/site-top-of-funnel/ProductCardWrapper">
+      <a data-test="product-title" href="/p/apple-iphone-15/-/A-1">Apple iPhone 15</a>
+      <span data-test="current-price"><span>$699.99 - $799.99</span></span>
+      <span data-test="ratings">4.6 out of 5 stars</span>
+    </div></body></html>'''
+    scraper = ProductScraper('test-key')
+    products = scraper._parse_target(make_soup(html, 'target.com', parser='html.parser'), 'target.com')
+    assert to_dicts(products) == [{
+        'tienda': 'target.com',
+        'nombre_crudo': 'Apple iPhone 15',
+        'precio': 699.99,
+        'url': 'https://www.target.com/p/apple-iphone-15/-/A-1',
+        'reviews': 4.6
+    }]
+
+def test_selector_fallback_priority():
+    """Higher-priority selectors win even when a fallback appears first in the item"""
+    from bs4 import BeautifulSoup
+    from app.services.stores import get_store
+
+    item = BeautifulSoup('<li class="s-item"><h3>Fallback title here</h3>'
+                         '<h3 class="s-item__title">Preferred title</h3></li>', 'html.parser').li
+    fields = get_store('ebay.com').match_fields(item)
+    assert fields['name'].text == 'Preferred title'
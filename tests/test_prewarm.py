@@ -0,0 +1,94 @@
+import json
+import time
+import pytest
+from app.services.cache import MemoryCacheBackend, SearchCache
+from app.services.prewarm import PrewarmScheduler, Prewarmer, load_queries, record_query, top_queries
+from config import Config
+
+def _product(site, name):
+    return {'tienda': site, 'nombre_crudo': name, 'precio': 100.0,
+            'url': f'https://www.{site}/item', 'reviews': 4.0}
+
+@pytest.fixture
+def prewarmer(monkeypatch):
+    """Prewarmer over a private cache with a fake scrape (no network)"""
+    monkeypatch.setattr(Config, 'TARGET_SITES', ['amazon.com', 'ebay.com', 'walmart.com', 'bestbuy.com'])
+    prewarmer = Prewarmer('test-key', budget=100, include_premium=False)
+    prewarmer.cache = prewarmer.scraper.cache = SearchCache(MemoryCacheBackend(50), ttl_by_site={}, default_ttl=60)
+    prewarmer.scraped = []
+
+    def fake_fetch(site, name):
+        prewarmer.scraped.append((name, site))
+        return [_product(site, name)]
+    monkeypatch.setattr(prewarmer.scraper, '_fetch_site', fake_fetch)
+    return prewarmer
+
+def test_top_queries_are_ranked_from_the_log(monkeypatch):
+    """Normalized queries are counted; old entries fall outside the window"""
+    for query in ['iPhone 15', 'iphone  15', 'PS5', 'iPhone 15']:
+        record_query(query)
+    with open(Config.QUERY_LOG_PATH, 'a', encoding='utf-8') as log:
+        log.write(json.dumps({'ts': time.time() - 30 * 86400, 'q': 'ps5'}) + '\n')
+        log.write(json.dumps({'ts': time.time() - 30 * 86400, 'q': 'ps5'}) + '\n')
+        log.write('{"ts": 1, "q": "cut\n')
+    assert top_queries(n=10, days=7) == ['iphone 15', 'ps5']
+    assert top_queries(n=1, days=7) == ['iphone 15']
+
+def test_query_file_is_normalized_and_deduplicated(tmp_path):
+    """Comments and duplicate spellings are dropped"""
+    path = tmp_path / 'queries.txt'
+    path.write_text('# top\niPhone 15\n\niphone  15  # dup\nPS5\n', encoding='utf-8')
+    assert load_queries(str(path)) == ['iphone 15', 'ps5']
+
+def test_plan_stays_within_budget_and_free_tier(prewarmer):
+    """Premium stores are excluded by default and the budget caps the plan"""
+    prewarmer.budget = 3
+    tasks, credits, _, skipped_budget = prewarmer.plan(['iphone 15', 'ps5'])
+    assert tasks == [('iphone 15', 'amazon.com'), ('iphone 15', 'ebay.com'), ('ps5', 'amazon.com')]
+    assert credits == 3 and skipped_budget == 1
+
+    prewarmer.sites = ['amazon.com', 'walmart.com']  # Premium opted in
+    prewarmer.budget = 25
+    tasks, credits, _, _ = prewarmer.plan(['iphone 15'])
+    assert tasks == [('iphone 15', 'amazon.com')]  # walmart (render+premium, 25 credits) no longer fits
+
+    prewarmer.budget = 26
+    tasks, credits, _, _ = prewarmer.plan(['iphone 15'])
+    assert credits == 26
+
+def test_fresh_entries_are_skipped(prewarmer):
+    """Entries with most of their TTL left are not scraped again"""
+    prewarmer.cache.set('amazon.com', 'iphone 15', [_product('amazon.com', 'iPhone 15')])
+    tasks, _, skipped_fresh, _ = prewarmer.plan(['iphone 15'])
+    assert tasks == [('iphone 15', 'ebay.com')]
+    assert skipped_fresh == 1
+
+def test_run_warms_search_and_analysis_caches(prewarmer, monkeypatch):
+    """Every planned store is scraped into the cache and each query analyzed once"""
+    from app.services.gemini_analyzer import GeminiAnalyzer
+    analyzed = []
+    monkeypatch.setattr(GeminiAnalyzer, '__init__', lambda self, key: None)
+    monkeypatch.setattr(GeminiAnalyzer, 'analyze_products',
+                        lambda self, products, name: analyzed.append((name, len(products))))
+    prewarmer.gemini_key = 'gemini-key'
+
+    report = prewarmer.run(['iphone 15', 'ps5'])
+    assert sorted(prewarmer.scraped) == [('iphone 15', 'amazon.com'), ('iphone 15', 'ebay.com'),
+                                         ('ps5', 'amazon.com'), ('ps5', 'ebay.com')]
+    assert prewarmer.cache.stats()['hits'] == 0  # Warming reads don't count as user cache hits
+    assert prewarmer.cache.get('ebay.com', 'PS5') is not None
+    assert analyzed == [('iphone 15', 2), ('ps5', 2)]
+    assert report['creditos'] == 4 and report['errores'] == 0
+
+def test_failed_scrapes_are_reported_as_errors(prewarmer, monkeypatch):
+    """_fetch_site swallows errors, so an empty scrape counts as a failed task"""
+    monkeypatch.setattr(prewarmer.scraper, '_fetch_site', lambda site, name: [])
+    report = prewarmer.run(['iphone 15'])
+    assert report['scrapes'] == 2 and report['errores'] == 2
+
+def test_scheduler_waits_until_the_configured_hour():
+    """The next run is at the configured local hour, today or tomorrow"""
+    scheduler = PrewarmScheduler('test-key', hour=4)
+    midnight = time.mktime((2024, 1, 10, 0, 0, 0, 0, 0, -1))
+    assert scheduler.seconds_until_next_run(midnight) == 4 * 3600
+    assert scheduler.seconds_until_next_run(midnight + 5 * 3600) == 23 * 3600
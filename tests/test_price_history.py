@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+import pytest
+from app.services.price_history import DAY, PriceHistory, get_price_history, product_key
+from app.services.products import Product
+from config import Config
+
+NOW = 1_700_000_000.0
+
+def _product(store, name, price):
+    return Product(store, name, price, f'https://www.{store}/{price:g}')
+
+@pytest.fixture
+def history(tmp_path):
+    return PriceHistory(str(tmp_path / 'history.sqlite3'))
+
+def test_product_key_ignores_word_order_and_units():
+    """Listings with the same tokens share one history"""
+    assert product_key('Apple iPhone 15 128 GB') == product_key('iphone 15 128GB Apple (Unlocked)')
+    assert product_key('iPhone 15 128GB') != product_key('iPhone 15 256GB')
+
+def test_window_stats_cover_only_the_requested_days(history):
+    """Min/avg/max are computed over the window ending at `until`"""
+    history.record('iphone 15', [_product('amazon.com', 'iPhone 15 128GB', 900.0)], ts=NOW - 30 * DAY)
+    history.record('iphone 15', [_product('amazon.com', 'iPhone 15 128GB', 800.0)], ts=NOW - 3 * DAY)
+    history.record('iphone 15', [_product('ebay.com', 'iPhone 15 - 128 GB', 700.0)], ts=NOW - DAY)
+
+    stats = history.window_stats('iPhone 15 128GB', days=7, until=NOW)
+    assert stats['minimo'] == 700.0
+    assert stats['promedio'] == 750.0
+    assert stats['muestras'] == 2
+    assert history.window_stats('iPhone 15 128GB', days=7, until=NOW, store='ebay.com')['muestras'] == 1
+    assert history.window_stats('Galaxy S24', days=7, until=NOW) is None
+    assert [p['precio'] for p in history.history('iPhone 15 128GB', until=NOW)] == [900.0, 800.0, 700.0]
+
+def test_price_dropped_compares_against_window_average(history):
+    """A price 5% under the window average counts as a drop"""
+    history.record('iphone 15', [_product('amazon.com', 'iPhone 15 128GB', 800.0)], ts=NOW - DAY)
+    assert history.price_dropped('iPhone 15 128GB', 750.0, until=NOW)
+    assert not history.price_dropped('iPhone 15 128GB', 790.0, until=NOW)
+    assert not history.price_dropped('Galaxy S24', 1.0, until=NOW)
+
+def test_stats_for_many_products_and_queries(history):
+    """Grouped lookups return stats per title and per search"""
+    history.record('iPhone 15', [
+        _product('amazon.com', 'iPhone 15 128GB', 800.0),
+        _product('ebay.com', 'iPhone 15 256GB', 900.0),
+    ], ts=NOW - DAY)
+    stats = history.stats_for(['iPhone 15 128GB', 'IPHONE 15 (128 GB)', 'Galaxy S24'], until=NOW)
+    assert set(stats) == {'iPhone 15 128GB', 'IPHONE 15 (128 GB)'}
+    assert history.query_stats('  iphone 15 ', until=NOW)['promedio'] == 850.0
+
+def test_range_queries_use_the_indexes(history):
+    """Product/time and query/time lookups are index searches, not table scans"""
+    with history._connect() as conn:
+        plan = ' '.join(str(row) for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT MIN(precio) FROM price_history WHERE product_key = ? AND ts >= ?',
+            ('k', 0)))
+    assert 'idx_history_product_ts' in plan
+
+def test_window_query_uses_the_product_index(history, monkeypatch):
+    """Window stats read one product's rows through its index, never a full scan"""
+    names = [f'Producto {i} modelo X{i}' for i in range(500)]
+    for day in range(20):
+        history.record('producto', [_product('amazon.com', name, 100.0 + day) for name in names],
+                       ts=NOW - day * DAY)
+    assert len(history) == 10_000
+
+    statements = []
+    connect = history._connect
+
+    @contextmanager
+    def traced():
+        with connect() as conn:
+            conn.set_trace_callback(statements.append)
+            yield conn
+    monkeypatch.setattr(history, '_connect', traced)
+
+    assert history.window_stats(names[0], days=7, until=NOW)['muestras'] == 8
+    query = next(sql for sql in statements if sql.startswith('SELECT'))
+    with connect() as conn:
+        plan = ' | '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}'))
+    assert 'idx_history_product_ts' in plan
+    assert 'SCAN price_history' not in plan
+
+def test_scrapes_are_recorded_and_fed_to_the_analyzer(monkeypatch):
+    """Real scrapes land in the history; later analyses get per-product context"""
+    from app.services.gemini_analyzer import GeminiAnalyzer
+    from app.services.scraper import ProductScraper
+
+    scraper = ProductScraper('test-key')
+    monkeypatch.setattr(scraper, '_fetch_site',
+                        lambda site, name: [_product(site, 'iPhone 15 128GB', 800.0)])
+    scraper._fetch_and_store('amazon.com', 'iPhone 15')
+    history = get_price_history()
+    assert len(history) == 1
+
+    monkeypatch.setattr(Config, 'PRICE_HISTORY_MIN_AGE', -60)  # Count the scrape we just made
+    analyzer = GeminiAnalyzer.__new__(GeminiAnalyzer)
+    analyzer.use_fallback = True
+    result = analyzer.analyze_products([_product('ebay.com', 'iPhone 15 128 GB', 700.0)], 'iPhone 15')
+    entry = result['products'][0]['historial']
+    assert entry['promedio'] == 800.0
+    assert entry['bajo_precio'] and entry['minimo_historico']
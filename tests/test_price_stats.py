@@ -0,0 +1,58 @@
+import random
+import pytest
+from app.services import price_stats
+from app.services.price_stats import PriceTable, Recommendation
+
+PRODUCTS = [
+    {'tienda': 'amazon.com', 'precio': 100.0, 'reviews': 4.5},
+    {'tienda': 'amazon.com', 'precio': 120.0, 'reviews': 4.0},
+    {'tienda': 'ebay.com', 'precio': 90.0, 'reviews': 3.5, 'recomendacion': '🏆 Mejor Opción'},
+    {'tienda': 'walmart.com', 'precio': 150.0, 'reviews': 4.2, 'recomendacion': '❌ No Recomendado'},
+]
+
+ENGINES = [False] + ([True] if price_stats.NUMPY_AVAILABLE else [])
+
+@pytest.fixture(params=ENGINES, ids=lambda numpy: 'numpy' if numpy else 'python')
+def engine(request, monkeypatch):
+    monkeypatch.setattr(price_stats, 'NUMPY_AVAILABLE', request.param)
+    return request.param
+
+def test_summary_statistics(engine):
+    """Mean, median, percentiles and per-store aggregates in one pass"""
+    stats = PriceTable(PRODUCTS).summary()
+    assert stats['precio_promedio'] == 115.0
+    assert stats['precio_mediana'] == 110.0
+    assert stats['percentil_25'] == 97.5
+    assert stats['rango_precio'] == 60.0
+    assert stats['desviacion_estandar'] == 22.91
+    assert stats['mejores_precios'] == 1 and stats['no_recomendados'] == 1
+    assert stats['por_tienda']['amazon.com'] == {'productos': 2, 'precio_minimo': 100.0, 'precio_promedio': 110.0}
+
+def test_scoring_uses_enum_recommendations(engine):
+    """Cheapest is BEST; thresholds match the basic analysis"""
+    recommendations, diffs, scores = PriceTable(PRODUCTS).score()
+    assert recommendations == [Recommendation.GOOD, Recommendation.CONSIDER,
+                               Recommendation.BEST, Recommendation.NOT_RECOMMENDED]
+    assert round(diffs[0], 2) == -13.04
+    assert scores[3] == 70
+
+@pytest.mark.skipif(not price_stats.NUMPY_AVAILABLE, reason='numpy not installed')
+def test_numpy_and_python_engines_agree(monkeypatch):
+    """Both engines produce identical results on a bulk catalog"""
+    rng = random.Random(7)
+    products = [{'tienda': rng.choice(['amazon.com', 'ebay.com', 'walmart.com']),
+                 'precio': round(rng.uniform(10, 2000), 2)} for _ in range(5000)]
+
+    fast = PriceTable(products)
+    expected = (fast.summary(), fast.score())
+    monkeypatch.setattr(price_stats, 'NUMPY_AVAILABLE', False)
+    slow = PriceTable(products)
+    assert slow.summary() == expected[0]
+    assert slow.score()[0] == expected[1][0]
+
+def test_recommendation_from_label():
+    """Labels from Gemini or the basic analysis map to the enum"""
+    assert Recommendation.from_label('🏆 Mejor Opción') is Recommendation.BEST
+    assert Recommendation.from_label('⚠️ Considerar') is Recommendation.CONSIDER
+    assert Recommendation.from_label('⏳ Analizando...') is Recommendation.UNKNOWN
+    assert Recommendation.GOOD.label == '✅ Buena Alternativa'
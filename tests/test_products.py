@@ -0,0 +1,30 @@
+from app.services.cache import MemoryCacheBackend, SearchCache
+from app.services.products import Product, ProductBatch, as_product, to_dicts
+
+RAW = {'tienda': 'ebay.com', 'nombre_crudo': 'iPhone 15', 'precio': 699.0,
+       'url': 'https://www.ebay.com/itm/B', 'reviews': 4.0}
+
+def test_product_round_trips_to_api_shape():
+    """dict → Product → dict keeps the existing JSON shape"""
+    product = as_product(RAW)
+    assert product.precio == 699.0 and product['tienda'] == 'ebay.com'
+    assert product.to_dict() == RAW
+    assert as_product(product.to_row()) == product
+    assert not hasattr(product, '__dict__')
+
+def test_batch_is_columnar():
+    """Prices live in a contiguous array; indexing yields Products"""
+    batch = ProductBatch.from_products([RAW, dict(RAW, tienda='amazon.com', precio=799.0)])
+    assert len(batch) == 2
+    assert list(batch.precios) == [699.0, 799.0]
+    assert batch[1] == Product('amazon.com', 'iPhone 15', 799.0, RAW['url'], 4.0)
+    assert to_dicts(batch[:1]) == [RAW]
+
+def test_search_cache_stores_compact_rows():
+    """The cache keeps rows, not dicts, and returns Products"""
+    backend = MemoryCacheBackend(10)
+    cache = SearchCache(backend, ttl_by_site={}, default_ttl=60)
+    cache.set('ebay.com', 'iPhone 15', [as_product(RAW)])
+    stored = backend.get(cache.key('ebay.com', 'iPhone 15'))
+    assert stored['products'] == [['ebay.com', 'iPhone 15', 699.0, RAW['url'], 4.0]]
+    assert cache.get('ebay.com', 'iPhone 15') == [as_product(RAW)]
@@ -0,0 +1,117 @@
+import random
+import pytest
+from app.services.render_strategy import StrategySelector, get_selector
+from app.services.scraper import ProductScraper
+from config import Config
+
+WALMART = ['render+premium', 'premium']
+
+@pytest.fixture
+def selector(monkeypatch):
+    monkeypatch.setattr(Config, 'STRATEGY_EXPLORE', 0)
+    monkeypatch.setattr(Config, 'STRATEGY_MIN_SAMPLES', 3)
+    return StrategySelector(rng=random.Random(0))
+
+def test_default_order_until_enough_samples(selector):
+    """Without history the store's configured order is kept"""
+    assert selector.order('walmart.com', WALMART) == WALMART
+    selector.record('walmart.com', 'premium', True, 3.0)
+    assert selector.order('walmart.com', WALMART) == WALMART
+
+def test_cheaper_reliable_strategy_moves_first(selector):
+    """A strategy that succeeds faster and cheaper becomes the first attempt"""
+    for _ in range(5):
+        selector.record('walmart.com', 'render+premium', False, 25.0)
+        selector.record('walmart.com', 'premium', True, 4.0)
+    assert selector.order('walmart.com', WALMART) == ['premium', 'render+premium']
+    assert selector.order('bestbuy.com', WALMART) == WALMART  # Learned per store
+
+def test_credit_cost_breaks_ties_between_reliable_strategies(selector):
+    """With equal success and latency the cheaper strategy wins"""
+    for _ in range(5):
+        selector.record('ebay.com', 'basic', True, 5.0)
+        selector.record('ebay.com', 'render', True, 5.0)
+    assert selector.order('ebay.com', ['render', 'basic']) == ['basic', 'render']
+
+def test_exploration_tries_undersampled_alternatives(selector, monkeypatch):
+    """Occasionally an alternative with few samples is tried first"""
+    monkeypatch.setattr(Config, 'STRATEGY_EXPLORE', 1.0)
+    for _ in range(5):
+        selector.record('walmart.com', 'render+premium', True, 10.0)
+    assert selector.order('walmart.com', WALMART)[0] == 'premium'
+
+def test_racing_only_for_unreliable_stores(selector, monkeypatch):
+    """Racing needs the flag and a first choice that usually fails"""
+    for _ in range(5):
+        selector.record('bestbuy.com', 'render+premium', False, 25.0)
+    assert not selector.should_race('bestbuy.com', WALMART)
+    monkeypatch.setattr(Config, 'STRATEGY_RACE', True)
+    assert selector.should_race('bestbuy.com', WALMART)
+    assert not selector.should_race('amazon.com', ['basic'])
+
+class _Response:
+    def __init__(self, status, content=b''):
+        self.status_code = status
+        self.content = content
+
+def test_scraper_falls_through_after_a_timeout_and_learns(monkeypatch):
+    """A timed-out first strategy falls back to the next and is recorded"""
+    import requests
+    monkeypatch.setattr(Config, 'SITE_MIN_INTERVAL', 0)
+    monkeypatch.setattr(Config, 'STRATEGY_EXPLORE', 0)  # Orden por defecto, sin exploración al azar
+    get_selector().reset()
+    scraper = ProductScraper('test-key')
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(dict(params))
+        if params.get('render') == 'true':
+            raise requests.Timeout()
+        return _Response(200, b'<html>ok</html>')
+    monkeypatch.setattr(scraper.session, 'get', fake_get)
+    monkeypatch.setattr(scraper, '_parse_response', lambda content, site: [
+        {'tienda': site, 'nombre_crudo': 'iPhone 15', 'precio': 1.0, 'url': 'u', 'reviews': 4.0}])
+
+    products = scraper._fetch_site('walmart.com', 'iPhone 15')
+    assert len(products) == 1
+    assert calls[0]['session_number'] == '123' and calls[0]['premium'] == 'true'
+    assert 'render' not in calls[1] and 'session_number' not in calls[1]
+    stats = get_selector().stats()['walmart.com']
+    assert stats['render+premium']['exitos'] == 0
+    assert stats['premium']['exitos'] == 1 and stats['premium']['creditos'] == 10
+    get_selector().reset()
+
+def test_every_200_is_billed_even_without_products(selector):
+    """ScraperAPI charges block pages and empty results too"""
+    selector.record('walmart.com', 'premium', False, 5.0, billed=True)
+    selector.record('walmart.com', 'premium', False, 25.0, billed=False)  # Timeout
+    stats = selector.stats()['walmart.com']['premium']
+    assert stats['exitos'] == 0 and stats['cobrados'] == 1 and stats['creditos'] == 10
+
+def test_only_block_pages_escalate_to_pricier_strategies(monkeypatch):
+    """An empty results page ends the attempts; a captcha page moves on to render"""
+    monkeypatch.setattr(Config, 'SITE_MIN_INTERVAL', 0)
+    monkeypatch.setattr(Config, 'STRATEGY_EXPLORE', 0)
+    get_selector().reset()
+    scraper = ProductScraper('test-key')
+    monkeypatch.setattr(scraper, '_parse_response', lambda content, site: [])
+    pages = {'empty': b'<html>' + b'<p>No results</p>' * 200 + b'</html>',
+             'captcha': b'<html><form id="captcha-form">' + b' ' * 2000 + b'</form></html>'}
+    calls = []
+
+    def fake_get(url, params=None, timeout=None):
+        calls.append(params.get('render'))
+        return _Response(200, pages[page])
+    monkeypatch.setattr(scraper.session, 'get', fake_get)
+
+    page = 'empty'
+    assert scraper._fetch_site('ebay.com', 'rare item') == []
+    assert calls == [None]
+
+    page = 'captcha'
+    calls.clear()
+    assert scraper._fetch_site('ebay.com', 'rare item') == []
+    assert calls == [None, 'true']
+    stats = get_selector().stats()['ebay.com']
+    assert stats['basic']['creditos'] == 2 and stats['render']['creditos'] == 5
+    get_selector().reset()
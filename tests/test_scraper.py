@@ -0,0 +1,141 @@
+import asyncio
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from app.services.async_engine import AsyncTokenBucket
+from app.services.cache import MemoryCacheBackend, SearchCache
+from app.services.scraper import ProductScraper
+from config import Config
+
+SITES = ['amazon.com', 'ebay.com', 'walmart.com', 'bestbuy.com']
+
+def _fake_product(site):
+    return {
+        'tienda': site,
+        'nombre_crudo': f'Producto {site}',
+        'precio': 100.0,
+        'url': f'https://www.{site}/item',
+        'reviews': 4.0
+    }
+
+@pytest.fixture
+def scraper(monkeypatch):
+    """Scraper with fake per-site latency (no network)"""
+    delays = {'amazon.com': 0.1, 'ebay.com': 0.2, 'walmart.com': 0.3, 'bestbuy.com': 0.3}
+    scraper = ProductScraper('test-key')
+
+    def fake_search_site(site, product_name):
+        time.sleep(delays[site])
+        return [_fake_product(site)]
+
+    monkeypatch.setattr(scraper, '_search_site', fake_search_site)
+    monkeypatch.setattr(Config, 'TARGET_SITES', SITES)
+    return scraper
+
+def test_concurrent_search_queries_every_store_at_once(scraper, monkeypatch):
+    """All stores are in flight together (latency ≈ slowest store, see benchmarks/bench_search.py)"""
+    monkeypatch.setattr(Config, 'SCRAPER_ENGINE', 'threads')
+    barrier = threading.Barrier(len(SITES), timeout=5)
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def fake_search_site(site, product_name):
+        with lock:
+            active.append(site)
+            peak.append(len(active))
+        barrier.wait()  # Only passes if every store is running at the same time
+        with lock:
+            active.remove(site)
+        return [_fake_product(site)]
+
+    monkeypatch.setattr(scraper, '_search_site', fake_search_site)
+    products = scraper.search_products('iPhone 15', concurrent=True)
+    assert {p['tienda'] for p in products} == set(SITES)
+    assert max(peak) == len(SITES)
+
+def test_results_arrive_as_each_store_finishes(scraper):
+    """Fastest store is yielded first"""
+    order = [site for site, _ in scraper.iter_site_results('iPhone 15')]
+    assert order[0] == 'amazon.com'
+    assert set(order) == set(SITES)
+
+def test_deadline_returns_partial_results(scraper):
+    """Stores slower than the deadline are skipped"""
+    results = dict(scraper.iter_site_results('iPhone 15', deadline=0.15))
+    assert 'amazon.com' in results
+    assert 'walmart.com' not in results
+
+def test_sequential_search_still_available(scraper):
+    """Sequential mode returns the same stores"""
+    products = scraper.search_products('iPhone 15', concurrent=False)
+    assert [p['tienda'] for p in products] == SITES
+
+# --- Async engine (local fake ScraperAPI, no network) ---
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+class _FakeScraperAPI(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        target = parse_qs(urlparse(self.path).query)['url'][0]
+        store = urlparse(target).netloc.replace('www.', '').split('.')[0]
+        with open(os.path.join(FIXTURES, f'{store}_search.html'), 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """Serves the recorded store pages as if it were ScraperAPI"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeScraperAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Config, 'SCRAPER_API_URL', f'http://127.0.0.1:{server.server_address[1]}')
+    monkeypatch.setattr(Config, 'SITE_MIN_INTERVAL', 0)
+    yield
+    server.shutdown()
+
+def _uncached_scraper():
+    scraper = ProductScraper('test-key')
+    scraper.cache = SearchCache(MemoryCacheBackend(10), ttl_by_site={}, default_ttl=60)
+    return scraper
+
+def test_async_search_products(fake_api):
+    """asearch_products scrapes every store over asyncio"""
+    products = asyncio.run(_uncached_scraper().asearch_products('iPhone 15', sites=SITES))
+    assert {p['tienda'] for p in products} == set(SITES)
+
+def test_async_engine_shared_background_loop(fake_api, monkeypatch):
+    """SCRAPER_ENGINE=async runs searches on the shared background loop"""
+    monkeypatch.setattr(Config, 'SCRAPER_ENGINE', 'async')
+    monkeypatch.setattr(Config, 'TARGET_SITES', SITES)
+    products = _uncached_scraper().search_products('iPhone 15', concurrent=True)
+    assert len(products) == len(SITES) * Config.MAX_RESULTS_PER_SITE
+
+def test_token_bucket_limits_concurrency():
+    """No more than `concurrency` requests are in flight at once"""
+    async def scenario():
+        limiter = AsyncTokenBucket(rate=1000, capacity=100, concurrency=2)
+        in_flight, peak = 0, 0
+
+        async def request():
+            nonlocal in_flight, peak
+            async with limiter:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(request() for _ in range(10)))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.services.cache import MemoryCacheBackend, SearchCache
+from app.services.scraper import ProductScraper
+from app.services.singleflight import SingleFlight
+
+def test_concurrent_identical_calls_run_once():
+    """Followers wait for the leader and get a copy of its result"""
+    flight = SingleFlight('test')
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return [{'precio': 10.0}]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: flight.do('k', slow), range(8)))
+
+    assert len(calls) == 1
+    assert sum(shared for _, shared in results) == 7
+    assert all(r == [{'precio': 10.0}] for r, _ in results)
+    assert results[0][0] is not results[1][0]
+
+def test_leader_error_is_shared_and_key_released():
+    """A failed call propagates to waiters and does not stick"""
+    flight = SingleFlight('test')
+    started = threading.Event()
+
+    def boom():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError('upstream down')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'k', boom)
+        started.wait()
+        follower = pool.submit(flight.do, 'k', boom)
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result()
+
+    assert flight.do('k', lambda: 'ok') == ('ok', False)
+
+def test_async_calls_coalesce():
+    """ado() shares one coroutine per key within a loop"""
+    flight = SingleFlight('test')
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ['x']
+
+    async def scenario():
+        return await asyncio.gather(*(flight.ado('k', fetch) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == [['x']] * 5
+
+def test_async_follower_survives_leader_cancellation():
+    """A follower with time left re-runs the work instead of inheriting the leader's cancellation"""
+    flight = SingleFlight('test')
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.5)
+        return ['x']
+
+    async def scenario():
+        leader = asyncio.ensure_future(asyncio.wait_for(flight.ado('k', fetch), 0.2))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(asyncio.wait_for(flight.ado('k', fetch), 2))
+        with pytest.raises(asyncio.TimeoutError):
+            await leader
+        return await follower
+
+    result, shared = asyncio.run(scenario())
+    assert result == ['x'] and not shared
+    assert len(calls) == 2
+
+def test_identical_searches_share_one_scrape(monkeypatch):
+    """Concurrent scrapers for the same query hit ScraperAPI once per store"""
+    fetches = []
+
+    def fake_fetch(self, site, product_name):
+        fetches.append((site, product_name))
+        time.sleep(0.1)
+        return [{'tienda': site, 'nombre_crudo': product_name, 'precio': 1.0,
+                 'url': 'https://example.com', 'reviews': 4.0}]
+
+    monkeypatch.setattr(ProductScraper, '_fetch_site', fake_fetch)
+    cache = SearchCache(MemoryCacheBackend(10), ttl_by_site={}, default_ttl=60)
+
+    def search(query):
+        scraper = ProductScraper('test-key')
+        scraper.cache = cache
+        return scraper._search_site('amazon.com', query)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(search, ['iPhone 15', 'iphone 15', ' IPHONE 15', 'iPhone 15']))
+
+    assert len(fetches) == 1
+    assert all(len(products) == 1 for products in results)
+
+def test_searches_with_other_api_keys_are_not_coalesced(monkeypatch):
+    """A leader with a bad key must not hand its error to a user whose key works"""
+    started = threading.Event()
+
+    def fake_fetch(self, site, product_name):
+        if self.api_key == 'bad-key':
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError('401 Unauthorized')
+        return [{'tienda': site, 'nombre_crudo': product_name, 'precio': 1.0,
+                 'url': 'https://example.com', 'reviews': 4.0}]
+
+    monkeypatch.setattr(ProductScraper, '_fetch_site', fake_fetch)
+    cache = SearchCache(MemoryCacheBackend(10), ttl_by_site={}, default_ttl=60)
+
+    def search(api_key):
+        scraper = ProductScraper(api_key)
+        scraper.cache = cache
+        return scraper._search_site('amazon.com', 'iPhone 15')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        bad = pool.submit(search, 'bad-key')
+        started.wait(5)
+        good = pool.submit(search, 'good-key')
+        assert len(good.result()) == 1
+        with pytest.raises(RuntimeError):
+            bad.result()